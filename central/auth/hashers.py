@@ -0,0 +1,35 @@
+# auth/hashers.py
+"""
+Password hashers whose cost is set with ``PASSWORD_HASHER_OPTIONS``.
+
+Options are keyed by algorithm, e.g. ``{'argon2': {'time_cost': 2}}``.
+The algorithm names are Django's own, so existing hashes keep verifying;
+when the configured cost differs from a stored hash (or the preferred
+hasher changed), Django rehashes the password on the next successful
+login.
+"""
+from django.conf import settings
+from django.contrib.auth import hashers
+
+
+class ConfigurableHasherMixin:
+    def __init__(self):
+        options = getattr(settings, 'PASSWORD_HASHER_OPTIONS', {})
+        for name, value in options.get(self.algorithm, {}).items():
+            setattr(self, name, value)
+
+
+class Argon2PasswordHasher(ConfigurableHasherMixin, hashers.Argon2PasswordHasher):
+    pass
+
+
+class BCryptSHA256PasswordHasher(ConfigurableHasherMixin, hashers.BCryptSHA256PasswordHasher):
+    pass
+
+
+class PBKDF2PasswordHasher(ConfigurableHasherMixin, hashers.PBKDF2PasswordHasher):
+    pass
+
+
+class ScryptPasswordHasher(ConfigurableHasherMixin, hashers.ScryptPasswordHasher):
+    pass
@@ -3,11 +3,7 @@ from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from django.contrib.auth.password_validation import validate_password
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
-from django.core.mail import send_mail
-from django.contrib.auth.tokens import default_token_generator
-from django.utils.encoding import force_bytes
-from django.conf import settings
-from django.utils.http import urlsafe_base64_encode
+from .tasks import send_password_reset_email
 
 User = get_user_model()
 
@@ -70,35 +66,14 @@ class PasswordChangeSerializer(serializers.Serializer):
         return value
 
 
-# class PasswordResetSerializer(serializers.Serializer):
-#     """
-#     Serializer for password reset
-#     """
-#     email = serializers.EmailField(required=True)
-
-#     def validate_email(self, value):
-#         try:
-#             user = User.objects.get(email=value)
-#         except User.DoesNotExist:
-#             raise serializers.ValidationError("User with this email doesn't exist.")
-#         return value
+class PasswordResetSerializer(serializers.Serializer):
+    """
+    Serializer for password reset
+    """
+    email = serializers.EmailField(required=True)
 
-#     def save(self):
-#         email = self.validated_data['email']
-#         user = User.objects.get(email=email)
-        
-#         # Generate password reset token
-#         token = default_token_generator.make_token(user)
-#         uid = urlsafe_base64_encode(force_bytes(user.pk))
-        
-#         # Create reset link
-#         reset_url = f"{settings.FRONTEND_URL}/reset-password/{uid}/{token}"
-        
-#         # Send email
-#         send_mail(
-#             'Password Reset Request',
-#             f'Click the following link to reset your password: {reset_url}',
-#             settings.DEFAULT_FROM_EMAIL,
-#             [email],
-#             fail_silently=False,
-#         )
\ No newline at end of file
+    def save(self):
+        # The worker looks the address up and sends the email once this
+        # request commits, so the response is the same whether or not the
+        # address belongs to an account
+        send_password_reset_email.enqueue(email=self.validated_data['email'])
\ No newline at end of file
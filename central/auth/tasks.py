@@ -0,0 +1,31 @@
+# auth/tasks.py
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.tokens import default_token_generator
+from django.core.mail import send_mail
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
+from main.taskqueue import task
+
+User = get_user_model()
+
+
+@task(unique=True, max_attempts=5)
+def send_password_reset_email(email):
+    # Nothing is sent, and nothing is reported, for unknown addresses
+    for user in User.objects.filter(email=email, is_active=True):
+        # Generate password reset token
+        token = default_token_generator.make_token(user)
+        uid = urlsafe_base64_encode(force_bytes(user.pk))
+
+        # Create reset link
+        reset_url = f"{settings.FRONTEND_URL}/reset-password/{uid}/{token}"
+
+        send_mail(
+            'Password Reset Request',
+            f'Click the following link to reset your password: {reset_url}',
+            settings.DEFAULT_FROM_EMAIL,
+            [user.email],
+            fail_silently=False,
+        )
@@ -1,3 +1,89 @@
-from django.test import TestCase
+from django.contrib.auth import hashers
+from django.core import mail
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from main.models import Task, User
+from main.throttling import get_store
+from .tasks import send_password_reset_email
+
+
+class PasswordResetTests(TestCase):
+    def setUp(self):
+        User.objects.create_user('alice', email='alice@example.com', password='x')
+
+    def request_reset(self, email):
+        with self.captureOnCommitCallbacks(execute=True):
+            return APIClient().post('/auth/password/reset/', {'email': email}, format='json')
+
+    def test_response_does_not_reveal_accounts(self):
+        known = self.request_reset('alice@example.com')
+        unknown = self.request_reset('nobody@example.com')
+        self.assertEqual((known.status_code, known.json()), (unknown.status_code, unknown.json()))
+        self.assertEqual(Task.objects.filter(name=send_password_reset_email.name).count(), 2)
+
+    def test_email_goes_to_existing_accounts_only(self):
+        send_password_reset_email(email='nobody@example.com')
+        self.assertEqual(mail.outbox, [])
+        send_password_reset_email(email='alice@example.com')
+        self.assertEqual([message.to for message in mail.outbox], [['alice@example.com']])
+
+
+@override_settings(
+    PASSWORD_HASHERS=[
+        'auth.hashers.PBKDF2PasswordHasher',
+        'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    ],
+    PASSWORD_HASHER_OPTIONS={'pbkdf2_sha256': {'iterations': 1000}},
+)
+class PasswordHashingTests(TestCase):
+    def setUp(self):
+        get_store.cache_clear()
+        self.reset_hashers()
+        self.user = User.objects.create_user('alice', password='correct horse')
+
+    def reset_hashers(self):
+        # Hasher instances, and so their options, are cached
+        hashers.get_hashers.cache_clear()
+        hashers.get_hashers_by_algorithm.cache_clear()
+
+    def login(self, password='correct horse'):
+        return APIClient().post(
+            '/auth/token/', {'username': 'alice', 'password': password}, format='json'
+        )
+
+    def stored_hash(self):
+        self.user.refresh_from_db()
+        return self.user.password
+
+    def test_configured_cost_is_used(self):
+        self.assertTrue(self.stored_hash().startswith('pbkdf2_sha256$1000$'))
+
+    def test_login_rehashes_with_the_new_cost(self):
+        with self.settings(PASSWORD_HASHER_OPTIONS={'pbkdf2_sha256': {'iterations': 1200}}):
+            self.reset_hashers()
+            self.assertEqual(self.login('wrong').status_code, 401)
+            self.assertTrue(self.stored_hash().startswith('pbkdf2_sha256$1000$'))
+            response = self.login()
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('access', response.json())
+            self.assertTrue(self.stored_hash().startswith('pbkdf2_sha256$1200$'))
+        self.reset_hashers()
+
+    def test_login_upgrades_older_algorithms(self):
+        self.user.password = hashers.make_password('correct horse', hasher='pbkdf2_sha1')
+        self.user.save(update_fields=['password'])
+        self.assertEqual(self.login().status_code, 200)
+        self.assertTrue(self.stored_hash().startswith('pbkdf2_sha256$1000$'))
+
+    def test_password_change(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        path = '/auth/password/change/'
+        response = client.put(path, {'old_password': 'nope', 'new_password': 'battery staple 9'})
+        self.assertEqual(response.status_code, 400)
+        response = client.put(
+            path, {'old_password': 'correct horse', 'new_password': 'battery staple 9'}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.login('battery staple 9').status_code, 200)
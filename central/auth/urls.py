@@ -6,7 +6,7 @@ from .views import (
     RegisterView,
     LogoutView,
     PasswordChangeView,
-    # PasswordResetView,
+    PasswordResetView,
 )
 
 app_name = 'auth'
@@ -20,5 +20,5 @@ urlpatterns = [
     path('register/', RegisterView.as_view(), name='register'),
     path('logout/', LogoutView.as_view(), name='logout'),
     path('password/change/', PasswordChangeView.as_view(), name='password_change'),
-    # path('password/reset/', PasswordResetView.as_view(), name='password_reset'),
+    path('password/reset/', PasswordResetView.as_view(), name='password_reset'),
 ]
\ No newline at end of file
@@ -6,11 +6,12 @@ from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework_simplejwt.views import TokenObtainPairView
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import get_user_model
+from main.throttling import AuthThrottle
 from .serializers import (
     RegisterSerializer,
     CustomTokenObtainPairSerializer,
     PasswordChangeSerializer,
-    # PasswordResetSerializer,
+    PasswordResetSerializer,
 )
 
 User = get_user_model()
@@ -20,6 +21,7 @@ class CustomTokenObtainPairView(TokenObtainPairView):
     Custom token view that uses our custom serializer
     """
     serializer_class = CustomTokenObtainPairSerializer
+    throttle_classes = (AuthThrottle,)
 
 
 class RegisterView(generics.CreateAPIView):
@@ -28,6 +30,7 @@ class RegisterView(generics.CreateAPIView):
     """
     queryset = User.objects.all()
     permission_classes = (AllowAny,)
+    throttle_classes = (AuthThrottle,)
     serializer_class = RegisterSerializer
 
 
@@ -70,7 +73,7 @@ class PasswordChangeView(generics.UpdateAPIView):
                 )
             # Set new password
             user.set_password(serializer.data.get("new_password"))
-            user.save()
+            user.save(update_fields=['password'])
             return Response(
                 {"detail": "Password successfully changed."},
                 status=status.HTTP_200_OK
@@ -79,21 +82,22 @@ class PasswordChangeView(generics.UpdateAPIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-# class PasswordResetView(generics.GenericAPIView):
-#     """
-#     View for initiating password reset for non-authenticated users
-#     """
-#     permission_classes = (AllowAny,)
-#     serializer_class = PasswordResetSerializer
+class PasswordResetView(generics.GenericAPIView):
+    """
+    View for initiating password reset for non-authenticated users
+    """
+    permission_classes = (AllowAny,)
+    throttle_classes = (AuthThrottle,)
+    serializer_class = PasswordResetSerializer
 
-#     def post(self, request):
-#         serializer = self.get_serializer(data=request.data)
+    def post(self, request):
+        serializer = self.get_serializer(data=request.data)
         
-#         if serializer.is_valid():
-#             serializer.save()  # This will send the reset email
-#             return Response(
-#                 {"detail": "Password reset email has been sent."},
-#                 status=status.HTTP_200_OK
-#             )
+        if serializer.is_valid():
+            serializer.save()  # Queues the reset email
+            return Response(
+                {"detail": "If an account uses this email, a password reset email has been sent."},
+                status=status.HTTP_200_OK
+            )
             
-#         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
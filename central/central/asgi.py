@@ -14,3 +14,12 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'central.settings')
 
 application = get_asgi_application()
+
+# Load the URLconf, serializers and password validators before the first
+# request (and before a pre-forking server forks); see main/warmup.py.
+# Requests run their queries in threads with connections of their own, so
+# one opened here would not be reused. Imported only now that settings are
+# configured and the apps are loaded.
+from main.warmup import warm_up  # noqa: E402
+
+warm_up(database=False)
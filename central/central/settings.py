@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+from importlib.util import find_spec
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -30,8 +31,15 @@ ALLOWED_HOSTS = []
 
 # Application definition
 
+# Load the admin (main/admin.py and the admin URLs) on the first admin
+# request instead of when every worker boots (central/urls.py). The admin
+# system checks then only see the ModelAdmins under ``manage.py check``,
+# for which MainConfig.ready() registers them first (main/apps.py); the
+# checks other commands run at startup skip them.
+ADMIN_LAZY = not DEBUG
+
 INSTALLED_APPS = [
-    'django.contrib.admin',
+    'django.contrib.admin.apps.SimpleAdminConfig' if ADMIN_LAZY else 'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
     'django.contrib.sessions',
@@ -43,6 +51,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'main.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -79,9 +88,29 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Keep connections across requests, so the one main/warmup.py opens
+        # serves the first request; checked before reuse after errors
+        'CONN_MAX_AGE': 60,
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Cache
+# The caches named by BLOCKS_CACHE, BRIEF_CACHE, PROFILE_CACHE and
+# THROTTLE_CACHE must be shared by every web and worker process: writers
+# invalidate entries by bumping generation keys in them
+# (main/generations.py), which other processes would not see in their own
+# LocMemCache. ``check --deploy`` reports a LocMemCache in those roles.
+REDIS_URL = 'redis://localhost:6379/0'
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    } if DEBUG else {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+    },
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -101,6 +130,26 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# The first available hasher hashes new passwords; the others verify older
+# hashes, which are upgraded on the next successful login
+PASSWORD_HASHERS = [
+    hasher for hasher, module in [
+        ('auth.hashers.Argon2PasswordHasher', 'argon2'),
+        ('auth.hashers.BCryptSHA256PasswordHasher', 'bcrypt'),
+        ('auth.hashers.PBKDF2PasswordHasher', None),
+        ('auth.hashers.ScryptPasswordHasher', None),
+        ('django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher', None),
+    ] if module is None or find_spec(module)
+]
+
+# Cost parameters per algorithm (auth/hashers.py); changing them rehashes
+# passwords on login
+PASSWORD_HASHER_OPTIONS = {
+    'argon2': {'time_cost': 2, 'memory_cost': 65536, 'parallelism': 2},
+    'bcrypt_sha256': {'rounds': 12},
+    'pbkdf2_sha256': {'iterations': 870000},
+}
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/5.1/topics/i18n/
@@ -133,4 +182,125 @@ REST_FRAMEWORK = {
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,
-}   
\ No newline at end of file
+    # Reverse proxies in front of the app. Client addresses (e.g. for the
+    # auth throttle) are taken from X-Forwarded-For only this many hops
+    # deep, so clients cannot pick their own by sending the header; set to
+    # 1 behind a single proxy such as nginx
+    'NUM_PROXIES': 0,
+    'DEFAULT_RENDERER_CLASSES': [
+        'main.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_THROTTLE_CLASSES': [
+        'main.throttling.ReadWriteThrottle',
+    ],
+    # Token buckets (main/throttling.py): size / refill period
+    'DEFAULT_THROTTLE_RATES': {
+        'read': '600/min',
+        'write': '120/min',
+        # Likes, reposts and follows
+        'engagement': '60/min',
+        # Login, registration and password reset, per IP address
+        'auth': '10/min',
+    },
+}
+
+# Where token buckets live. InMemoryBucketStore is exact but per process,
+# so each worker grants the full budget; CacheBucketStore shares fixed-window
+# counters between processes through THROTTLE_CACHE, which must then be a
+# cache all workers share (e.g. Redis or Memcached)
+THROTTLE_STORE = (
+    'main.throttling.InMemoryBucketStore' if DEBUG else 'main.throttling.CacheBucketStore'
+)
+THROTTLE_CACHE = 'default'
+
+# Response encoding
+# FastJSONRenderer uses orjson when it is installed unless this is False.
+JSON_RENDERER_USE_ORJSON = True
+# Responses smaller than this many bytes are sent uncompressed.
+COMPRESSION_MIN_SIZE = 1024
+COMPRESSION_BROTLI_QUALITY = 4
+   
+# Live updates (main/streams.py)
+# InMemoryPubSub only reaches streams served by the publishing process, so
+# with more than one process they need RedisPubSub (``check --deploy``
+# reports it otherwise)
+PUBSUB_BACKEND = 'main.pubsub.InMemoryPubSub' if DEBUG else 'main.pubsub.RedisPubSub'
+PUBSUB_REDIS_URL = REDIS_URL
+# Pending messages per stream before it is told to resync
+PUBSUB_QUEUE_SIZE = 256
+STREAM_COALESCE_INTERVAL = 1.0
+STREAM_HEARTBEAT_INTERVAL = 15.0
+
+# Notifications (main/notifications.py)
+# Events written per task run
+NOTIFICATIONS_BATCH_SIZE = 500
+# Events on the same target within this many seconds share one notification
+NOTIFICATIONS_WINDOW = 3600
+
+# Thread counters (main/counters.py)
+# Threads with at least this many likes, replies and reposts get sharded
+SHARDED_COUNTER_THRESHOLD = 1000
+SHARDED_COUNTER_SHARDS = 16
+# Fraction of counter writes that check the threshold
+SHARDED_COUNTER_SAMPLE_RATE = 0.02
+# Seconds between roll-ups of shard values into the thread counter
+SHARDED_COUNTER_ROLLUP_INTERVAL = 30
+
+# Cached public profiles (main/profiles.py), invalidated on changes. This
+# and the caches below must be shared by all processes (see CACHES).
+PROFILE_CACHE = 'default'
+PROFILE_CACHE_TIMEOUT = 300
+
+# Per-user sets of blocked and muted authors (main/blocking.py),
+# invalidated on changes
+BLOCKS_CACHE = 'default'
+BLOCKS_CACHE_TIMEOUT = 3600
+
+# Brief user records embedded in threads, replies, likes, follows and
+# notifications (main/briefs.py): a per-process LRU in front of BRIEF_CACHE,
+# which must name a cache shared by all processes (see CACHES)
+BRIEF_LRU_SIZE = 10000
+# Seconds a process may serve a username or verified flag changed elsewhere
+BRIEF_LRU_TTL = 30
+BRIEF_CACHE = 'default'
+BRIEF_CACHE_TIMEOUT = 3600
+
+# Threads without activity for this many days are moved to the archive
+# tables by `manage.py archive_threads`
+ARCHIVE_AFTER_DAYS = 365
+
+# User data exports (main/takeout.py)
+TAKEOUT_DIR = BASE_DIR / 'takeouts'
+# Rows read per server-side cursor fetch
+TAKEOUT_CHUNK_SIZE = 2000
+# Rows between progress checkpoints a retried export resumes from. Each
+# checkpoint also renews the build's claim, so writing this many rows must
+# take well under TASKS_LOCK_TIMEOUT.
+TAKEOUT_CHECKPOINT_ROWS = 10000
+
+# Content moderation (main/moderation.py)
+# RegexMatcher scans faster and smaller; AhoCorasickMatcher compiles large
+# blocklists faster (see `manage.py bench_moderation`)
+MODERATION_MATCHER = 'main.moderation.RegexMatcher'
+# Seconds between checks of the blocklist table for changes
+MODERATION_RELOAD_INTERVAL = 10
+# Threads or replies scanned per rescan task run
+MODERATION_RESCAN_BATCH_SIZE = 1000
+
+# `manage.py boot_report` fails when booting a worker (central/wsgi.py,
+# with the warm-up in main/warmup.py) takes longer than this many seconds
+BOOT_TIME_BUDGET = 1.0
+
+# Password reset emails link here
+FRONTEND_URL = 'http://localhost:3000'
+
+# Background tasks (main/taskqueue.py), run with `manage.py runworker`
+TASKS_MODULES = ['main.notifications', 'main.counters', 'main.takeout', 'main.moderation',
+                 'auth.tasks']
+# Run tasks inline (after commit) instead of queueing them
+TASKS_ALWAYS_EAGER = False
+# Seconds before a running task is considered abandoned and reclaimed
+TASKS_LOCK_TIMEOUT = 300
+# First retry delay in seconds, doubled on every further attempt
+TASKS_RETRY_BACKOFF = 10
@@ -17,12 +17,28 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path
 from django.urls import path, include
+from django.utils.functional import cached_property
 
 from main.urls import router
+from main.streams import live_stream
 from auth.urls import urlpatterns as auth_urls
 
+
+class LazyAdminURLconf:
+    """
+    Stands in for ``admin.site.urls`` until an admin URL is first resolved
+    or reversed, then registers the ModelAdmins (when settings.ADMIN_LAZY
+    skipped that at startup) and builds the admin's URL patterns
+    """
+    @cached_property
+    def urlpatterns(self):
+        admin.autodiscover()
+        return admin.site.get_urls()
+
+
 urlpatterns = [
-    path('admin/', admin.site.urls),
+    path('admin/', (LazyAdminURLconf(), 'admin', admin.site.name)),
+    path('api/v1/stream/', live_stream, name='live_stream'),
     path('api/v1/', include(router.urls)),
     path('auth/', include(auth_urls))
 ]
\ No newline at end of file
@@ -14,3 +14,11 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'central.settings')
 
 application = get_wsgi_application()
+
+# Load the URLconf, serializers, password validators and database
+# connection before the first request (and before a pre-forking server
+# forks); see main/warmup.py. Imported only now that settings are
+# configured and the apps are loaded.
+from main.warmup import warm_up  # noqa: E402
+
+warm_up()
@@ -1,7 +1,14 @@
 # admin.py
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import User, Thread, Reply, Like, Follow
+from .models import User, Thread, Reply, Like, Follow, BlockedTerm, ModerationFlag
+from .pagination import EstimatedCountPaginator
+
+# The changelists below avoid per-row queries: counts come from the
+# with_counts() annotations, related rows are fetched with select_related,
+# and the big tables use EstimatedCountPaginator without the extra
+# unfiltered COUNT(*) (show_full_result_count). date_hierarchy is left out
+# because building its drilldown scans the whole table.
 
 @admin.register(User)
 class CustomUserAdmin(UserAdmin):
@@ -16,23 +23,48 @@ class ThreadAdmin(admin.ModelAdmin):
     list_filter = ('created_at', 'is_repost')
     search_fields = ('content', 'author__username')
     raw_id_fields = ('author', 'original_thread')
-    date_hierarchy = 'created_at'
+    list_select_related = ('author',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    
+    def get_queryset(self, request):
+        return Thread.with_counts(super().get_queryset(request))
     
     def content_preview(self, obj):
         return obj.content[:50] + '...' if len(obj.content) > 50 else obj.content
     content_preview.short_description = 'Content'
+    
+    def likes_count(self, obj):
+        return obj.likes_count
+    likes_count.short_description = 'Likes'
+    likes_count.admin_order_field = 'likes_count'
+    
+    def replies_count(self, obj):
+        return obj.replies_count
+    replies_count.short_description = 'Replies'
+    replies_count.admin_order_field = 'replies_count'
 
 @admin.register(Reply)
 class ReplyAdmin(admin.ModelAdmin):
-    list_display = ('id', 'author', 'thread', 'content_preview', 'created_at', 'likes_count')
+    list_display = ('id', 'author', 'thread_id', 'content_preview', 'created_at', 'likes_count')
     list_filter = ('created_at',)
     search_fields = ('content', 'author__username')
     raw_id_fields = ('author', 'thread')
-    date_hierarchy = 'created_at'
+    list_select_related = ('author',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    
+    def get_queryset(self, request):
+        return Reply.with_counts(super().get_queryset(request))
     
     def content_preview(self, obj):
         return obj.content[:50] + '...' if len(obj.content) > 50 else obj.content
     content_preview.short_description = 'Content'
+    
+    def likes_count(self, obj):
+        return obj.likes_count
+    likes_count.short_description = 'Likes'
+    likes_count.admin_order_field = 'likes_count'
 
 @admin.register(Like)
 class LikeAdmin(admin.ModelAdmin):
@@ -40,10 +72,13 @@ class LikeAdmin(admin.ModelAdmin):
     list_filter = ('created_at',)
     search_fields = ('user__username',)
     raw_id_fields = ('user', 'thread', 'reply')
-    date_hierarchy = 'created_at'
+    list_select_related = ('user',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     
     def get_content_type(self, obj):
-        return 'Thread' if obj.thread else 'Reply'
+        # thread_id avoids loading the thread for every row
+        return 'Thread' if obj.thread_id else 'Reply'
     get_content_type.short_description = 'Type'
 
 @admin.register(Follow)
@@ -52,7 +87,24 @@ class FollowAdmin(admin.ModelAdmin):
     list_filter = ('created_at',)
     search_fields = ('follower__username', 'followed__username')
     raw_id_fields = ('follower', 'followed')
-    date_hierarchy = 'created_at'
+    list_select_related = ('follower', 'followed')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+@admin.register(BlockedTerm)
+class BlockedTermAdmin(admin.ModelAdmin):
+    list_display = ('term', 'action', 'updated_at')
+    list_filter = ('action',)
+    search_fields = ('term',)
+
+@admin.register(ModerationFlag)
+class ModerationFlagAdmin(admin.ModelAdmin):
+    list_display = ('id', 'thread_id', 'reply_id', 'terms', 'reviewed', 'created_at')
+    list_filter = ('reviewed',)
+    list_editable = ('reviewed',)
+    raw_id_fields = ('thread', 'reply')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 # # Optional: Customize admin site header and title
 # admin.site.site_header = 'Threads Admin'
@@ -1,6 +1,19 @@
+import sys
+
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class MainConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'main'
+
+    def ready(self):
+        from . import checks, signals  # noqa: F401
+
+        if getattr(settings, 'ADMIN_LAZY', False) and sys.argv[1:2] == ['check']:
+            # ADMIN_LAZY leaves the ModelAdmins unregistered until the first
+            # admin request (central/urls.py), so register them for the admin
+            # system checks to see
+            from django.contrib import admin
+            admin.autodiscover()
@@ -0,0 +1,171 @@
+# main/archive.py
+"""
+Time-based archival of cold threads.
+
+A thread is cold when it and its latest reply are older than the cutoff
+and no live repost points at it (reposts are newer than their original,
+so the original follows once they are archived). Each batch copies the
+threads, their replies and their likes into the archive tables with the
+counts frozen, then removes them from the live tables in the same
+transaction. Rows are removed with raw DELETEs: the live signal handlers
+would otherwise load every row and publish count changes for data that is
+only moving between tables, so whatever those handlers maintain beyond
+the counts of the archived threads is adjusted here: the unread
+notification counters, the authors' cached profiles (whose thread counts
+cover live threads) and the repost counts of live originals whose reposts
+were archived. Users cannot repost such an original again (see
+ThreadViewSet.repost).
+"""
+from collections import Counter
+from itertools import islice
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.db.models import Count, Exists, OuterRef, Q
+
+from . import counters, notifications, profiles
+from .streams import publish_count_delta
+from .models import (
+    Thread, Reply, Like, Notification, ThreadCounter, ThreadCounterShard, ModerationFlag,
+    Hashtag, Mention, ArchivedThread, ArchivedReply, ArchivedLike,
+)
+
+
+# Reverse foreign keys of Thread and Reply as (model, field name). The raw
+# DELETEs below skip the ORM's cascade, so archive_batch removes the rows
+# of each of these itself (reposts: cold_threads() leaves out threads with
+# live reposts). A new foreign key to either model must be handled there
+# and listed here; archive_batch refuses to run until it is.
+HANDLED_RELATIONS = {
+    (Thread, 'original_thread'),
+    (ThreadCounter, 'thread'),
+    (ThreadCounterShard, 'thread'),
+    (Reply, 'thread'),
+    (Like, 'thread'),
+    (Like, 'reply'),
+    (Notification, 'thread'),
+    (Notification, 'reply'),
+    (ModerationFlag, 'thread'),
+    (ModerationFlag, 'reply'),
+    (Hashtag, 'thread'),
+    (Hashtag, 'reply'),
+    (Mention, 'thread'),
+    (Mention, 'reply'),
+}
+
+
+def unhandled_relations():
+    """
+    Reverse foreign keys of Thread and Reply missing from HANDLED_RELATIONS,
+    as ``"Model.field"``
+    """
+    return sorted(
+        f'{relation.related_model.__name__}.{relation.field.name}'
+        for model in (Thread, Reply)
+        # Hidden too: related_name='+' still cascades
+        for relation in model._meta.get_fields(include_hidden=True)
+        if relation.auto_created and (relation.one_to_many or relation.one_to_one)
+        and (relation.related_model, relation.field.name) not in HANDLED_RELATIONS
+    )
+
+
+def cold_threads(cutoff):
+    recent_replies = Reply.objects.filter(thread=OuterRef('pk'), created_at__gte=cutoff)
+    live_reposts = Thread.objects.filter(original_thread=OuterRef('pk'))
+    return Thread.objects.filter(created_at__lt=cutoff).exclude(
+        Exists(recent_replies)
+    ).exclude(Exists(live_reposts))
+
+
+def _copy(rows, build, model, chunk_size):
+    rows = iter(rows)
+    while chunk := list(islice(rows, chunk_size)):
+        model.objects.bulk_create([build(row) for row in chunk])
+
+
+def _raw_delete(queryset):
+    queryset._raw_delete(queryset.db)
+
+
+def archive_batch(cutoff, batch_size=500, chunk_size=2000):
+    """
+    Archive up to ``batch_size`` cold threads and return how many were moved
+    """
+    unhandled = unhandled_relations()
+    if unhandled:
+        raise ImproperlyConfigured(
+            f'archive_batch does not delete {", ".join(unhandled)}; handle them '
+            f'and add them to main.archive.HANDLED_RELATIONS'
+        )
+    with transaction.atomic():
+        ids = list(
+            cold_threads(cutoff).order_by('pk').values_list('pk', flat=True)[:batch_size]
+        )
+        if not ids:
+            return 0
+        threads = list(Thread.with_counts().filter(pk__in=ids))
+
+        ArchivedThread.objects.bulk_create([
+            ArchivedThread(
+                id=thread.pk, author_id=thread.author_id, content=thread.content,
+                created_at=thread.created_at, updated_at=thread.updated_at,
+                is_repost=thread.is_repost, original_thread_id=thread.original_thread_id,
+                likes_count=thread.likes_count, replies_count=thread.replies_count,
+                reposts_count=thread.reposts_count,
+            )
+            for thread in threads
+        ])
+        _copy(
+            Reply.with_counts().filter(thread_id__in=ids).order_by().iterator(chunk_size),
+            lambda reply: ArchivedReply(
+                id=reply.pk, thread_id=reply.thread_id, author_id=reply.author_id,
+                content=reply.content, created_at=reply.created_at,
+                updated_at=reply.updated_at, likes_count=reply.likes_count,
+            ),
+            ArchivedReply, chunk_size,
+        )
+        likes = Like.objects.filter(Q(thread_id__in=ids) | Q(reply__thread_id__in=ids))
+        _copy(
+            likes.order_by().values_list(
+                'id', 'user_id', 'thread_id', 'reply_id', 'created_at'
+            ).iterator(chunk_size),
+            lambda row: ArchivedLike(
+                id=row[0], user_id=row[1], thread_id=row[2], reply_id=row[3],
+                created_at=row[4],
+            ),
+            ArchivedLike, chunk_size,
+        )
+
+        notices = Notification.objects.filter(
+            Q(thread_id__in=ids) | Q(reply__thread_id__in=ids)
+        )
+        notifications.adjust_unread({
+            row['recipient_id']: -row['unread']
+            for row in notices.filter(is_read=False).order_by().values(
+                'recipient_id'
+            ).annotate(unread=Count('id'))
+        })
+        _raw_delete(notices)
+        _raw_delete(ModerationFlag.objects.filter(
+            Q(thread_id__in=ids) | Q(reply__thread_id__in=ids)
+        ))
+        # Entries of replies point at the thread too
+        _raw_delete(Hashtag.objects.filter(thread_id__in=ids))
+        _raw_delete(Mention.objects.filter(thread_id__in=ids))
+        _raw_delete(likes)
+        _raw_delete(Reply.objects.filter(thread_id__in=ids))
+        _raw_delete(ThreadCounterShard.objects.filter(thread_id__in=ids))
+        _raw_delete(ThreadCounter.objects.filter(thread_id__in=ids))
+        _raw_delete(Thread.objects.filter(pk__in=ids))
+
+        archived = set(ids)
+        reposted = Counter(
+            thread.original_thread_id for thread in threads
+            if thread.is_repost and thread.original_thread_id
+            and thread.original_thread_id not in archived
+        )
+        for thread_id, reposts in reposted.items():
+            counters.increment(thread_id, 'reposts', -reposts)
+            publish_count_delta(thread_id, 'reposts', -reposts)
+        profiles.invalidate(*{thread.author_id for thread in threads})
+    return len(ids)
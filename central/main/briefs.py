@@ -0,0 +1,160 @@
+# main/briefs.py
+"""
+Brief user records (``id``, ``username``, ``verified``) for nested
+serialization.
+
+Threads, replies, likes, follows and notifications are fetched with their
+user IDs only instead of joining the whole users row (password, bio and
+every AbstractUser column) into each query. ``get_many()`` then resolves
+the IDs through four levels, each one filling the levels above it:
+
+1. a memo on the request, so a user repeated on a page is looked up once
+2. a process-local LRU of ``BRIEF_LRU_SIZE`` entries
+3. the cache named by ``BRIEF_CACHE``, which all processes must share
+   (Redis in production, see CACHES; ``check --deploy`` reports a
+   LocMemCache there)
+4. one ``in_bulk()`` query for the IDs still missing
+
+Records are ``(id, username, verified)`` tuples. The signal handlers call
+``invalidate()`` when a username or verified flag changes, which bumps the
+user's generation in the shared cache keys (main/generations.py) and
+clears this process's LRU; other processes' LRU entries expire after
+``BRIEF_LRU_TTL`` seconds.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+from . import generations
+from .models import User
+
+# Bump when the record layout changes so old entries are ignored
+VERSION = 1
+
+
+class LRU:
+    """
+    Thread-safe least-recently-used mapping whose entries expire after
+    ``ttl`` seconds
+    """
+
+    def __init__(self, size, ttl):
+        self.size = size
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, keys):
+        now = time.monotonic()
+        found = {}
+        with self._lock:
+            for key in keys:
+                entry = self._data.get(key)
+                if entry is None:
+                    continue
+                expires, value = entry
+                if expires < now:
+                    del self._data[key]
+                    continue
+                self._data.move_to_end(key)
+                found[key] = value
+        return found
+
+    def set_many(self, items):
+        expires = time.monotonic() + self.ttl
+        with self._lock:
+            for key, value in items.items():
+                self._data[key] = (expires, value)
+                self._data.move_to_end(key)
+            while len(self._data) > self.size:
+                self._data.popitem(last=False)
+
+    def delete_many(self, keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+
+_lru = None
+
+
+def _local():
+    global _lru
+    if _lru is None:
+        _lru = LRU(
+            getattr(settings, 'BRIEF_LRU_SIZE', 10000),
+            getattr(settings, 'BRIEF_LRU_TTL', 30),
+        )
+    return _lru
+
+
+def _cache():
+    return caches[getattr(settings, 'BRIEF_CACHE', 'default')]
+
+
+def cache_key(user_id, generation):
+    return f'brief:{VERSION}:{user_id}:{generation}'
+
+
+def _memo(request):
+    if request is None:
+        return {}
+    memo = getattr(request, '_user_briefs', None)
+    if memo is None:
+        memo = request._user_briefs = {}
+    return memo
+
+
+def get_many(user_ids, request=None):
+    """
+    Return ``{user ID: (id, username, verified)}`` for the given IDs,
+    leaving out users that do not exist
+    """
+    memo = _memo(request)
+    wanted = {user_id for user_id in user_ids if user_id is not None}
+    missing = wanted - memo.keys()
+    if missing:
+        local = _local()
+        found = local.get_many(missing)
+        missing -= found.keys()
+        if missing:
+            # Read before the users table, see main/generations.py
+            keys = {
+                pk: cache_key(pk, generation)
+                for pk, generation in generations.get_many(_cache(), 'brief', missing).items()
+            }
+            shared = {
+                record[0]: tuple(record)
+                for record in _cache().get_many(keys.values()).values()
+            }
+            local.set_many(shared)
+            found.update(shared)
+            missing -= shared.keys()
+        if missing:
+            users = User.objects.only('username', 'verified').in_bulk(missing)
+            loaded = {pk: (pk, user.username, user.verified) for pk, user in users.items()}
+            _cache().set_many(
+                {keys[pk]: record for pk, record in loaded.items()},
+                getattr(settings, 'BRIEF_CACHE_TIMEOUT', 3600),
+            )
+            local.set_many(loaded)
+            found.update(loaded)
+        memo.update(found)
+    return {user_id: memo[user_id] for user_id in wanted if user_id in memo}
+
+
+def get(user_id, request=None):
+    return get_many([user_id], request).get(user_id)
+
+
+def as_dict(record):
+    user_id, username, verified = record
+    return {'id': user_id, 'username': username, 'verified': verified}
+
+
+def invalidate(*user_ids):
+    generations.bump(_cache(), 'brief', *user_ids)
+    _local().delete_many(user_ids)
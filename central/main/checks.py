@@ -0,0 +1,41 @@
+# main/checks.py
+"""
+Deployment checks (``manage.py check --deploy``) for settings that only
+work while everything runs in a single process. Production settings must
+pass them when more than one web or worker process runs.
+"""
+from django.conf import settings
+from django.core import checks
+
+
+@checks.register(checks.Tags.compatibility, deploy=True)
+def check_pubsub(app_configs, **kwargs):
+    backend = getattr(settings, 'PUBSUB_BACKEND', 'main.pubsub.InMemoryPubSub')
+    if backend != 'main.pubsub.InMemoryPubSub':
+        return []
+    return [checks.Warning(
+        'PUBSUB_BACKEND is InMemoryPubSub, so live streams only receive '
+        'updates published by the process that serves them.',
+        hint="Use 'main.pubsub.RedisPubSub' when running more than one process.",
+        id='main.W001',
+    )]
+
+
+# Settings naming caches that every process must share, see main/generations.py
+SHARED_CACHE_SETTINGS = ('BLOCKS_CACHE', 'BRIEF_CACHE', 'PROFILE_CACHE', 'THROTTLE_CACHE')
+
+
+@checks.register(checks.Tags.caches, deploy=True)
+def check_shared_caches(app_configs, **kwargs):
+    errors = []
+    for name in SHARED_CACHE_SETTINGS:
+        alias = getattr(settings, name, 'default')
+        backend = settings.CACHES.get(alias, {}).get('BACKEND', '')
+        if backend.endswith('.LocMemCache'):
+            errors.append(checks.Error(
+                f'{name} names the {alias!r} cache, a LocMemCache, so processes '
+                f'do not see each other\'s invalidations.',
+                hint='Use a cache all web and worker processes share, such as Redis.',
+                id='main.E001',
+            ))
+    return errors
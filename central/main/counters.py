@@ -0,0 +1,181 @@
+# main/counters.py
+"""
+Denormalized thread counters with sharding for hot threads.
+
+Every like, reply and repost adjusts the thread's ThreadCounter row with a
+single UPDATE. Under heavy concurrent engagement that row becomes a lock
+hotspot, so once a thread's total count reaches
+``SHARDED_COUNTER_THRESHOLD`` it is switched to ``SHARDED_COUNTER_SHARDS``
+shard rows: each write updates a random shard, a periodic task folds the
+shards back into ThreadCounter, and reads (``Thread.with_counts()``) add
+the outstanding shard values.
+"""
+import random
+import time
+from collections import defaultdict
+from datetime import timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Q
+
+from .models import Thread, Reply, Like, ThreadCounter, ThreadCounterShard
+from .taskqueue import task
+
+FIELDS = ('likes', 'replies', 'reposts')
+
+# Promotion is permanent, so each process remembers the sharded threads it
+# has seen and sends their writes straight to a shard
+_sharded = set()
+_rollup_scheduled_at = 0.0
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def create_counter(thread_id):
+    ThreadCounter.objects.bulk_create(
+        [ThreadCounter(thread_id=thread_id)], ignore_conflicts=True
+    )
+
+
+def increment(thread_id, field, delta=1):
+    if thread_id in _sharded:
+        _increment_shard(thread_id, field, delta)
+        return
+
+    updated = ThreadCounter.objects.filter(thread_id=thread_id, sharded=False).update(
+        **{field: F(field) + delta}
+    )
+    if updated:
+        # Checking every write would cost a read; a sample is enough to
+        # notice a thread crossing the threshold
+        if delta > 0 and random.random() < _setting('SHARDED_COUNTER_SAMPLE_RATE', 0.02):
+            maybe_promote(thread_id)
+        return
+
+    sharded = ThreadCounter.objects.filter(thread_id=thread_id).values_list(
+        'sharded', flat=True
+    ).first()
+    if sharded:
+        _sharded.add(thread_id)
+        _increment_shard(thread_id, field, delta)
+    elif sharded is None and delta > 0:
+        # Threads written without signals (bulk_create) have no counter yet;
+        # counting the rows includes the one that triggered this call
+        rebuild(thread_id)
+
+
+def _increment_shard(thread_id, field, delta):
+    shard = random.randrange(_setting('SHARDED_COUNTER_SHARDS', 16))
+    ThreadCounterShard.objects.filter(thread_id=thread_id, shard=shard).update(
+        **{field: F(field) + delta}
+    )
+    schedule_rollup()
+
+
+def rebuild(thread_id):
+    """
+    Recompute a thread's counter from the like, reply and repost rows
+    """
+    ThreadCounter.objects.update_or_create(
+        thread_id=thread_id,
+        defaults={
+            'likes': Like.objects.filter(thread_id=thread_id).count(),
+            'replies': Reply.objects.filter(thread_id=thread_id).count(),
+            'reposts': Thread.objects.filter(original_thread_id=thread_id).count(),
+        },
+    )
+
+
+def rebuild_many(thread_ids, chunk_size=1000):
+    """
+    Recompute the counters of ``thread_ids`` (any iterable) with three
+    grouped COUNT queries and one upsert per chunk, e.g. after a bulk load
+    that bypassed the signal handlers. Outstanding shard values are reset.
+    """
+    thread_ids = iter(thread_ids)
+    while chunk := list(islice(thread_ids, chunk_size)):
+        likes = _grouped_counts(Like.objects, 'thread_id', chunk)
+        replies = _grouped_counts(Reply.objects, 'thread_id', chunk)
+        reposts = _grouped_counts(Thread.objects, 'original_thread_id', chunk)
+        with transaction.atomic():
+            ThreadCounter.objects.bulk_create(
+                [ThreadCounter(
+                    thread_id=thread_id,
+                    likes=likes.get(thread_id, 0),
+                    replies=replies.get(thread_id, 0),
+                    reposts=reposts.get(thread_id, 0),
+                ) for thread_id in chunk],
+                update_conflicts=True, unique_fields=['thread'], update_fields=FIELDS,
+            )
+            ThreadCounterShard.objects.filter(thread_id__in=chunk).update(
+                **dict.fromkeys(FIELDS, 0)
+            )
+
+
+def _grouped_counts(queryset, field, ids):
+    return dict(
+        queryset.filter(**{f'{field}__in': ids})
+        .order_by().values_list(field).annotate(n=Count('id'))
+    )
+
+
+def maybe_promote(thread_id):
+    counter = ThreadCounter.objects.filter(thread_id=thread_id).first()
+    if counter is None or counter.sharded:
+        return
+    total = counter.likes + counter.replies + counter.reposts
+    if total >= _setting('SHARDED_COUNTER_THRESHOLD', 1000):
+        promote(thread_id)
+
+
+def promote(thread_id):
+    """
+    Switch a thread to sharded counting. Promotion is never undone.
+    """
+    with transaction.atomic():
+        ThreadCounterShard.objects.bulk_create(
+            [ThreadCounterShard(thread_id=thread_id, shard=shard)
+             for shard in range(_setting('SHARDED_COUNTER_SHARDS', 16))],
+            ignore_conflicts=True,
+        )
+        ThreadCounter.objects.filter(thread_id=thread_id).update(sharded=True)
+    _sharded.add(thread_id)
+
+
+def schedule_rollup():
+    global _rollup_scheduled_at
+    interval = _setting('SHARDED_COUNTER_ROLLUP_INTERVAL', 30)
+    now = time.monotonic()
+    if now - _rollup_scheduled_at < interval / 2:
+        return
+    _rollup_scheduled_at = now
+    roll_up.enqueue(delay=timedelta(seconds=interval))
+
+
+@task(unique=True)
+def roll_up():
+    """
+    Move outstanding shard values into ThreadCounter. Each shard is
+    decremented by exactly the amount read, so writes that land while this
+    runs are kept for the next roll-up.
+    """
+    with transaction.atomic():
+        shards = list(
+            ThreadCounterShard.objects.select_for_update()
+            .filter(~Q(likes=0) | ~Q(replies=0) | ~Q(reposts=0))
+        )
+        totals = defaultdict(lambda: dict.fromkeys(FIELDS, 0))
+        for shard in shards:
+            ThreadCounterShard.objects.filter(pk=shard.pk).update(
+                **{field: F(field) - getattr(shard, field) for field in FIELDS}
+            )
+            for field in FIELDS:
+                totals[shard.thread_id][field] += getattr(shard, field)
+        for thread_id, total in totals.items():
+            ThreadCounter.objects.filter(thread_id=thread_id).update(
+                **{field: F(field) + value for field, value in total.items()}
+            )
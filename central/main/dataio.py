@@ -0,0 +1,312 @@
+# main/dataio.py
+"""
+Streaming bulk export and import of users, threads, replies, likes and
+follows as NDJSON or CSV, used by the ``export_data`` and ``import_data``
+management commands.
+
+A dataset is a directory with one file per table (``users.ndjson``,
+``threads.csv``, ...) and a ``manifest.json`` with the row count and
+highest ``id`` of each file. Rows reference each other by their ``id`` in
+the dataset.
+
+Both directions work on generators and fixed-size chunks, so memory does
+not grow with the dataset. On import, primary keys are preallocated: each
+table's IDs are shifted by the table's current highest ID and that range is
+reserved up front, so foreign keys are computed while reading instead of
+being looked up, and rows can be inserted with plain ``bulk_create`` in any
+order. Foreign keys are checked when the single import transaction commits,
+signals do not fire, and thread counters are rebuilt once at the end.
+"""
+import csv
+import json
+from contextlib import contextmanager
+from dataclasses import dataclass
+from itertools import chain, islice
+from pathlib import Path
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.color import no_style
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from . import counters
+from .models import User, Thread, Reply, Like, Follow
+
+FORMATS = ('ndjson', 'csv')
+
+
+@dataclass(frozen=True)
+class Table:
+    name: str
+    model: type
+    fields: tuple
+    # Leaf tables skip rows that duplicate a unique pair already present
+    ignore_conflicts: bool = False
+
+    def foreign_keys(self):
+        """
+        ``{column: target table name}`` for the foreign keys in ``fields``
+        """
+        targets = {table.model: table.name for table in TABLES}
+        return {
+            name: targets[field.related_model]
+            for name in self.fields
+            if (field := self.model._meta.get_field(name)).is_relation
+        }
+
+
+TABLES = (
+    Table('users', User, (
+        'id', 'username', 'email', 'password', 'first_name', 'last_name', 'bio',
+        'verified', 'is_active', 'date_joined',
+    )),
+    Table('threads', Thread, (
+        'id', 'author', 'content', 'created_at', 'updated_at', 'is_repost',
+        'original_thread',
+    )),
+    Table('replies', Reply, (
+        'id', 'thread', 'author', 'content', 'created_at', 'updated_at',
+    )),
+    Table('likes', Like, (
+        'id', 'user', 'thread', 'reply', 'created_at',
+    ), ignore_conflicts=True),
+    Table('follows', Follow, (
+        'id', 'follower', 'followed', 'created_at',
+    ), ignore_conflicts=True),
+)
+
+
+def get_tables(names=None):
+    if not names:
+        return TABLES
+    by_name = {table.name: table for table in TABLES}
+    unknown = set(names) - set(by_name)
+    if unknown:
+        raise ValueError(f"Unknown tables: {', '.join(sorted(unknown))}")
+    # Keep dependency order whatever order the names were given in
+    return tuple(table for table in TABLES if table.name in names)
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+# Export
+
+def export_rows(table, chunk_size):
+    """
+    Yield the rows of ``table`` as dicts keyed by ``table.fields``, reading
+    with a server-side cursor where the database has one
+    """
+    columns = [table.model._meta.get_field(name).attname for name in table.fields]
+    queryset = table.model.objects.order_by('pk').values_list(*columns)
+    for values in queryset.iterator(chunk_size=chunk_size):
+        yield dict(zip(table.fields, values))
+
+
+def write_rows(path, fmt, fields, rows):
+    """
+    Write ``rows`` to ``path`` and return ``(row count, highest id)``
+    """
+    count = max_id = 0
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        if fmt == 'csv':
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            write = writer.writerow
+        else:
+            encoder = DjangoJSONEncoder(ensure_ascii=False, separators=(',', ':'))
+            write = lambda row: f.write(encoder.encode(row) + '\n')  # noqa: E731
+        for row in rows:
+            write(row)
+            count += 1
+            max_id = max(max_id, row['id'])
+    return count, max_id
+
+
+def export_dataset(directory, fmt='ndjson', tables=None, chunk_size=2000):
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    manifest = {'format': fmt, 'tables': {}}
+    for table in get_tables(tables):
+        filename = f'{table.name}.{fmt}'
+        rows, max_id = write_rows(
+            directory / filename, fmt, table.fields, export_rows(table, chunk_size)
+        )
+        manifest['tables'][table.name] = {'file': filename, 'rows': rows, 'max_id': max_id}
+        yield table.name, rows
+    with open(directory / 'manifest.json', 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+
+# Import
+
+def read_rows(path):
+    """
+    Yield the rows of an NDJSON or CSV file as dicts
+    """
+    with open(path, newline='', encoding='utf-8') as f:
+        if path.suffix == '.csv':
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def find_files(directory, tables):
+    """
+    Return ``{table name: (path, highest id)}`` for the tables present in
+    ``directory``, scanning files that are not described by a manifest
+    """
+    directory = Path(directory)
+    manifest_path = directory / 'manifest.json'
+    manifest = {}
+    if manifest_path.exists():
+        manifest = json.loads(manifest_path.read_text())['tables']
+
+    files = {}
+    for table in tables:
+        if table.name in manifest:
+            entry = manifest[table.name]
+            files[table.name] = (directory / entry['file'], entry['max_id'])
+            continue
+        for fmt in FORMATS:
+            path = directory / f'{table.name}.{fmt}'
+            if path.exists():
+                max_id = max((int(row['id']) for row in read_rows(path)), default=0)
+                files[table.name] = (path, max_id)
+                break
+    return files
+
+
+def reserve_ids(model, offset, max_id):
+    """
+    Advance ``model``'s ID sequence past ``offset + max_id`` so concurrent
+    inserts cannot take an ID the import is about to use. SQLite needs
+    nothing: the import transaction holds its only write lock.
+    """
+    if not max_id:
+        return
+    table = connection.ops.quote_name(model._meta.db_table)
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                "SELECT setval(pg_get_serial_sequence(%s, 'id'), %s)",
+                [model._meta.db_table, offset + max_id],
+            )
+        elif connection.vendor == 'mysql':
+            cursor.execute(f'ALTER TABLE {table} AUTO_INCREMENT = {offset + max_id + 1}')
+
+
+@contextmanager
+def keep_timestamps(model):
+    """
+    Disable auto_now/auto_now_add so imported timestamps are kept
+    """
+    fields = [
+        field for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, (auto_now, auto_now_add) in zip(fields, saved):
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def build_objects(table, rows, offsets):
+    """
+    Turn raw rows into unsaved model instances with shifted IDs
+    """
+    model = table.model
+    foreign_keys = table.foreign_keys()
+    fields = {name: model._meta.get_field(name) for name in table.fields}
+    now = timezone.now()
+    for row in rows:
+        values = {}
+        for name, field in fields.items():
+            if name not in row:
+                # keep_timestamps() is active, so fill in what auto_now would
+                if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False):
+                    values[name] = now
+                continue
+            value = row[name]
+            if value == '' and field.null:
+                value = None
+            if name in foreign_keys:
+                if value is not None:
+                    value = int(value) + offsets.get(foreign_keys[name], 0)
+                values[field.attname] = value
+            elif name == 'id':
+                values['id'] = int(value) + offsets.get(table.name, 0)
+            else:
+                values[name] = field.to_python(value)
+        if model is User and not values.get('password'):
+            values['password'] = make_password(None)
+        yield model(**values)
+
+
+# Columns whose thread's counters change when rows are imported
+COUNTED = {'threads': 'original_thread_id', 'replies': 'thread_id', 'likes': 'thread_id'}
+
+
+def import_dataset(directory, tables=None, keep_ids=False, batch_size=2000):
+    """
+    Load a dataset in one transaction. Yields ``(table name, rows)`` as each
+    table finishes; the transaction commits when the generator is exhausted.
+    """
+    tables = get_tables(tables)
+    files = find_files(directory, tables)
+    with transaction.atomic():
+        offsets = {}
+        for table in tables:
+            if table.name not in files or keep_ids:
+                continue
+            current = table.model.objects.aggregate(n=Max('pk'))['n'] or 0
+            offsets[table.name] = current
+            reserve_ids(table.model, current, files[table.name][1])
+
+        # Imported threads are rebuilt by ID range; existing threads that
+        # got imported likes, replies or reposts are collected here
+        first = offsets.get('threads', 0)
+        last = first + files['threads'][1] if 'threads' in files else first
+        touched = set()
+        for table in tables:
+            if table.name not in files:
+                continue
+            count = 0
+            column = COUNTED.get(table.name)
+            objects = build_objects(table, read_rows(files[table.name][0]), offsets)
+            with keep_timestamps(table.model):
+                for batch in chunked(objects, batch_size):
+                    table.model.objects.bulk_create(
+                        batch, ignore_conflicts=table.ignore_conflicts
+                    )
+                    count += len(batch)
+                    if column:
+                        touched.update(
+                            thread_id for obj in batch
+                            if (thread_id := getattr(obj, column)) is not None
+                            and not first < thread_id <= last
+                        )
+            yield table.name, count
+
+        if keep_ids:
+            # Explicit IDs do not move PostgreSQL sequences
+            models = [table.model for table in tables if table.name in files]
+            with connection.cursor() as cursor:
+                for sql in connection.ops.sequence_reset_sql(no_style(), models):
+                    cursor.execute(sql)
+
+        imported = Thread.objects.filter(pk__gt=first, pk__lte=last).order_by('pk')
+        counters.rebuild_many(chain(
+            imported.values_list('pk', flat=True).iterator(), sorted(touched)
+        ))
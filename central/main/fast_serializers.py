@@ -0,0 +1,369 @@
+# main/fast_serializers.py
+"""
+Read-only serializers for the hot list endpoints.
+
+These produce the same JSON shape as ThreadSerializer and ReplySerializer,
+but build the payload from ``values_list()`` tuples instead of instantiating
+a ModelSerializer (plus a nested UserBriefSerializer) for every row. The
+viewer dependent flags and the recent replies of a page are resolved with one
+batched query each instead of one query per row. Authors are selected as
+IDs only and resolved through main.briefs. Rows by the authors in
+``context['hidden']`` (main/blocking.py) are left out.
+"""
+from dataclasses import dataclass
+from datetime import datetime
+from itertools import chain
+from typing import Optional
+
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from rest_framework import serializers
+
+from . import briefs
+from .models import Thread, Reply, Like, ArchivedThread
+
+# Number of replies inlined into each thread of a list page
+RECENT_REPLIES = 3
+
+# Shared DRF field so datetimes are formatted exactly like the ModelSerializers
+format_datetime = serializers.DateTimeField().to_representation
+
+# Column layouts for values_list(). The row factories below unpack tuples in
+# this order, so the two must be kept in sync.
+REPLY_COLUMNS = (
+    'id', 'author_id', 'thread_id', 'content', 'created_at', 'updated_at',
+    'likes_count',
+)
+THREAD_COLUMNS = (
+    'id', 'author_id', 'content', 'created_at', 'updated_at', 'likes_count',
+    'replies_count', 'reposts_count', 'is_repost', 'original_thread_id',
+)
+ORIGINAL_COLUMNS = (
+    'id', 'author_id', 'content', 'created_at', 'likes_count',
+    'replies_count', 'reposts_count',
+)
+
+
+@dataclass(slots=True)
+class UserBriefRow:
+    id: int
+    # Filled in by fill_authors()
+    username: str = ''
+    verified: bool = False
+
+    def to_representation(self):
+        return {'id': self.id, 'username': self.username, 'verified': self.verified}
+
+
+@dataclass(slots=True)
+class ReplyRow:
+    id: int
+    author: UserBriefRow
+    thread: int
+    content: str
+    created_at: datetime
+    updated_at: datetime
+    likes_count: int
+    is_liked: bool = False
+
+    @classmethod
+    def from_tuple(cls, row):
+        pk, author_id, thread_id, content, created, updated, likes = row
+        return cls(pk, UserBriefRow(author_id), thread_id, content, created, updated, likes)
+
+    def to_representation(self):
+        return {
+            'id': self.id,
+            'author': self.author.to_representation(),
+            'thread': self.thread,
+            'content': self.content,
+            'created_at': format_datetime(self.created_at),
+            'updated_at': format_datetime(self.updated_at),
+            'likes_count': self.likes_count,
+            'is_liked': self.is_liked,
+        }
+
+
+@dataclass(slots=True)
+class OriginalThreadRow:
+    id: int
+    author: UserBriefRow
+    content: str
+    created_at: datetime
+    likes_count: int
+    replies_count: int
+    reposts_count: int
+
+    @classmethod
+    def from_tuple(cls, row):
+        pk, author_id, content, created, likes, replies, reposts = row
+        return cls(pk, UserBriefRow(author_id), content, created, likes, replies, reposts)
+
+    def to_representation(self):
+        return {
+            'id': self.id,
+            'author': self.author.to_representation(),
+            'content': self.content,
+            'created_at': format_datetime(self.created_at),
+            'likes_count': self.likes_count,
+            'replies_count': self.replies_count,
+            'reposts_count': self.reposts_count,
+        }
+
+
+@dataclass(slots=True)
+class ThreadRow:
+    id: int
+    author: UserBriefRow
+    content: str
+    created_at: datetime
+    updated_at: datetime
+    likes_count: int
+    replies_count: int
+    reposts_count: int
+    is_repost: bool
+    original_thread: Optional[int]
+    is_liked: bool = False
+    is_reposted: bool = False
+    original: Optional[OriginalThreadRow] = None
+    recent_replies: tuple = ()
+
+    @classmethod
+    def from_tuple(cls, row):
+        (pk, author_id, content, created, updated,
+         likes, replies, reposts, is_repost, original_id) = row
+        return cls(
+            pk, UserBriefRow(author_id), content,
+            created, updated, likes, replies, reposts, is_repost, original_id
+        )
+
+    def to_representation(self):
+        return {
+            'id': self.id,
+            'author': self.author.to_representation(),
+            'content': self.content,
+            'created_at': format_datetime(self.created_at),
+            'updated_at': format_datetime(self.updated_at),
+            'likes_count': self.likes_count,
+            'replies_count': self.replies_count,
+            'reposts_count': self.reposts_count,
+            'is_liked': self.is_liked,
+            'is_reposted': self.is_reposted,
+            'is_repost': self.is_repost,
+            'original_thread': self.original_thread,
+            'original': self.original.to_representation() if self.original else None,
+            'recent_replies': [reply.to_representation() for reply in self.recent_replies],
+        }
+
+
+def _viewer(context):
+    request = (context or {}).get('request')
+    if request and request.user.is_authenticated:
+        return request.user
+    return None
+
+
+class FastReplySerializer:
+    """
+    Read-only, list-only replacement for ReplySerializer
+    """
+    columns = REPLY_COLUMNS
+
+    def __init__(self, rows, context=None):
+        self.rows = rows
+        self.context = context or {}
+
+    @classmethod
+    def rows_for(cls, queryset):
+        """
+        Turn a ``Reply.with_counts()`` queryset into the tuples this
+        serializer consumes. The result can be paginated as usual.
+        """
+        if not queryset.ordered:
+            # Meta.ordering is dropped from the GROUP BY of with_counts()
+            queryset = queryset.order_by(*Reply._meta.ordering)
+        return queryset.prefetch_related(None).values_list(*cls.columns)
+
+    def build(self):
+        hidden = self.context.get('hidden', ())
+        replies = [ReplyRow.from_tuple(row) for row in self.rows if row[1] not in hidden]
+        fill_authors(replies, self.context)
+        mark_liked_replies(replies, _viewer(self.context))
+        return replies
+
+    @property
+    def data(self):
+        return [reply.to_representation() for reply in self.build()]
+
+
+class FastThreadSerializer:
+    """
+    Read-only, list-only replacement for ThreadSerializer
+    """
+    columns = THREAD_COLUMNS
+
+    def __init__(self, rows, context=None):
+        self.rows = rows
+        self.context = context or {}
+
+    @classmethod
+    def rows_for(cls, queryset):
+        """
+        Turn a ``Thread.with_counts()`` queryset into the tuples this
+        serializer consumes. The result can be paginated as usual.
+        """
+        if not queryset.ordered:
+            # Meta.ordering is dropped from the GROUP BY of with_counts()
+            queryset = queryset.order_by(*Thread._meta.ordering)
+        return queryset.prefetch_related(None).values_list(*cls.columns)
+
+    def build(self):
+        hidden = self.context.get('hidden', ())
+        threads = [ThreadRow.from_tuple(row) for row in self.rows if row[1] not in hidden]
+        if not threads:
+            return threads
+        viewer = _viewer(self.context)
+        by_id = {thread.id: thread for thread in threads}
+
+        replies = recent_replies(by_id.keys(), hidden=hidden)
+        mark_liked_replies(replies, viewer)
+        grouped = {}
+        for reply in replies:
+            grouped.setdefault(reply.thread, []).append(reply)
+        for thread_id, thread_replies in grouped.items():
+            by_id[thread_id].recent_replies = thread_replies
+
+        # Reposts always point at the root thread, so one query resolves
+        # every original on the page
+        original_ids = {t.original_thread for t in threads if t.original_thread}
+        originals = {}
+        if original_ids:
+            originals = {
+                row[0]: OriginalThreadRow.from_tuple(row)
+                for row in Thread.with_counts().filter(id__in=original_ids)
+                .values_list(*ORIGINAL_COLUMNS)
+                if row[1] not in hidden
+            }
+            for thread in threads:
+                thread.original = originals.get(thread.original_thread)
+        fill_authors([*threads, *replies, *originals.values()], self.context)
+
+        if viewer is not None:
+            liked = Like.objects.filter(
+                user=viewer, thread_id__in=by_id.keys()
+            ).values_list('thread_id', flat=True)
+            for thread_id in liked:
+                by_id[thread_id].is_liked = True
+
+            # Archived reposts still count, see main/archive.py
+            reposted = chain.from_iterable(
+                model.objects.filter(
+                    author=viewer, is_repost=True, original_thread_id__in=by_id.keys()
+                ).values_list('original_thread_id', flat=True)
+                for model in (Thread, ArchivedThread)
+            )
+            for thread_id in reposted:
+                by_id[thread_id].is_reposted = True
+        return threads
+
+    @property
+    def data(self):
+        return [thread.to_representation() for thread in self.build()]
+
+
+class FastIndexEntrySerializer:
+    """
+    Read-only serializer for Hashtag and Mention entries: each one with the
+    thread it points at and, for a reply, the reply
+    """
+
+    def __init__(self, entries, context=None):
+        self.entries = entries
+        self.context = context or {}
+
+    def build(self):
+        hidden = self.context.get('hidden', ())
+        entries = [entry for entry in self.entries if entry.author_id not in hidden]
+        if not entries:
+            return []
+        threads = {
+            thread.id: thread for thread in FastThreadSerializer(
+                FastThreadSerializer.rows_for(
+                    Thread.with_counts().filter(id__in={entry.thread_id for entry in entries})
+                ),
+                context=self.context,
+            ).build()
+        }
+        reply_ids = {entry.reply_id for entry in entries if entry.reply_id}
+        replies = {}
+        if reply_ids:
+            replies = {
+                reply.id: reply for reply in FastReplySerializer(
+                    FastReplySerializer.rows_for(Reply.with_counts().filter(id__in=reply_ids)),
+                    context=self.context,
+                ).build()
+            }
+        # Posts by hidden authors were left out by the serializers above
+        return [
+            (entry, threads[entry.thread_id], replies.get(entry.reply_id))
+            for entry in entries
+            if entry.thread_id in threads and (not entry.reply_id or entry.reply_id in replies)
+        ]
+
+    @property
+    def data(self):
+        return [
+            {
+                'created_at': format_datetime(entry.created_at),
+                'thread': thread.to_representation(),
+                'reply': reply.to_representation() if reply else None,
+            }
+            for entry, thread, reply in self.build()
+        ]
+
+
+def recent_replies(thread_ids, limit=RECENT_REPLIES, hidden=()):
+    """
+    Newest ``limit`` replies of every thread in ``thread_ids`` in one query,
+    leaving out replies by ``hidden`` authors
+    """
+    replies = Reply.with_counts().filter(thread_id__in=list(thread_ids))
+    if hidden:
+        # Excluded before ranking, so each thread still gets ``limit``
+        replies = replies.exclude(author_id__in=list(hidden))
+    rows = (
+        replies
+        .annotate(rank=Window(
+            RowNumber(),
+            partition_by=F('thread_id'),
+            order_by=F('created_at').desc(),
+        ))
+        .filter(rank__lte=limit)
+        .order_by('thread_id', '-created_at')
+        .values_list(*REPLY_COLUMNS)
+    )
+    return [ReplyRow.from_tuple(row) for row in rows]
+
+
+def fill_authors(rows, context):
+    """
+    Fill in the username and verified flag of each row's author from
+    main.briefs, with one lookup for the whole page
+    """
+    request = (context or {}).get('request')
+    records = briefs.get_many({row.author.id for row in rows}, request)
+    for row in rows:
+        record = records.get(row.author.id)
+        if record is not None:
+            row.author.username, row.author.verified = record[1], record[2]
+
+
+def mark_liked_replies(replies, viewer):
+    if viewer is None or not replies:
+        return
+    by_id = {reply.id: reply for reply in replies}
+    liked = Like.objects.filter(
+        user=viewer, reply_id__in=by_id.keys()
+    ).values_list('reply_id', flat=True)
+    for reply_id in liked:
+        by_id[reply_id].is_liked = True
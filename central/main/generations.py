@@ -0,0 +1,47 @@
+# main/generations.py
+"""
+Per-user generation numbers for cache keys.
+
+A reader that misses the cache, loads a record from the database and
+stores it can race with a writer that changes the row and deletes the
+entry in between: the reader then stores the old record after the delete,
+and it stays until it expires. Writers therefore ``bump()`` the user's
+generation instead, and readers put it in the entry's key. A reader
+fetches the generation before it reads the database, so a record loaded
+before a change is stored under a generation nobody reads any more.
+
+Generations never expire. One that was evicted starts again from the
+clock, which is ahead of every generation handed out before.
+"""
+import time
+
+
+def _key(prefix, user_id):
+    return f'{prefix}:gen:{user_id}'
+
+
+def get_many(cache, prefix, user_ids):
+    """
+    Return ``{user ID: generation}``
+    """
+    keys = {_key(prefix, user_id): user_id for user_id in user_ids}
+    found = {keys[key]: generation for key, generation in cache.get_many(keys).items()}
+    for key, user_id in keys.items():
+        if user_id not in found:
+            start = time.time_ns()
+            # Another process may have started it first
+            found[user_id] = start if cache.add(key, start, None) else cache.get(key, start)
+    return found
+
+
+def get(cache, prefix, user_id):
+    return get_many(cache, prefix, [user_id])[user_id]
+
+
+def bump(cache, prefix, *user_ids):
+    for user_id in user_ids:
+        key = _key(prefix, user_id)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, time.time_ns(), None)
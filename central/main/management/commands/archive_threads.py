@@ -0,0 +1,40 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from main.archive import archive_batch
+
+
+class Command(BaseCommand):
+    help = (
+        'Move cold threads, with their replies and likes, to the archive '
+        'tables in bounded batches, one transaction per batch.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int,
+                            default=getattr(settings, 'ARCHIVE_AFTER_DAYS', 365),
+                            help='Archive threads with no activity for this many days')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Threads per transaction')
+        parser.add_argument('--max-batches', type=int, default=None,
+                            help='Stop after this many batches')
+        parser.add_argument('--pause', type=float, default=0.0,
+                            help='Seconds to sleep between batches')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        total = batches = 0
+        while options['max_batches'] is None or batches < options['max_batches']:
+            moved = archive_batch(cutoff, options['batch_size'])
+            if not moved:
+                break
+            total += moved
+            batches += 1
+            self.stdout.write(f'Batch {batches}: {moved} threads')
+            if options['pause']:
+                time.sleep(options['pause'])
+        self.stdout.write(f'Archived {total} threads older than {cutoff:%Y-%m-%d}')
@@ -0,0 +1,86 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, connection
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from main import counters
+from main.models import User, Thread
+from main.views import ThreadViewSet
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure concurrent ThreadViewSet.like throughput on a plain and on a '
+        'sharded thread counter. Likes are committed, so the generated users '
+        'and threads are deleted afterwards. Run against PostgreSQL or MySQL; '
+        'SQLite serializes all writers and shows no difference.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--likes', type=int, default=2000,
+                            help='Likes sent per thread')
+        parser.add_argument('--concurrency', type=int, default=32,
+                            help='Number of client threads')
+
+    def handle(self, *args, **options):
+        if connection.vendor == 'sqlite':
+            self.stderr.write('SQLite allows a single writer; numbers are not meaningful.')
+
+        users = User.objects.bulk_create(
+            User(username=f'bench_liker_{i}') for i in range(options['likes'])
+        )
+        author = User.objects.create_user(username='bench_counter_author', password='bench')
+        try:
+            self.stdout.write(
+                f"{'counter':>8} {'likes':>7} {'errors':>7} {'seconds':>8} "
+                f"{'likes/s':>9} {'count':>7}"
+            )
+            for sharded in (False, True):
+                thread = Thread.objects.create(author=author, content='Bench thread')
+                if sharded:
+                    counters.promote(thread.id)
+                self.run(thread, users, options['concurrency'], sharded)
+        finally:
+            User.objects.filter(id__in=[u.id for u in users] + [author.id]).delete()
+
+    def run(self, thread, users, concurrency, sharded):
+        view = ThreadViewSet.as_view({'post': 'like'})
+        factory = APIRequestFactory()
+        pending = iter(users)
+        lock = threading.Lock()
+        results = []
+
+        def work():
+            try:
+                while True:
+                    with lock:
+                        user = next(pending, None)
+                    if user is None:
+                        return
+                    request = factory.post(f'/api/v1/threads/{thread.id}/like/')
+                    force_authenticate(request, user=user)
+                    try:
+                        ok = view(request, pk=thread.id).status_code == 201
+                    except DatabaseError:
+                        ok = False
+                    results.append(ok)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=work) for _ in range(concurrency)]
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - start
+
+        counters.roll_up()
+        count = Thread.with_counts().get(pk=thread.pk).likes_count
+        ok = sum(results)
+        self.stdout.write(
+            f"{'sharded' if sharded else 'plain':>8} {ok:>7} {len(results) - ok:>7} "
+            f'{elapsed:>8.2f} {ok / elapsed:>9.0f} {count:>7}'
+        )
@@ -0,0 +1,77 @@
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.hashers import get_hasher
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings
+from rest_framework.test import APIRequestFactory
+
+from auth.views import CustomTokenObtainPairView
+from main.models import User
+
+PASSWORD = 'correct horse battery staple'
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure concurrent logins per second through CustomTokenObtainPairView '
+        'with each configured password hasher. Throttling is disabled for the '
+        'run; the generated user is deleted afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logins', type=int, default=200,
+                            help='Logins per hasher')
+        parser.add_argument('--concurrency', type=int, default=4,
+                            help='Number of client threads')
+
+    def handle(self, *args, **options):
+        view = CustomTokenObtainPairView.as_view(throttle_classes=())
+
+        user = User.objects.create_user(username='bench_login', password=PASSWORD)
+        try:
+            self.stdout.write(
+                f"{'hasher':>14} {'logins':>7} {'seconds':>8} {'logins/s':>9} {'ms/login':>9}"
+            )
+            for hasher in settings.PASSWORD_HASHERS:
+                with override_settings(PASSWORD_HASHERS=[hasher]):
+                    algorithm = get_hasher().algorithm
+                    user.set_password(PASSWORD)
+                    user.save(update_fields=['password'])
+                    elapsed, ok = self.run(view, options['logins'], options['concurrency'])
+                self.stdout.write(
+                    f'{algorithm:>14} {ok:>7} {elapsed:>8.2f} {ok / elapsed:>9.1f} '
+                    f"{elapsed * 1000 * options['concurrency'] / max(ok, 1):>9.1f}"
+                )
+        finally:
+            user.delete()
+
+    def run(self, view, logins, concurrency):
+        factory = APIRequestFactory()
+        remaining = iter(range(logins))
+        lock = threading.Lock()
+        results = []
+
+        def work():
+            try:
+                while True:
+                    with lock:
+                        if next(remaining, None) is None:
+                            return
+                    request = factory.post(
+                        '/auth/token/', {'username': 'bench_login', 'password': PASSWORD},
+                        format='json',
+                    )
+                    results.append(view(request).status_code == 200)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=work) for _ in range(concurrency)]
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return time.perf_counter() - start, sum(results)
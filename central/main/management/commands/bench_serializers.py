@@ -0,0 +1,106 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Prefetch
+from django.test.client import RequestFactory
+
+from main.fast_serializers import RECENT_REPLIES, FastThreadSerializer
+from main.models import User, Thread, Reply, Like, Follow
+from main.serializers import ThreadSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare ThreadSerializer with FastThreadSerializer on generated feed '
+        'pages. All data is created in a transaction that is rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='20,50,100,200,500',
+                            help='Comma separated page sizes')
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Runs per page size; the median is reported')
+        parser.add_argument('--replies', type=int, default=5,
+                            help='Replies generated per thread')
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',')]
+
+        with transaction.atomic():
+            viewer = self.seed(max(sizes), options['replies'])
+            request = RequestFactory().get('/api/v1/feed/')
+            request.user = viewer
+            context = {'request': request}
+
+            self.stdout.write(
+                f"{'size':>6} {'drf ms':>10} {'queries':>8} "
+                f"{'fast ms':>10} {'queries':>8} {'speedup':>8}"
+            )
+            for size in sizes:
+                drf_ms, drf_queries = self.measure(
+                    lambda: self.drf_page(size, context), options['repeat']
+                )
+                fast_ms, fast_queries = self.measure(
+                    lambda: self.fast_page(size, context), options['repeat']
+                )
+                self.stdout.write(
+                    f'{size:>6} {drf_ms:>10.2f} {drf_queries:>8} '
+                    f'{fast_ms:>10.2f} {fast_queries:>8} {drf_ms / fast_ms:>7.1f}x'
+                )
+            transaction.set_rollback(True)
+
+    def seed(self, threads, replies_per_thread):
+        viewer = User.objects.create_user(username='bench_viewer', password='bench')
+        authors = User.objects.bulk_create(
+            User(username=f'bench_author_{i}', verified=i % 2 == 0)
+            for i in range(20)
+        )
+        Follow.objects.bulk_create(
+            Follow(follower=viewer, followed=author) for author in authors
+        )
+        created = Thread.objects.bulk_create(
+            Thread(author=authors[i % len(authors)], content=f'Bench thread {i} ' * 10)
+            for i in range(threads)
+        )
+        replies = Reply.objects.bulk_create(
+            Reply(thread=thread, author=authors[j % len(authors)], content=f'Reply {j}')
+            for thread in created
+            for j in range(replies_per_thread)
+        )
+        Like.objects.bulk_create(
+            [Like(user=viewer, thread=thread) for thread in created[::2]]
+            + [Like(user=viewer, reply=reply) for reply in replies[::3]]
+        )
+        return viewer
+
+    def drf_page(self, size, context):
+        queryset = Thread.with_counts().select_related('original_thread').prefetch_related(
+            Prefetch(
+                'replies',
+                queryset=Reply.with_counts().order_by('-created_at')[:RECENT_REPLIES],
+                to_attr='recent_replies'
+            )
+        )
+        return ThreadSerializer(queryset[:size], many=True, context=context).data
+
+    def fast_page(self, size, context):
+        rows = FastThreadSerializer.rows_for(Thread.with_counts())[:size]
+        return FastThreadSerializer(rows, context=context).data
+
+    def measure(self, render, repeat):
+        timings = []
+        for _ in range(repeat):
+            queries = 0
+
+            def count_queries(execute, sql, params, many, context):
+                nonlocal queries
+                queries += 1
+                return execute(sql, params, many, context)
+
+            with connection.execute_wrapper(count_queries):
+                start = time.perf_counter()
+                render()
+                timings.append((time.perf_counter() - start) * 1000)
+        return statistics.median(timings), queries
@@ -0,0 +1,108 @@
+import json
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Run in a fresh interpreter per measurement: this process has already
+# imported everything
+CHILD = '''
+import json, sys, time
+start = time.perf_counter()
+import django
+django.setup(set_prefix=False)
+setup = time.perf_counter()
+import central.{entry}
+end = time.perf_counter()
+from main import warmup
+print(json.dumps({{
+    'setup': setup - start, 'application': end - setup, 'total': end - start,
+    'steps': warmup.timings, 'modules': len(sys.modules),
+}}))
+'''
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure how long a new WSGI or ASGI worker takes to boot: django.setup(), '
+        'building the application and each warm-up step (main/warmup.py), as the '
+        'median of --runs fresh interpreters. One more run under -X importtime '
+        'breaks the import time down by package and lists the slowest modules. '
+        'Fails when the median exceeds --budget.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5,
+                            help='Boots to take the median of')
+        parser.add_argument('--asgi', action='store_true',
+                            help='Boot central.asgi instead of central.wsgi')
+        parser.add_argument('--top', type=int, default=15,
+                            help='Number of packages and modules to list')
+        parser.add_argument('--budget', type=float,
+                            default=getattr(settings, 'BOOT_TIME_BUDGET', None),
+                            help='Seconds a boot may take (default BOOT_TIME_BUDGET)')
+
+    def handle(self, *args, **options):
+        entry = 'asgi' if options['asgi'] else 'wsgi'
+        runs = [json.loads(self.boot(entry)[0]) for _ in range(options['runs'])]
+
+        def row(label, get):
+            value = statistics.median(get(run) for run in runs) * 1000
+            self.stdout.write(f'{label:>30} {value:8.1f} ms')
+            return value
+
+        self.stdout.write(f'central.{entry}, median of {len(runs)} boots')
+        row('django.setup()', lambda run: run['setup'])
+        row('application', lambda run: run['application'] - sum(run['steps'].values()))
+        for step in runs[0]['steps']:
+            row(f'warm-up: {step}', lambda run: run['steps'][step])
+        total = row('total', lambda run: run['total'])
+        self.stdout.write(f"{runs[0]['modules']} modules imported")
+
+        self.report_imports(self.boot(entry, '-X', 'importtime')[1], options['top'])
+
+        budget = options['budget']
+        if budget is not None:
+            if total > budget * 1000:
+                raise CommandError(
+                    f'Boot took {total:.0f} ms, over the budget of {budget * 1000:.0f} ms'
+                )
+            self.stdout.write(f'Within the budget of {budget * 1000:.0f} ms')
+
+    def boot(self, entry, *flags):
+        result = subprocess.run(
+            [sys.executable, *flags, '-c', CHILD.format(entry=entry)],
+            # Inherits DJANGO_SETTINGS_MODULE, which --settings also sets
+            capture_output=True, text=True, cwd=settings.BASE_DIR,
+        )
+        if result.returncode:
+            raise CommandError(f'Boot failed:\n{result.stderr}')
+        return result.stdout.strip().splitlines()[-1], result.stderr
+
+    def report_imports(self, output, top):
+        """
+        Summarize ``-X importtime`` lines: ``import time: self | cumulative | name``
+        """
+        modules = []
+        for line in output.splitlines():
+            if not line.startswith('import time:'):
+                continue
+            own, _, name = line[len('import time:'):].split('|')
+            if own.strip().isdigit():
+                modules.append((int(own) / 1000, name.strip()))
+
+        packages = defaultdict(float)
+        for own, name in modules:
+            packages[name.split('.')[0]] += own
+        self.stdout.write(
+            f'\nImport time by package (-X importtime, own time, '
+            f'{sum(packages.values()):.1f} ms in all)'
+        )
+        for package, own in sorted(packages.items(), key=lambda item: -item[1])[:top]:
+            self.stdout.write(f'{package:>30} {own:8.1f} ms')
+        self.stdout.write('\nSlowest modules (own time)')
+        for own, name in sorted(modules, reverse=True)[:top]:
+            self.stdout.write(f'{name:>50} {own:8.1f} ms')
@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+
+from main import dataio
+
+
+class Command(BaseCommand):
+    help = (
+        'Import a directory written by export_data (or hand-made NDJSON/CSV '
+        'files named after the tables) in a single transaction.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory', help='Dataset directory')
+        parser.add_argument('--tables', default='',
+                            help='Comma separated tables (default: all present)')
+        parser.add_argument('--keep-ids', action='store_true',
+                            help='Insert rows with their IDs unchanged, e.g. into an '
+                                 'empty database')
+        parser.add_argument('--batch-size', type=int, default=2000,
+                            help='Rows per INSERT')
+
+    def handle(self, *args, **options):
+        tables = [name for name in options['tables'].split(',') if name]
+        start = time.perf_counter()
+        try:
+            for name, rows in dataio.import_dataset(
+                    options['directory'], tables, options['keep_ids'], options['batch_size']):
+                self.stdout.write(f'{name}: {rows} rows')
+        except (ValueError, IntegrityError) as e:
+            raise CommandError(f'Import rolled back: {e}')
+        self.stdout.write(f'Imported in {time.perf_counter() - start:.1f}s')
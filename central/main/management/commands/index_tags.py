@@ -0,0 +1,75 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Max, Min
+
+from main.models import Thread, Reply
+from main.tags import index_range
+
+MODELS = {'threads': Thread, 'replies': Reply}
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuild the hashtag and mention index of existing threads and replies. '
+        'Primary-key ranges of --batch-size posts are indexed by --workers '
+        'threads, each batch in its own transaction; rerunning replaces the '
+        'entries of every batch, so an interrupted run can simply be repeated.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Posts per batch')
+        parser.add_argument('--workers', type=int, default=4,
+                            help='Number of worker threads')
+        parser.add_argument('--only', choices=sorted(MODELS),
+                            help='Index only threads or only replies')
+
+    def handle(self, *args, **options):
+        for name, model in MODELS.items():
+            if options['only'] and name != options['only']:
+                continue
+            bounds = model.objects.aggregate(first=Min('pk'), last=Max('pk'))
+            if bounds['first'] is None:
+                continue
+            batch_size = options['batch_size']
+            ranges = iter([
+                (start, start + batch_size)
+                for start in range(bounds['first'], bounds['last'] + 1, batch_size)
+            ])
+            start = time.perf_counter()
+            posts = self.run(model, ranges, options['workers'])
+            elapsed = time.perf_counter() - start
+            self.stdout.write(
+                f'{name}: {posts} indexed in {elapsed:.1f}s '
+                f'({posts / elapsed if elapsed else 0:.0f}/s)'
+            )
+
+    def run(self, model, ranges, workers):
+        lock = threading.Lock()
+        counts = []
+        errors = []
+
+        def work():
+            try:
+                while not errors:
+                    with lock:
+                        bounds = next(ranges, None)
+                    if bounds is None:
+                        return
+                    counts.append(index_range(model, *bounds))
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=work) for _ in range(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise errors[0]
+        return sum(counts)
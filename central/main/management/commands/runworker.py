@@ -0,0 +1,77 @@
+import logging
+import os
+import signal
+import socket
+import threading
+
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, connection
+
+from main import taskqueue
+
+logger = logging.getLogger(__name__)
+
+# Longest wait, in seconds, between attempts while the database fails
+MAX_ERROR_BACKOFF = 60
+
+
+class Command(BaseCommand):
+    help = 'Run pending background tasks from the database queue.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=1,
+                            help='Number of worker threads')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Seconds to wait when the queue is empty')
+        parser.add_argument('--once', action='store_true',
+                            help='Exit once no due tasks are left')
+
+    def handle(self, *args, **options):
+        taskqueue.load_task_modules()
+        self.stop = threading.Event()
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, lambda *_: self.stop.set())
+            signal.signal(signal.SIGINT, lambda *_: self.stop.set())
+
+        prefix = f'{socket.gethostname()}:{os.getpid()}'
+        threads = [
+            threading.Thread(
+                target=self.work,
+                args=(f'{prefix}:{i}', options['poll_interval'], options['once']),
+                daemon=True,
+            )
+            for i in range(options['concurrency'])
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(timeout=0.5)
+        self.stdout.write('Worker stopped')
+
+    def work(self, worker_id, poll_interval, once):
+        backoff = poll_interval
+        try:
+            while not self.stop.is_set():
+                try:
+                    tasks = taskqueue.claim(worker_id)
+                    if not tasks:
+                        if once:
+                            return
+                        self.stop.wait(poll_interval)
+                        continue
+                    ok = taskqueue.execute(tasks)
+                except DatabaseError:
+                    # E.g. the database restarted; tasks claimed before the
+                    # error are reclaimed once their lock times out
+                    logger.exception('%s: database error, retrying in %ss', worker_id, backoff)
+                    connection.close()
+                    self.stop.wait(backoff)
+                    backoff = min(max(backoff, 0.1) * 2, MAX_ERROR_BACKOFF)
+                    continue
+                backoff = poll_interval
+                self.stdout.write(
+                    f"{worker_id} {tasks[0].name} x{len(tasks)} {'ok' if ok else 'failed'}"
+                )
+        finally:
+            connection.close()
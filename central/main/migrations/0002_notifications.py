@@ -0,0 +1,43 @@
+# Generated by Django 5.1.3 on 2026-10-19 02:47
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='unread_notifications',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='Notification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('verb', models.CharField(choices=[('like', 'Like'), ('reply', 'Reply'), ('repost', 'Repost'), ('follow', 'Follow')], max_length=10)),
+                ('group_key', models.CharField(max_length=64)),
+                ('window_start', models.DateTimeField()),
+                ('actors_count', models.PositiveIntegerField(default=1)),
+                ('is_read', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField()),
+                ('last_actor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('recipient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to=settings.AUTH_USER_MODEL)),
+                ('reply', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='main.reply')),
+                ('thread', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='main.thread')),
+            ],
+            options={
+                'db_table': 'notifications',
+                'ordering': ['-updated_at', '-id'],
+                'indexes': [models.Index(fields=['recipient', '-updated_at', '-id'], name='notificatio_recipie_48d8a9_idx')],
+                'constraints': [models.UniqueConstraint(fields=('recipient', 'group_key', 'window_start'), name='unique_notification_group')],
+            },
+        ),
+    ]
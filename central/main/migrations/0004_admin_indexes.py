@@ -0,0 +1,22 @@
+# Generated by Django 5.1.3 on 2026-10-19 02:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0003_tasks'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='thread',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+        migrations.AddIndex(
+            model_name='reply',
+            index=models.Index(fields=['thread', 'created_at'], name='replies_thread__a276b9_idx'),
+        ),
+    ]
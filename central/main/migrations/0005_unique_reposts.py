@@ -0,0 +1,50 @@
+# Generated by Django 5.1.3 on 2026-10-19 02:53
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def flatten_reposts(apps, schema_editor):
+    """
+    Point every repost at the root of its chain and keep only the earliest
+    repost per author and root, so the unique constraint can be added
+    """
+    Thread = apps.get_model('main', 'Thread')
+    parents = dict(
+        Thread.objects.filter(is_repost=True).values_list('id', 'original_thread_id')
+    )
+    for thread_id, parent_id in parents.items():
+        root_id, seen = parent_id, {thread_id}
+        while root_id in parents and root_id not in seen:
+            seen.add(root_id)
+            root_id = parents[root_id]
+        if root_id != parent_id:
+            Thread.objects.filter(id=thread_id).update(original_thread_id=root_id)
+
+    duplicates = (
+        Thread.objects.filter(is_repost=True, original_thread__isnull=False)
+        .values('author_id', 'original_thread_id')
+        .annotate(n=Count('id'), keep=Min('id'))
+        .filter(n__gt=1)
+    )
+    for group in duplicates:
+        Thread.objects.filter(
+            is_repost=True,
+            author_id=group['author_id'],
+            original_thread_id=group['original_thread_id'],
+        ).exclude(id=group['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0004_admin_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(flatten_reposts, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='thread',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_repost', True)), fields=('author', 'original_thread'), name='unique_repost_per_user'),
+        ),
+    ]
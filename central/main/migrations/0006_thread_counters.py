@@ -0,0 +1,77 @@
+# Generated by Django 5.1.3 on 2026-10-19 02:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_counters(apps, schema_editor):
+    Thread = apps.get_model('main', 'Thread')
+    Like = apps.get_model('main', 'Like')
+    Reply = apps.get_model('main', 'Reply')
+    ThreadCounter = apps.get_model('main', 'ThreadCounter')
+
+    def counts(queryset, field, ids):
+        return dict(
+            queryset.filter(**{f'{field}__in': ids})
+            .order_by().values_list(field).annotate(n=Count('id'))
+        )
+
+    ids = Thread.objects.order_by('id').values_list('id', flat=True)
+    last_id = 0
+    while True:
+        chunk = list(ids.filter(id__gt=last_id)[:1000])
+        if not chunk:
+            break
+        likes = counts(Like.objects, 'thread_id', chunk)
+        replies = counts(Reply.objects, 'thread_id', chunk)
+        reposts = counts(Thread.objects, 'original_thread_id', chunk)
+        ThreadCounter.objects.bulk_create([
+            ThreadCounter(
+                thread_id=thread_id,
+                likes=likes.get(thread_id, 0),
+                replies=replies.get(thread_id, 0),
+                reposts=reposts.get(thread_id, 0),
+            )
+            for thread_id in chunk
+        ])
+        last_id = chunk[-1]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0005_unique_reposts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ThreadCounter',
+            fields=[
+                ('thread', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='counter', serialize=False, to='main.thread')),
+                ('likes', models.IntegerField(default=0)),
+                ('replies', models.IntegerField(default=0)),
+                ('reposts', models.IntegerField(default=0)),
+                ('sharded', models.BooleanField(default=False)),
+            ],
+            options={
+                'db_table': 'thread_counters',
+            },
+        ),
+        migrations.CreateModel(
+            name='ThreadCounterShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shard', models.PositiveSmallIntegerField()),
+                ('likes', models.IntegerField(default=0)),
+                ('replies', models.IntegerField(default=0)),
+                ('reposts', models.IntegerField(default=0)),
+                ('thread', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='counter_shards', to='main.thread')),
+            ],
+            options={
+                'db_table': 'thread_counter_shards',
+                'unique_together': {('thread', 'shard')},
+            },
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 5.1.3 on 2026-10-19 03:10
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0006_thread_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedThread',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('content', models.TextField(max_length=500)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('is_repost', models.BooleanField(default=False)),
+                ('original_thread_id', models.BigIntegerField(blank=True, null=True)),
+                ('likes_count', models.PositiveIntegerField(default=0)),
+                ('replies_count', models.PositiveIntegerField(default=0)),
+                ('reposts_count', models.PositiveIntegerField(default=0)),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_threads', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'archived_threads',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedReply',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('content', models.TextField(max_length=500)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('likes_count', models.PositiveIntegerField(default=0)),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_replies', to=settings.AUTH_USER_MODEL)),
+                ('thread', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='replies', to='main.archivedthread')),
+            ],
+            options={
+                'db_table': 'archived_replies',
+                'ordering': ['created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedLike',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField()),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('reply', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='likes', to='main.archivedreply')),
+                ('thread', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='likes', to='main.archivedthread')),
+            ],
+            options={
+                'db_table': 'archived_likes',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='archivedreply',
+            index=models.Index(fields=['thread', 'created_at'], name='archived_re_thread__544643_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.1.3 on 2026-10-19 03:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0007_archive'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='follow',
+            index=models.Index(fields=['followed', '-created_at', '-id'], name='follows_followe_fa8fc8_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='follow',
+            index=models.Index(fields=['follower', '-created_at', '-id'], name='follows_followe_92efa4_idx'),
+        ),
+    ]
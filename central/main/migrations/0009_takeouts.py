@@ -0,0 +1,34 @@
+# Generated by Django 5.1.3 on 2026-10-19 03:14
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0008_follow_list_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Takeout',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('ready', 'Ready'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('progress', models.JSONField(default=dict)),
+                ('rows_written', models.BigIntegerField(default=0)),
+                ('bytes_written', models.BigIntegerField(default=0)),
+                ('seconds', models.FloatField(default=0)),
+                ('file', models.CharField(blank=True, max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='takeouts', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'takeouts',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.1.3 on 2026-10-19 03:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0009_takeouts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BlockedTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=100, unique=True)),
+                ('action', models.CharField(choices=[('reject', 'Reject'), ('flag', 'Flag for review')], default='reject', max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True, db_index=True)),
+            ],
+            options={
+                'db_table': 'blocked_terms',
+                'ordering': ['term'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ModerationFlag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('terms', models.JSONField(default=list)),
+                ('reviewed', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('reply', models.OneToOneField(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='moderation_flag', to='main.reply')),
+                ('thread', models.OneToOneField(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='moderation_flag', to='main.thread')),
+            ],
+            options={
+                'db_table': 'moderation_flags',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['reviewed', '-created_at'], name='moderation__reviewe_d849e8_idx')],
+            },
+        ),
+    ]
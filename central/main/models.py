@@ -1,7 +1,42 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.utils import timezone
-from django.db.models import Count
+from django.db.models import (
+    Case, Count, Exists, F, IntegerField, OuterRef, Subquery, Sum, Value, When
+)
+from django.db.models.functions import Coalesce
+
+
+def related_count(model, field):
+    """
+    Correlated COUNT(*) of ``model`` rows pointing at the outer row through
+    ``field``. Unlike several Count() annotations over joins, these do not
+    multiply each other and only run for the rows actually fetched.
+    """
+    counts = (
+        model.objects.filter(**{field: OuterRef('pk')})
+        .order_by().values(field)
+        .annotate(n=Count('pk')).values('n')
+    )
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def counter_value(field, fallback):
+    """
+    Thread count read from ThreadCounter plus, for sharded threads, the sum
+    of the shards not rolled up yet. ``fallback`` is used for threads that
+    have no counter row (e.g. rows written with bulk_create).
+    """
+    shards = (
+        ThreadCounterShard.objects.filter(thread=OuterRef('pk'))
+        .order_by().values('thread')
+        .annotate(n=Sum(field)).values('n')
+    )
+    return Coalesce(F(f'counter__{field}'), fallback) + Case(
+        When(counter__sharded=True,
+             then=Coalesce(Subquery(shards, output_field=IntegerField()), 0)),
+        default=Value(0),
+    )
 
 class User(AbstractUser):
     """
@@ -11,14 +46,56 @@ class User(AbstractUser):
     # profile_picture = models.ImageField(upload_to='profile_pics/', blank=True)
     verified = models.BooleanField(default=False)
     date_joined = models.DateTimeField(default=timezone.now)
+    # Maintained by main.notifications so the badge needs no query
+    unread_notifications = models.PositiveIntegerField(default=0)
     
     @property
     def followers_count(self):
+        # Prefer the value annotated by with_stats() over a COUNT query
+        if '_followers_count' in self.__dict__:
+            return self._followers_count
         return self.followers.count()
+
+    @followers_count.setter
+    def followers_count(self, value):
+        self._followers_count = value
     
     @property
     def following_count(self):
+        if '_following_count' in self.__dict__:
+            return self._following_count
         return self.following.count()
+
+    @following_count.setter
+    def following_count(self, value):
+        self._following_count = value
+
+    @property
+    def threads_count(self):
+        if '_threads_count' in self.__dict__:
+            return self._threads_count
+        return self.threads.count()
+
+    @threads_count.setter
+    def threads_count(self, value):
+        self._threads_count = value
+
+    @classmethod
+    def with_stats(cls, viewer=None):
+        """
+        Users annotated with their follower, following and thread counts
+        and, for an authenticated ``viewer``, ``is_following``
+        """
+        queryset = cls.objects.annotate(
+            followers_count=related_count(Follow, 'followed'),
+            following_count=related_count(Follow, 'follower'),
+            threads_count=related_count(Thread, 'author'),
+        )
+        if viewer is not None and viewer.is_authenticated:
+            queryset = queryset.annotate(is_following=Exists(
+                Follow.objects.filter(follower=viewer, followed=OuterRef('pk'))
+            ))
+        return queryset
     
     class Meta:
         db_table = 'users'
@@ -30,9 +107,10 @@ class Thread(models.Model):
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='threads')
     content = models.TextField(max_length=500)
     # image = models.ImageField(upload_to='thread_images/', blank=True, null=True)
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
     updated_at = models.DateTimeField(auto_now=True)
     is_repost = models.BooleanField(default=False)
+    # For reposts this is always the root thread, never another repost
     original_thread = models.ForeignKey(
         'self',
         null=True,
@@ -43,28 +121,91 @@ class Thread(models.Model):
     
     @property
     def likes_count(self):
+        # Prefer the value annotated by with_counts() over a COUNT query
+        if '_likes_count' in self.__dict__:
+            return self._likes_count
         return self.likes.count()
+
+    @likes_count.setter
+    def likes_count(self, value):
+        self._likes_count = value
     
     @property
     def replies_count(self):
+        if '_replies_count' in self.__dict__:
+            return self._replies_count
         return self.replies.count()
+
+    @replies_count.setter
+    def replies_count(self, value):
+        self._replies_count = value
     
     @property
     def reposts_count(self):
+        if '_reposts_count' in self.__dict__:
+            return self._reposts_count
         return self.reposts.count()
+
+    @reposts_count.setter
+    def reposts_count(self, value):
+        self._reposts_count = value
     
     # For efficient querying with counts
     @classmethod
-    def with_counts(cls):
-        return cls.objects.annotate(
-            likes_count=Count('likes'),
-            replies_count=Count('replies'),
-            reposts_count=Count('reposts')
+    def with_counts(cls, queryset=None):
+        """
+        ``queryset`` (all threads by default) annotated with the counts
+        """
+        if queryset is None:
+            queryset = cls.objects.all()
+        return queryset.annotate(
+            likes_count=counter_value('likes', related_count(Like, 'thread')),
+            replies_count=counter_value('replies', related_count(Reply, 'thread')),
+            reposts_count=counter_value('reposts', related_count(Thread, 'original_thread'))
         )
     
     class Meta:
         db_table = 'threads'
         ordering = ['-created_at']  
+        constraints = [
+            models.UniqueConstraint(
+                fields=['author', 'original_thread'],
+                condition=models.Q(is_repost=True),
+                name='unique_repost_per_user'
+            ),
+        ]
+
+class ThreadCounter(models.Model):
+    """
+    Denormalized like/reply/repost counts of a thread, maintained by
+    main.counters. Once a thread is hot (``sharded``), writes go to its
+    ThreadCounterShard rows instead and are periodically rolled up here.
+    """
+    thread = models.OneToOneField(
+        Thread, on_delete=models.CASCADE, primary_key=True, related_name='counter'
+    )
+    likes = models.IntegerField(default=0)
+    replies = models.IntegerField(default=0)
+    reposts = models.IntegerField(default=0)
+    sharded = models.BooleanField(default=False)
+
+    class Meta:
+        db_table = 'thread_counters'
+
+class ThreadCounterShard(models.Model):
+    """
+    One of several rows that absorb concurrent count updates of a hot
+    thread. Values are deltas and may be negative.
+    """
+    thread = models.ForeignKey(Thread, on_delete=models.CASCADE, related_name='counter_shards')
+    shard = models.PositiveSmallIntegerField()
+    likes = models.IntegerField(default=0)
+    replies = models.IntegerField(default=0)
+    reposts = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'thread_counter_shards'
+        unique_together = ['thread', 'shard']
 
 class Reply(models.Model):
     """
@@ -79,18 +220,33 @@ class Reply(models.Model):
     
     @property
     def likes_count(self):
+        # Prefer the value annotated by with_counts() over a COUNT query
+        if '_likes_count' in self.__dict__:
+            return self._likes_count
         return self.likes.count()
+
+    @likes_count.setter
+    def likes_count(self, value):
+        self._likes_count = value
     
     # For efficient querying with counts
     @classmethod
-    def with_counts(cls):
-        return cls.objects.annotate(
-            likes_count=Count('likes')
+    def with_counts(cls, queryset=None):
+        """
+        ``queryset`` (all replies by default) annotated with the like count
+        """
+        if queryset is None:
+            queryset = cls.objects.all()
+        return queryset.annotate(
+            likes_count=related_count(Like, 'reply')
         )
     
     class Meta:
         db_table = 'replies'
         ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['thread', 'created_at']),
+        ]
 
 class Like(models.Model):
     """
@@ -118,4 +274,287 @@ class Follow(models.Model):
     
     class Meta:
         db_table = 'follows'
-        unique_together = ['follower', 'followed']
\ No newline at end of file
+        unique_together = ['follower', 'followed']
+        # Follower and following lists page by (created_at, id)
+        indexes = [
+            models.Index(fields=['followed', '-created_at', '-id']),
+            models.Index(fields=['follower', '-created_at', '-id']),
+        ]
+
+class Block(models.Model):
+    """
+    Hides both users' content from each other and prevents follows,
+    replies and likes between them (see main/blocking.py)
+    """
+    blocker = models.ForeignKey(User, on_delete=models.CASCADE, related_name='blocking')
+    blocked = models.ForeignKey(User, on_delete=models.CASCADE, related_name='blocked_by')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'blocks'
+        unique_together = ['blocker', 'blocked']
+        indexes = [
+            models.Index(fields=['blocked', 'blocker']),
+        ]
+
+class Mute(models.Model):
+    """
+    Hides the muted user's content from the muter's timelines
+    """
+    muter = models.ForeignKey(User, on_delete=models.CASCADE, related_name='muting')
+    muted = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'mutes'
+        unique_together = ['muter', 'muted']
+
+class ArchivedThread(models.Model):
+    """
+    Cold thread moved out of the live tables by main.archive. IDs are kept
+    and the counts are frozen at archival time.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_threads')
+    content = models.TextField(max_length=500)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    is_repost = models.BooleanField(default=False)
+    # The original may be live or archived, so this is not a foreign key
+    original_thread_id = models.BigIntegerField(null=True, blank=True)
+    likes_count = models.PositiveIntegerField(default=0)
+    replies_count = models.PositiveIntegerField(default=0)
+    reposts_count = models.PositiveIntegerField(default=0)
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'archived_threads'
+        ordering = ['-created_at']
+
+class ArchivedReply(models.Model):
+    """
+    Reply of an archived thread, with its like count frozen
+    """
+    id = models.BigIntegerField(primary_key=True)
+    thread = models.ForeignKey(ArchivedThread, on_delete=models.CASCADE, related_name='replies')
+    author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_replies')
+    content = models.TextField(max_length=500)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    likes_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        db_table = 'archived_replies'
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['thread', 'created_at']),
+        ]
+
+class ArchivedLike(models.Model):
+    """
+    Like on an archived thread or one of its replies
+    """
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    thread = models.ForeignKey(ArchivedThread, on_delete=models.CASCADE, related_name='likes', null=True)
+    reply = models.ForeignKey(ArchivedReply, on_delete=models.CASCADE, related_name='likes', null=True)
+    created_at = models.DateTimeField()
+
+    class Meta:
+        db_table = 'archived_likes'
+
+class Takeout(models.Model):
+    """
+    A user's data export, built by main.takeout in the task worker.
+    ``progress`` holds per-file checkpoints so a retried build resumes
+    where the previous attempt stopped.
+    """
+    PENDING = 'pending'
+    RUNNING = 'running'
+    READY = 'ready'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (READY, 'Ready'),
+        (FAILED, 'Failed'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='takeouts')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    progress = models.JSONField(default=dict)
+    rows_written = models.BigIntegerField(default=0)
+    bytes_written = models.BigIntegerField(default=0)
+    # Time spent exporting, summed over attempts
+    seconds = models.FloatField(default=0)
+    file = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'takeouts'
+        ordering = ['-created_at']
+
+class BlockedTerm(models.Model):
+    """
+    Blocklist entry checked by main.moderation. Terms match whole words,
+    case-insensitively.
+    """
+    REJECT = 'reject'
+    FLAG = 'flag'
+    ACTION_CHOICES = [
+        (REJECT, 'Reject'),
+        (FLAG, 'Flag for review'),
+    ]
+
+    term = models.CharField(max_length=100, unique=True)
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES, default=REJECT)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Compared by every process to notice blocklist changes
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        db_table = 'blocked_terms'
+        ordering = ['term']
+
+    def __str__(self):
+        return self.term
+
+class ModerationFlag(models.Model):
+    """
+    Thread or reply that contains blocked terms, awaiting review
+    """
+    thread = models.OneToOneField(
+        Thread, on_delete=models.CASCADE, related_name='moderation_flag', null=True
+    )
+    reply = models.OneToOneField(
+        Reply, on_delete=models.CASCADE, related_name='moderation_flag', null=True
+    )
+    terms = models.JSONField(default=list)
+    reviewed = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'moderation_flags'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['reviewed', '-created_at']),
+        ]
+
+class Hashtag(models.Model):
+    """
+    Inverted index entry: ``tag`` appears in a thread or, when ``reply`` is
+    set, in one of its replies (see main/tags.py)
+    """
+    tag = models.CharField(max_length=100)
+    thread = models.ForeignKey(Thread, on_delete=models.CASCADE, related_name='+')
+    reply = models.ForeignKey(Reply, on_delete=models.CASCADE, related_name='+', null=True)
+    author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    # Copied from the thread or reply so a tag's timeline is one index scan
+    created_at = models.DateTimeField()
+
+    class Meta:
+        db_table = 'hashtags'
+        indexes = [
+            models.Index(fields=['tag', '-created_at', '-id']),
+        ]
+
+class Mention(models.Model):
+    """
+    Inverted index entry: ``user`` is @mentioned in a thread or, when
+    ``reply`` is set, in one of its replies (see main/tags.py)
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='mentions')
+    thread = models.ForeignKey(Thread, on_delete=models.CASCADE, related_name='+')
+    reply = models.ForeignKey(Reply, on_delete=models.CASCADE, related_name='+', null=True)
+    author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    created_at = models.DateTimeField()
+
+    class Meta:
+        db_table = 'mentions'
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id']),
+        ]
+
+class Notification(models.Model):
+    """
+    Aggregated notification: every event of the same kind on the same target
+    within one time window is folded into a single row
+    """
+    LIKE = 'like'
+    REPLY = 'reply'
+    REPOST = 'repost'
+    FOLLOW = 'follow'
+    VERB_CHOICES = [
+        (LIKE, 'Like'),
+        (REPLY, 'Reply'),
+        (REPOST, 'Repost'),
+        (FOLLOW, 'Follow'),
+    ]
+
+    recipient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notifications')
+    verb = models.CharField(max_length=10, choices=VERB_CHOICES)
+    thread = models.ForeignKey(Thread, on_delete=models.CASCADE, related_name='+', null=True)
+    reply = models.ForeignKey(Reply, on_delete=models.CASCADE, related_name='+', null=True)
+    # "<verb>:<thread id>:<reply id>", unique per recipient and window
+    group_key = models.CharField(max_length=64)
+    window_start = models.DateTimeField()
+    last_actor = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    actors_count = models.PositiveIntegerField(default=1)
+    is_read = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField()
+
+    class Meta:
+        db_table = 'notifications'
+        ordering = ['-updated_at', '-id']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipient', 'group_key', 'window_start'],
+                name='unique_notification_group'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['recipient', '-updated_at', '-id']),
+        ]
+
+class Task(models.Model):
+    """
+    Deferred unit of work executed by the runworker command (see
+    main/taskqueue.py)
+    """
+    PENDING = 'pending'
+    RUNNING = 'running'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (FAILED, 'Failed'),
+    ]
+
+    name = models.CharField(max_length=200)
+    kwargs = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    # Set for unique tasks; only one pending task per key may exist
+    dedupe_key = models.CharField(max_length=40, null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    locked_by = models.CharField(max_length=100, blank=True)
+    claim_token = models.UUIDField(null=True, blank=True, db_index=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'tasks'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['dedupe_key'],
+                condition=models.Q(status='pending'),
+                name='unique_pending_task'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['status', 'run_at']),
+        ]
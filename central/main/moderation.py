@@ -0,0 +1,276 @@
+# main/moderation.py
+"""
+Blocklist moderation for threads and replies.
+
+Terms live in the BlockedTerm table. Each process compiles them once into a
+matcher (``MODERATION_MATCHER``) that finds every term in a text in a single
+pass, so checking a post costs the same with ten terms or a hundred
+thousand:
+
+* ``AhoCorasickMatcher``: an Aho-Corasick automaton walked one character at
+  a time in Python
+* ``RegexMatcher``: the terms folded into one regular expression shaped like
+  a trie and run by the ``re`` engine
+
+``python manage.py bench_moderation`` compares them at several blocklist
+sizes. The compiled blocklist is rebuilt when the table changes: every
+``MODERATION_RELOAD_INTERVAL`` seconds a process compares the table's row
+count and latest ``updated_at`` with those it compiled.
+
+Serializers reject content that contains a "reject" term; "flag" terms let
+it through and record a ModerationFlag. Adding, changing or deleting a
+term queues ``rescan``, which re-checks existing threads and replies in
+batches in the task worker: it flags new matches and removes the flags of
+content that no longer matches any term.
+"""
+import re
+import threading
+import time
+import unicodedata
+from collections import deque
+from dataclasses import dataclass
+from functools import lru_cache
+
+from django.conf import settings
+from django.db.models import Count, Max
+from django.utils.module_loading import import_string
+
+from .models import Thread, Reply, BlockedTerm, ModerationFlag
+from .taskqueue import task
+
+
+def normalize(text):
+    """
+    Casefold, apply NFKC and collapse whitespace, for terms and content alike
+    """
+    return ' '.join(unicodedata.normalize('NFKC', text).casefold().split())
+
+
+def _is_word(ch):
+    # Same as \w in str patterns
+    return ch.isalnum() or ch == '_'
+
+
+class AhoCorasickMatcher:
+    """
+    Finds whole-word occurrences of ``terms`` with an Aho-Corasick automaton
+    """
+
+    def __init__(self, terms):
+        goto = [{}]
+        fail = [0]
+        # Terms ending at each state, including those reached by fail links
+        out = [()]
+        for term in terms:
+            state = 0
+            for ch in term:
+                following = goto[state].get(ch)
+                if following is None:
+                    following = len(goto)
+                    goto[state][ch] = following
+                    goto.append({})
+                    fail.append(0)
+                    out.append(())
+                state = following
+            out[state] = (term,)
+
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, following in goto[state].items():
+                queue.append(following)
+                fallback = fail[state]
+                while fallback and ch not in goto[fallback]:
+                    fallback = fail[fallback]
+                fail[following] = goto[fallback].get(ch, 0)
+                out[following] += out[fail[following]]
+
+        self.goto, self.fail, self.out = goto, fail, out
+
+    def find(self, text):
+        goto, fail, out = self.goto, self.fail, self.out
+        found = set()
+        state = 0
+        last = len(text) - 1
+        for i, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state] and (i == last or not _is_word(text[i + 1])):
+                for term in out[state]:
+                    start = i - len(term) + 1
+                    if start == 0 or not _is_word(text[start - 1]):
+                        found.add(term)
+        return found
+
+
+class RegexMatcher:
+    """
+    Finds whole-word occurrences of ``terms`` with one trie-shaped regular
+    expression. The pattern is a lookahead, so overlapping terms are found
+    and every position reports its longest term.
+    """
+
+    def __init__(self, terms):
+        trie = {}
+        for term in terms:
+            node = trie
+            for ch in term:
+                node = node.setdefault(ch, {})
+            node[''] = True
+        self.pattern = re.compile(r'(?=(?<!\w)(' + self._compile(trie) + r')(?!\w))')
+
+    @classmethod
+    def _compile(cls, node):
+        branches = [
+            re.escape(ch) + cls._compile(child)
+            for ch, child in sorted(node.items()) if ch
+        ]
+        optional = '' in node
+        if not branches:
+            return ''
+        if len(branches) == 1 and not optional:
+            return branches[0]
+        group = '(?:' + '|'.join(branches) + ')'
+        return group + '?' if optional else group
+
+    def find(self, text):
+        return set(self.pattern.findall(text))
+
+
+@lru_cache(maxsize=None)
+def get_matcher_class(path=None):
+    return import_string(
+        path or getattr(settings, 'MODERATION_MATCHER', 'main.moderation.RegexMatcher')
+    )
+
+
+@dataclass(frozen=True)
+class Verdict:
+    rejected: frozenset
+    flagged: frozenset
+
+    @property
+    def terms(self):
+        return self.rejected | self.flagged
+
+
+CLEAN = Verdict(frozenset(), frozenset())
+
+
+class Blocklist:
+    """
+    Compiled blocklist: one matcher per action
+    """
+
+    def __init__(self, entries, matcher_class=None):
+        matcher_class = matcher_class or get_matcher_class()
+        terms = {BlockedTerm.REJECT: set(), BlockedTerm.FLAG: set()}
+        for term, action in entries:
+            if term := normalize(term):
+                terms[action].add(term)
+        self.size = sum(len(group) for group in terms.values())
+        self.matchers = {
+            action: matcher_class(group) for action, group in terms.items() if group
+        }
+
+    def scan(self, content):
+        if not self.matchers or not content:
+            return CLEAN
+        text = normalize(content)
+        found = {action: frozenset(matcher.find(text)) for action, matcher in self.matchers.items()}
+        return Verdict(
+            found.get(BlockedTerm.REJECT, frozenset()), found.get(BlockedTerm.FLAG, frozenset())
+        )
+
+
+_lock = threading.Lock()
+_blocklist = None
+_version = None
+_checked_at = 0.0
+
+
+def get_blocklist(max_age=None):
+    """
+    Return this process's compiled blocklist, rebuilding it if the table
+    changed. The table is checked at most every ``max_age`` seconds
+    (``MODERATION_RELOAD_INTERVAL`` by default).
+    """
+    global _blocklist, _version, _checked_at
+    if max_age is None:
+        max_age = getattr(settings, 'MODERATION_RELOAD_INTERVAL', 10)
+    if _blocklist is not None and time.monotonic() - _checked_at < max_age:
+        return _blocklist
+
+    with _lock:
+        # Another thread may have reloaded while this one waited
+        if _blocklist is not None and time.monotonic() - _checked_at < max_age:
+            return _blocklist
+        stats = BlockedTerm.objects.aggregate(count=Count('id'), updated=Max('updated_at'))
+        version = (stats['count'], stats['updated'])
+        if _blocklist is None or version != _version:
+            _blocklist = Blocklist(BlockedTerm.objects.values_list('term', 'action'))
+            _version = version
+        _checked_at = time.monotonic()
+    return _blocklist
+
+
+def blocklist_changed():
+    """
+    Make this process check the table on its next scan
+    """
+    global _checked_at
+    _checked_at = 0.0
+
+
+def scan(content):
+    return get_blocklist().scan(content)
+
+
+def flag(terms, **target):
+    """
+    Flag ``thread=`` or ``reply=`` for review with the terms found in it
+    """
+    ModerationFlag.objects.update_or_create(
+        **target, defaults={'terms': sorted(terms), 'reviewed': False}
+    )
+
+
+RESCAN_TARGETS = {'threads': (Thread, 'thread'), 'replies': (Reply, 'reply')}
+
+
+@task(unique=True)
+def rescan(kind='threads', after=0):
+    """
+    Re-check one batch of existing threads or replies and queue the next
+    """
+    model, field = RESCAN_TARGETS[kind]
+    batch_size = getattr(settings, 'MODERATION_RESCAN_BATCH_SIZE', 1000)
+    blocklist = get_blocklist(max_age=0)
+    if not blocklist.size:
+        # The last term is gone: nothing matches any more
+        ModerationFlag.objects.all().delete()
+        return
+
+    rows = list(
+        model.objects.filter(pk__gt=after).order_by('pk')
+        .values_list('pk', 'content')[:batch_size]
+    )
+    flags = []
+    clean = []
+    for pk, content in rows:
+        terms = blocklist.scan(content).terms
+        if terms:
+            flags.append(ModerationFlag(**{f'{field}_id': pk}, terms=sorted(terms)))
+        else:
+            clean.append(pk)
+    # Flags already reviewed stay reviewed; only their terms are refreshed
+    ModerationFlag.objects.bulk_create(
+        flags, update_conflicts=True, unique_fields=[field], update_fields=['terms']
+    )
+    ModerationFlag.objects.filter(**{f'{field}_id__in': clean}).delete()
+
+    if len(rows) == batch_size:
+        rescan.enqueue(kind=kind, after=rows[-1][0])
+    elif kind == 'threads':
+        rescan.enqueue(kind='replies', after=0)
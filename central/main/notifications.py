@@ -0,0 +1,177 @@
+# main/notifications.py
+"""
+Batched notification pipeline.
+
+Signal handlers call ``record()`` with the IDs involved in an event; nothing
+is queried during the request. Each event is queued as a task when the
+surrounding transaction commits, and the worker writes them in batches:
+recipients are resolved with one query per target type, events for the same
+recipient, target and time window are folded into a single Notification
+row, and each recipient's unread counter is bumped once. Counters go down
+when notifications are read or deleted (including by cascade from deleted
+threads, replies and users) through ``adjust_unread()``.
+"""
+from collections import namedtuple
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import User, Thread, Reply, Notification
+from .taskqueue import task
+
+Event = namedtuple(
+    'Event', ['verb', 'actor_id', 'thread_id', 'reply_id', 'recipient_id', 'occurred_at']
+)
+
+
+def record(verb, actor_id, thread_id=None, reply_id=None, recipient_id=None):
+    """
+    Queue a notification event once the current transaction commits.
+
+    ``recipient_id`` is only needed for follows; for the other verbs the
+    recipient is the author of the reply (``reply_id``, likes on replies) or
+    of the thread (``thread_id``) and is resolved at write time.
+    """
+    write_events.enqueue(
+        verb=verb, actor_id=actor_id, thread_id=thread_id, reply_id=reply_id,
+        recipient_id=recipient_id, occurred_at=timezone.now().isoformat(),
+    )
+
+
+@task(batch_size=getattr(settings, 'NOTIFICATIONS_BATCH_SIZE', 500), max_attempts=5)
+def write_events(items):
+    events = []
+    for item in items:
+        item = dict(item, occurred_at=datetime.fromisoformat(item['occurred_at']))
+        events.append(Event(**item))
+    write_notifications(events)
+
+
+def window_start(moment):
+    window = getattr(settings, 'NOTIFICATIONS_WINDOW', 3600)
+    seconds = int(moment.timestamp()) // window * window
+    return datetime.fromtimestamp(seconds, tz=dt_timezone.utc)
+
+
+def _resolve(events):
+    """
+    Yield ``(event, recipient_id, thread_id, reply_id, group_key)`` for every
+    event whose target still exists and whose recipient is not the actor
+    """
+    thread_ids = {e.thread_id for e in events if e.thread_id and not e.reply_id}
+    reply_ids = {e.reply_id for e in events if e.reply_id}
+    thread_authors = dict(
+        Thread.objects.filter(id__in=thread_ids).values_list('id', 'author_id')
+    ) if thread_ids else {}
+    replies = {
+        pk: (author_id, thread_id) for pk, author_id, thread_id in
+        Reply.objects.filter(id__in=reply_ids).values_list('id', 'author_id', 'thread_id')
+    } if reply_ids else {}
+
+    for event in events:
+        thread_id, reply_id = event.thread_id, None
+        if event.verb == Notification.FOLLOW:
+            recipient_id, thread_id = event.recipient_id, None
+        elif event.reply_id:
+            if event.reply_id not in replies:
+                continue
+            recipient_id, thread_id = replies[event.reply_id]
+            reply_id = event.reply_id
+        else:
+            recipient_id = thread_authors.get(event.thread_id)
+        if recipient_id is None or recipient_id == event.actor_id:
+            continue
+        group_key = f'{event.verb}:{thread_id or ""}:{reply_id or ""}'
+        yield event, recipient_id, thread_id, reply_id, group_key
+
+
+def write_notifications(events):
+    """
+    Aggregate ``events`` into Notification rows. Retries once if a
+    concurrent writer created one of the same groups first.
+    """
+    for attempt in range(2):
+        try:
+            with transaction.atomic():
+                _write(events)
+            return
+        except IntegrityError:
+            if attempt:
+                raise
+
+
+def _write(events):
+    groups = {}
+    for event, recipient_id, thread_id, reply_id, group_key in _resolve(
+            sorted(events, key=lambda e: e.occurred_at)):
+        key = (recipient_id, group_key, window_start(event.occurred_at))
+        group = groups.get(key)
+        if group is None:
+            groups[key] = group = {
+                'verb': event.verb, 'thread_id': thread_id,
+                'reply_id': reply_id, 'count': 0,
+            }
+        group['count'] += 1
+        group['last_actor_id'] = event.actor_id
+        group['updated_at'] = event.occurred_at
+    if not groups:
+        return
+
+    recipients = {key[0] for key in groups}
+    existing = {
+        (n.recipient_id, n.group_key, n.window_start): n
+        for n in Notification.objects.filter(
+            recipient_id__in=recipients,
+            group_key__in={key[1] for key in groups},
+            window_start__in={key[2] for key in groups},
+        )
+    }
+
+    unread = dict.fromkeys(recipients, 0)
+    to_create, to_update = [], []
+    for key, group in groups.items():
+        notification = existing.get(key)
+        if notification is None:
+            unread[key[0]] += 1
+            to_create.append(Notification(
+                recipient_id=key[0], group_key=key[1], window_start=key[2],
+                verb=group['verb'], thread_id=group['thread_id'],
+                reply_id=group['reply_id'], last_actor_id=group['last_actor_id'],
+                actors_count=group['count'], updated_at=group['updated_at'],
+            ))
+            continue
+        if notification.is_read:
+            unread[key[0]] += 1
+        notification.actors_count = F('actors_count') + group['count']
+        notification.last_actor_id = group['last_actor_id']
+        notification.updated_at = group['updated_at']
+        notification.is_read = False
+        to_update.append(notification)
+
+    Notification.objects.bulk_create(to_create)
+    if to_update:
+        Notification.objects.bulk_update(
+            to_update, ['actors_count', 'last_actor', 'updated_at', 'is_read']
+        )
+
+    adjust_unread(unread)
+
+
+def adjust_unread(deltas):
+    """
+    Add ``{recipient ID: delta}`` to the unread counters, with one UPDATE
+    per distinct delta rather than per recipient. Counters do not go below
+    zero.
+    """
+    by_delta = {}
+    for recipient_id, delta in deltas.items():
+        if delta:
+            by_delta.setdefault(delta, []).append(recipient_id)
+    for delta, user_ids in by_delta.items():
+        User.objects.filter(id__in=user_ids).update(
+            unread_notifications=Greatest(F('unread_notifications') + delta, 0)
+        )
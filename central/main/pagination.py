@@ -0,0 +1,117 @@
+# main/pagination.py
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q, QuerySet
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, CursorPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class NotificationCursorPagination(CursorPagination):
+    page_size = 20
+    ordering = ('-updated_at', '-id')
+
+
+class KeysetPagination(BasePagination):
+    """
+    Forward-only pagination on ``(created_at, id)``, newest first. The
+    cursor is the key of the last row served, so every page is an index
+    range scan of ``page_size + 1`` rows however deep the client pages.
+    """
+    page_size = api_settings.PAGE_SIZE
+    max_page_size = 200
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        position = self.decode_cursor(request.query_params.get(self.cursor_query_param))
+        if position is not None:
+            created_at, pk = position
+            queryset = queryset.filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk)
+            )
+        rows = list(queryset.order_by('-created_at', '-pk')[:page_size + 1])
+        self.next_position = None
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            self.next_position = (rows[-1].created_at, rows[-1].pk)
+        return rows
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    def decode_cursor(self, cursor):
+        if not cursor:
+            return None
+        try:
+            created_at, pk = urlsafe_b64decode(cursor.encode('ascii')).decode('ascii').split('|')
+            return datetime.fromisoformat(created_at), int(pk)
+        except (TypeError, ValueError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        created_at, pk = self.next_position
+        cursor = urlsafe_b64encode(f'{created_at.isoformat()}|{pk}'.encode('ascii')).decode('ascii')
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'results': data})
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator for very large tables. An unfiltered queryset is counted from
+    the planner's row estimate instead of COUNT(*), once that estimate is
+    above ``ESTIMATED_COUNT_THRESHOLD`` rows. Filtered querysets and
+    backends without a cheap estimate fall back to an exact count.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if isinstance(queryset, QuerySet) and not queryset.query.where:
+            estimate = estimate_row_count(queryset.model, queryset.db)
+            threshold = getattr(settings, 'ESTIMATED_COUNT_THRESHOLD', 100_000)
+            if estimate is not None and estimate > threshold:
+                return estimate
+        return super().count
+
+
+def estimate_row_count(model, using='default'):
+    """
+    Row estimate from the database statistics, or None when unavailable
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE relname = %s', [table])
+        elif connection.vendor == 'mysql':
+            cursor.execute(
+                'SELECT table_rows FROM information_schema.tables '
+                'WHERE table_schema = DATABASE() AND table_name = %s', [table]
+            )
+        else:
+            return None
+        row = cursor.fetchone()
+    # reltuples is -1 for a table that was never analyzed
+    if row is None or row[0] is None or row[0] < 0:
+        return None
+    return int(row[0])
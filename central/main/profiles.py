@@ -0,0 +1,45 @@
+# main/profiles.py
+"""
+Cache of public profile payloads.
+
+The viewer-independent part of a profile (UserDetailSerializer output
+without ``is_following``) is cached per user in the ``PROFILE_CACHE``
+cache. The signal handlers call ``invalidate()`` when the profile changes
+(profile edits, follows, unfollows and thread creation or deletion), and
+main.archive does when threads are archived. That bumps the user's
+generation in the entry's key (main/generations.py), so a payload built
+from rows read before the change is never served afterwards.
+"""
+from django.conf import settings
+from django.core.cache import caches
+
+from . import generations
+
+# Bump when the payload shape changes so old entries are ignored
+VERSION = 1
+
+
+def _cache():
+    return caches[getattr(settings, 'PROFILE_CACHE', 'default')]
+
+
+def cache_key(user_id, generation):
+    return f'profile:{VERSION}:{user_id}:{generation}'
+
+
+def get_cached(user_id):
+    """
+    Return ``(key, payload)``; on a miss the payload is None and it should
+    be built from the database and passed to ``store()`` with ``key``
+    """
+    # Read before the tables, see main/generations.py
+    key = cache_key(user_id, generations.get(_cache(), 'profile', user_id))
+    return key, _cache().get(key)
+
+
+def store(key, payload):
+    _cache().set(key, payload, getattr(settings, 'PROFILE_CACHE_TIMEOUT', 300))
+
+
+def invalidate(*user_ids):
+    generations.bump(_cache(), 'profile', *user_ids)
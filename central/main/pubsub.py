@@ -0,0 +1,203 @@
+# main/pubsub.py
+"""
+Publish/subscribe backends for live updates.
+
+Publishing is synchronous so it can be called from regular views and signal
+handlers; subscriptions are consumed from async code. The backend is chosen
+with the ``PUBSUB_BACKEND`` setting.
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+
+try:
+    import redis
+except ImportError:  # pragma: no cover - optional dependency
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """
+    Bounded queue of ``(channel, message)`` pairs for one consumer.
+
+    When the consumer falls behind and the queue is full, new messages are
+    dropped and ``overflowed`` is set so the consumer can tell its client to
+    resynchronise instead of letting the backlog grow without limit.
+    """
+
+    def __init__(self, backend, channels, maxsize):
+        self.backend = backend
+        self.channels = frozenset(channels)
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize)
+        self.overflowed = False
+
+    def deliver(self, channel, message):
+        # May be called from any thread; hop onto the consumer's loop
+        try:
+            self.loop.call_soon_threadsafe(self._put, channel, message)
+        except RuntimeError:
+            # The consumer's loop is gone
+            self.backend.unsubscribe(self)
+
+    def _put(self, channel, message):
+        try:
+            self.queue.put_nowait((channel, message))
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    async def get(self, timeout=None):
+        """
+        Next ``(channel, message)`` pair, or None after ``timeout`` seconds
+        """
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.backend.unsubscribe(self)
+
+
+class BasePubSub:
+    def publish(self, channel, message):
+        raise NotImplementedError
+
+    def subscribe(self, channels, maxsize=None):
+        """
+        Return a Subscription for ``channels``. Must be called from a
+        running event loop.
+        """
+        raise NotImplementedError
+
+    def unsubscribe(self, subscription):
+        raise NotImplementedError
+
+
+class InMemoryPubSub(BasePubSub):
+    """
+    Process-local backend. Only subscribers in the same process receive
+    messages, which is enough for a single worker and for tests.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+
+    def publish(self, channel, message):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for subscription in subscribers:
+            subscription.deliver(channel, message)
+
+    def subscribe(self, channels, maxsize=None):
+        if maxsize is None:
+            maxsize = getattr(settings, 'PUBSUB_QUEUE_SIZE', 256)
+        subscription = Subscription(self, channels, maxsize)
+        with self._lock:
+            for channel in subscription.channels:
+                self._subscribers[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                subscribers = self._subscribers.get(channel)
+                if subscribers is None:
+                    continue
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[channel]
+
+
+class RedisPubSub(InMemoryPubSub):
+    """
+    Backend shared by all processes through Redis (``PUBSUB_REDIS_URL``).
+
+    Messages are published to Redis as JSON. Each process runs one listener
+    thread, started on its first subscription, that follows the channels its
+    streams watch and hands what arrives to them like InMemoryPubSub. When
+    the connection drops, messages may be lost meanwhile, so every stream is
+    told to resync once the listener reconnects.
+    """
+
+    def __init__(self):
+        if redis is None:
+            raise ImproperlyConfigured('RedisPubSub requires the redis package.')
+        super().__init__()
+        self._redis = redis.Redis.from_url(
+            getattr(settings, 'PUBSUB_REDIS_URL', 'redis://localhost:6379/0')
+        )
+        self._listener = None
+        self._changed = threading.Event()
+
+    def publish(self, channel, message):
+        try:
+            self._redis.publish(channel, json.dumps(message, separators=(',', ':')))
+        except redis.RedisError:
+            # Live updates are best effort; don't fail the request over them
+            logger.exception('Could not publish to %s', channel)
+
+    def subscribe(self, channels, maxsize=None):
+        subscription = super().subscribe(channels, maxsize)
+        with self._lock:
+            if self._listener is None:
+                self._listener = threading.Thread(
+                    target=self._listen, name='pubsub-listener', daemon=True
+                )
+                self._listener.start()
+        self._changed.set()
+        return subscription
+
+    def _listen(self):
+        delay = getattr(settings, 'PUBSUB_RECONNECT_DELAY', 1.0)
+        while True:
+            try:
+                self._relay()
+            except redis.RedisError:
+                logger.exception('Lost the pub/sub connection, reconnecting')
+            time.sleep(delay)
+            with self._lock:
+                subscriptions = set().union(*self._subscribers.values())
+            for subscription in subscriptions:
+                subscription.overflowed = True
+
+    def _relay(self):
+        pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        listening = set()
+        try:
+            while True:
+                self._changed.clear()
+                with self._lock:
+                    wanted = set(self._subscribers)
+                if wanted - listening:
+                    pubsub.subscribe(*(wanted - listening))
+                if listening - wanted:
+                    pubsub.unsubscribe(*(listening - wanted))
+                listening = wanted
+                if not listening:
+                    self._changed.wait()
+                    continue
+                message = pubsub.get_message(timeout=0.1)
+                if message is not None and message['type'] == 'message':
+                    InMemoryPubSub.publish(
+                        self, message['channel'].decode(), json.loads(message['data'])
+                    )
+        finally:
+            pubsub.close()
+
+
+@lru_cache(maxsize=None)
+def get_pubsub():
+    backend = getattr(settings, 'PUBSUB_BACKEND', 'main.pubsub.InMemoryPubSub')
+    return import_string(backend)()
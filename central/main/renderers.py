@@ -0,0 +1,84 @@
+# main/renderers.py
+from django.conf import settings
+from rest_framework.utils import encoders
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+# Keys whose value is a UserBriefSerializer payload. In compact mode these are
+# replaced by the user ID and the payload is moved to a shared side table.
+USER_KEYS = ('author', 'user', 'follower', 'followed')
+USER_BRIEF_FIELDS = {'id', 'username', 'verified'}
+
+_default = encoders.JSONEncoder().default
+
+
+def compact_users(data):
+    """
+    Replace nested user objects with their ID and return ``(data, users)``,
+    where ``users`` maps each ID (as a string, like any JSON key) to the
+    user object once, however often it appeared
+    """
+    users = {}
+
+    def walk(value):
+        if isinstance(value, list):
+            return [walk(item) for item in value]
+        if not isinstance(value, dict):
+            return value
+        compacted = {}
+        for key, item in value.items():
+            if (key in USER_KEYS and isinstance(item, dict)
+                    and item.keys() == USER_BRIEF_FIELDS):
+                users.setdefault(str(item['id']), item)
+                compacted[key] = item['id']
+            else:
+                compacted[key] = walk(item)
+        return compacted
+
+    return walk(data), users
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer that encodes with orjson when it is installed and supports a
+    compact mode (``?compact=1``) that deduplicates nested user objects into a
+    top level ``users`` table. Falls back to DRF's stdlib encoder for indented
+    output or when orjson is missing.
+    """
+    compact_param = 'compact'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+
+        renderer_context = renderer_context or {}
+        if self.wants_compact(renderer_context.get('request')):
+            data, users = compact_users(data)
+            if isinstance(data, dict):
+                data['users'] = users
+            else:
+                data = {'results': data, 'users': users}
+
+        use_orjson = getattr(settings, 'JSON_RENDERER_USE_ORJSON', True)
+        indent = self.get_indent(accepted_media_type, renderer_context)
+        if orjson is None or not use_orjson or indent is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # Non-string keys occur in validation errors of list fields, e.g.
+        # {"ids": {"0": [...]}}, which the stdlib encoder turns into strings
+        ret = orjson.dumps(data, default=_default, option=orjson.OPT_NON_STR_KEYS)
+        # Match JSONRenderer, which escapes these so the output stays a strict
+        # JavaScript subset
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
+
+    def wants_compact(self, request):
+        if request is None:
+            return False
+        value = request.query_params.get(self.compact_param, '')
+        return value.lower() in ('1', 'true', 'yes')
@@ -1,6 +1,12 @@
 from rest_framework import serializers
+from rest_framework.reverse import reverse
 from django.contrib.auth import get_user_model
-from .models import Thread, Reply, Like, Follow
+from . import blocking, briefs, moderation
+from .fast_serializers import RECENT_REPLIES
+from .models import (
+    Thread, Reply, Like, Follow, Notification, ArchivedThread, ArchivedReply, ArchivedLike,
+    Takeout
+)
 
 User = get_user_model()
 
@@ -13,12 +19,46 @@ class UserBriefSerializer(serializers.ModelSerializer):
         fields = ['id', 'username', 'verified']
 
 
+class UserBriefField(serializers.Field):
+    """
+    Read-only UserBriefSerializer payload resolved through main.briefs from
+    a user ID source (e.g. ``source='author_id'``), so the user row is not
+    loaded
+    """
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, user_id):
+        record = briefs.get(user_id, self.context.get('request'))
+        return briefs.as_dict(record) if record else None
+
+
+class BriefListSerializer(serializers.ListSerializer):
+    """
+    Resolves the UserBriefFields of every item with one main.briefs lookup
+    before serializing them
+    """
+    def to_representation(self, data):
+        items = list(data.all() if hasattr(data, 'all') else data)
+        sources = [
+            field.source for field in self.child.fields.values()
+            if isinstance(field, UserBriefField)
+        ]
+        briefs.get_many(
+            {getattr(item, source) for item in items for source in sources},
+            self.context.get('request')
+        )
+        return super().to_representation(items)
+
+
 class UserDetailSerializer(serializers.ModelSerializer):
     """
     Detailed User serializer for profile views
     """
     followers_count = serializers.IntegerField(read_only=True)
     following_count = serializers.IntegerField(read_only=True)
+    threads_count = serializers.IntegerField(read_only=True)
     is_following = serializers.SerializerMethodField()
     
     class Meta:
@@ -26,7 +66,7 @@ class UserDetailSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'username', 'email', 'bio',
             'verified', 'date_joined', 'followers_count',
-            'following_count', 'is_following'
+            'following_count', 'threads_count', 'is_following'
         ]
         extra_kwargs = {
             'email': {'write_only': True},
@@ -34,6 +74,9 @@ class UserDetailSerializer(serializers.ModelSerializer):
         }
     
     def get_is_following(self, obj):
+        # Annotated by User.with_stats() for the requesting user
+        if hasattr(obj, 'is_following'):
+            return obj.is_following
         request = self.context.get('request')
         if request and request.user.is_authenticated:
             return Follow.objects.filter(
@@ -43,11 +86,62 @@ class UserDetailSerializer(serializers.ModelSerializer):
         return False
 
 
-class ReplySerializer(serializers.ModelSerializer):
+class FollowEntrySerializer(serializers.Serializer):
+    """
+    One user in a follower or following list. ``context['side']`` names the
+    Follow field holding that user; the flags describe the requesting
+    user's relation to them and are annotated by the view.
+    """
+    user = serializers.SerializerMethodField()
+    followed_at = serializers.DateTimeField(source='created_at', read_only=True)
+    follows_you = serializers.BooleanField(read_only=True)
+    you_follow = serializers.BooleanField(read_only=True)
+
+    def get_user(self, obj):
+        # The view resolves the whole page through main.briefs first
+        record = briefs.get(
+            getattr(obj, f"{self.context['side']}_id"), self.context.get('request')
+        )
+        return briefs.as_dict(record) if record else None
+
+
+class ModeratedContentMixin:
+    """
+    Rejects content containing blocked terms and flags content containing
+    terms marked for review (see main/moderation.py)
+    """
+    def validate_content(self, value):
+        verdict = moderation.scan(value)
+        if verdict.rejected:
+            raise serializers.ValidationError('This content is not allowed.')
+        self.flagged_terms = verdict.flagged
+        return value
+
+    def save(self, **kwargs):
+        instance = super().save(**kwargs)
+        if getattr(self, 'flagged_terms', None):
+            moderation.flag(self.flagged_terms, **{instance._meta.model_name: instance})
+        return instance
+
+
+class VisibleListSerializer(BriefListSerializer):
+    """
+    Leaves out items by the authors in ``context['hidden']``
+    (see main/blocking.py)
+    """
+    def to_representation(self, data):
+        hidden = self.context.get('hidden')
+        if hidden:
+            items = data.all() if hasattr(data, 'all') else data
+            data = [item for item in items if item.author_id not in hidden]
+        return super().to_representation(data)
+
+
+class ReplySerializer(ModeratedContentMixin, serializers.ModelSerializer):
     """
     Serializer for replies
     """
-    author = UserBriefSerializer(read_only=True)
+    author = UserBriefField(source='author_id')
     likes_count = serializers.IntegerField(read_only=True)
     is_liked = serializers.SerializerMethodField()
     
@@ -58,7 +152,14 @@ class ReplySerializer(serializers.ModelSerializer):
             'created_at', 'updated_at', 'likes_count', 'is_liked'
         ]
         read_only_fields = ['created_at', 'updated_at']
+        list_serializer_class = VisibleListSerializer
     
+    def validate_thread(self, thread):
+        request = self.context.get('request')
+        if request and blocking.for_request(request).is_blocked(thread.author_id):
+            raise serializers.ValidationError("You cannot reply to this thread")
+        return thread
+
     def get_is_liked(self, obj):
         request = self.context.get('request')
         if request and request.user.is_authenticated:
@@ -73,17 +174,36 @@ class ReplySerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
-class ThreadSerializer(serializers.ModelSerializer):
+class OriginalThreadSerializer(serializers.ModelSerializer):
+    """
+    The reposted thread, inlined into reposts
+    """
+    author = UserBriefField(source='author_id')
+    likes_count = serializers.IntegerField(read_only=True)
+    replies_count = serializers.IntegerField(read_only=True)
+    reposts_count = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Thread
+        fields = [
+            'id', 'author', 'content', 'created_at',
+            'likes_count', 'replies_count', 'reposts_count'
+        ]
+        read_only_fields = fields
+
+
+class ThreadSerializer(ModeratedContentMixin, serializers.ModelSerializer):
     """
     Serializer for threads with basic reply information
     """
-    author = UserBriefSerializer(read_only=True)
+    author = UserBriefField(source='author_id')
+    original = OriginalThreadSerializer(source='original_thread', read_only=True)
     likes_count = serializers.IntegerField(read_only=True)
     replies_count = serializers.IntegerField(read_only=True)
     reposts_count = serializers.IntegerField(read_only=True)
     is_liked = serializers.SerializerMethodField()
     is_reposted = serializers.SerializerMethodField()
-    recent_replies = ReplySerializer(many=True, read_only=True, source='replies')
+    recent_replies = serializers.SerializerMethodField()
     
     class Meta:
         model = Thread
@@ -91,9 +211,12 @@ class ThreadSerializer(serializers.ModelSerializer):
             'id', 'author', 'content', 'created_at',
             'updated_at', 'likes_count', 'replies_count',
             'reposts_count', 'is_liked', 'is_reposted',
-            'is_repost', 'original_thread', 'recent_replies'
+            'is_repost', 'original_thread', 'original', 'recent_replies'
         ]
-        read_only_fields = ['created_at', 'updated_at']
+        # Reposts are only created through ThreadViewSet.repost, which
+        # enforces one repost per user and points it at the root thread
+        read_only_fields = ['created_at', 'updated_at', 'is_repost', 'original_thread']
+        list_serializer_class = BriefListSerializer
     
     def get_is_liked(self, obj):
         request = self.context.get('request')
@@ -107,12 +230,26 @@ class ThreadSerializer(serializers.ModelSerializer):
     def get_is_reposted(self, obj):
         request = self.context.get('request')
         if request and request.user.is_authenticated:
-            return Thread.objects.filter(
-                author=request.user,
-                is_repost=True,
-                original_thread=obj
-            ).exists()
+            # Archived reposts still count, see main/archive.py
+            return any(
+                model.objects.filter(
+                    author=request.user, is_repost=True, original_thread_id=obj.pk
+                ).exists()
+                for model in (Thread, ArchivedThread)
+            )
         return False
+
+    def get_recent_replies(self, obj):
+        # Newest RECENT_REPLIES replies first, like FastThreadSerializer;
+        # ThreadViewSet prefetches them into the same attribute
+        replies = getattr(obj, 'recent_replies', None)
+        if replies is None:
+            replies = Reply.with_counts().filter(thread=obj)
+            hidden = self.context.get('hidden')
+            if hidden:
+                replies = replies.exclude(author_id__in=list(hidden))
+            replies = replies.order_by('-created_at')[:RECENT_REPLIES]
+        return ReplySerializer(replies, many=True, read_only=True, context=self.context).data
     
     def create(self, validated_data):
         validated_data['author'] = self.context['request'].user
@@ -129,16 +266,102 @@ class ThreadDetailSerializer(ThreadSerializer):
         fields = ThreadSerializer.Meta.fields + ['replies']
 
 
+class ArchivedReplySerializer(serializers.ModelSerializer):
+    """
+    Read-only serializer for archived replies, shaped like ReplySerializer
+    """
+    author = UserBriefField(source='author_id')
+    is_liked = serializers.SerializerMethodField()
+    archived = serializers.ReadOnlyField(default=True)
+
+    class Meta:
+        model = ArchivedReply
+        fields = [
+            'id', 'author', 'thread', 'content',
+            'created_at', 'updated_at', 'likes_count', 'is_liked', 'archived'
+        ]
+        read_only_fields = fields
+        list_serializer_class = VisibleListSerializer
+
+    def get_is_liked(self, obj):
+        request = self.context.get('request')
+        if request and request.user.is_authenticated:
+            return ArchivedLike.objects.filter(user=request.user, reply=obj).exists()
+        return False
+
+
+class ArchivedThreadSerializer(serializers.ModelSerializer):
+    """
+    Read-only serializer for archived threads, shaped like
+    ThreadDetailSerializer with the counts frozen at archival time
+    """
+    author = UserBriefField(source='author_id')
+    original_thread = serializers.IntegerField(source='original_thread_id', read_only=True)
+    original = serializers.SerializerMethodField()
+    is_liked = serializers.SerializerMethodField()
+    is_reposted = serializers.SerializerMethodField()
+    replies = ArchivedReplySerializer(many=True, read_only=True)
+    archived = serializers.ReadOnlyField(default=True)
+
+    class Meta:
+        model = ArchivedThread
+        fields = [
+            'id', 'author', 'content', 'created_at',
+            'updated_at', 'likes_count', 'replies_count',
+            'reposts_count', 'is_liked', 'is_reposted',
+            'is_repost', 'original_thread', 'original', 'replies', 'archived'
+        ]
+        read_only_fields = fields
+
+    def get_original(self, obj):
+        if not obj.original_thread_id:
+            return None
+        original = Thread.with_counts().filter(pk=obj.original_thread_id).first()
+        if original is not None:
+            return OriginalThreadSerializer(original, context=self.context).data
+        original = ArchivedThread.objects.filter(pk=obj.original_thread_id).first()
+        if original is not None:
+            record = briefs.get(original.author_id, self.context.get('request'))
+            return {
+                'id': original.id,
+                'author': briefs.as_dict(record) if record else None,
+                'content': original.content,
+                'created_at': serializers.DateTimeField().to_representation(original.created_at),
+                'likes_count': original.likes_count,
+                'replies_count': original.replies_count,
+                'reposts_count': original.reposts_count,
+            }
+        return None
+
+    def get_is_liked(self, obj):
+        request = self.context.get('request')
+        if request and request.user.is_authenticated:
+            return ArchivedLike.objects.filter(user=request.user, thread=obj).exists()
+        return False
+
+    def get_is_reposted(self, obj):
+        # Live reposts keep their original live, so only archived ones count
+        request = self.context.get('request')
+        if request and request.user.is_authenticated:
+            return ArchivedThread.objects.filter(
+                author=request.user, is_repost=True, original_thread_id=obj.id
+            ).exists()
+        return False
+
+
 class LikeSerializer(serializers.ModelSerializer):
     """
     Serializer for likes
     """
-    user = UserBriefSerializer(read_only=True)
+    user = UserBriefField(source='user_id')
     
     class Meta:
         model = Like
         fields = ['id', 'user', 'thread', 'reply', 'created_at']
         read_only_fields = ['created_at']
+        # The generated unique_together validators would make both thread
+        # and reply required; duplicates are checked in validate() instead
+        validators = []
     
     def validate(self, data):
         if not data.get('thread') and not data.get('reply'):
@@ -149,6 +372,9 @@ class LikeSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(
                 "Cannot like both thread and reply simultaneously"
             )
+        target = {'thread': data['thread']} if data.get('thread') else {'reply': data['reply']}
+        if Like.objects.filter(user=self.context['request'].user, **target).exists():
+            raise serializers.ValidationError("Already liked")
         return data
     
     def create(self, validated_data):
@@ -160,8 +386,8 @@ class FollowSerializer(serializers.ModelSerializer):
     """
     Serializer for follows
     """
-    follower = UserBriefSerializer(read_only=True)
-    followed = UserBriefSerializer(read_only=True)
+    follower = UserBriefField(source='follower_id')
+    followed = UserBriefField(source='followed_id')
     
     class Meta:
         model = Follow
@@ -169,7 +395,7 @@ class FollowSerializer(serializers.ModelSerializer):
         read_only_fields = ['created_at']
     
     def validate(self, data):
-        followed_id = self.context['request'].data.get('followed')
+        followed_id = self.initial_data.get('followed')
         if not followed_id:
             raise serializers.ValidationError("Followed user ID is required")
             
@@ -180,10 +406,97 @@ class FollowSerializer(serializers.ModelSerializer):
             
         if followed == self.context['request'].user:
             raise serializers.ValidationError("Cannot follow yourself")
+
+        if blocking.for_request(self.context['request']).is_blocked(followed.id):
+            raise serializers.ValidationError("Cannot follow this user")
+
+        if Follow.objects.filter(
+            follower=self.context['request'].user, followed=followed
+        ).exists():
+            raise serializers.ValidationError("Already following this user")
             
         data['followed'] = followed
         return data
     
     def create(self, validated_data):
         validated_data['follower'] = self.context['request'].user
-        return super().create(validated_data)
\ No newline at end of file
+        return super().create(validated_data)
+
+
+class NotificationSerializer(serializers.ModelSerializer):
+    """
+    Serializer for aggregated notifications
+    """
+    last_actor = UserBriefField(source='last_actor_id')
+    text = serializers.SerializerMethodField()
+
+    ACTIONS = {
+        Notification.LIKE: 'liked your {target}',
+        Notification.REPLY: 'replied to your thread',
+        Notification.REPOST: 'reposted your thread',
+        Notification.FOLLOW: 'followed you',
+    }
+
+    class Meta:
+        model = Notification
+        fields = [
+            'id', 'verb', 'thread', 'reply', 'last_actor', 'actors_count',
+            'text', 'is_read', 'created_at', 'updated_at'
+        ]
+        read_only_fields = fields
+        list_serializer_class = BriefListSerializer
+
+    def get_text(self, obj):
+        # e.g. "alice and 41 others liked your thread"
+        record = briefs.get(obj.last_actor_id, self.context.get('request'))
+        actors = record[1] if record else 'Someone'
+        others = obj.actors_count - 1
+        if others == 1:
+            actors += ' and 1 other'
+        elif others > 1:
+            actors += f' and {others} others'
+        target = 'reply' if obj.reply_id else 'thread'
+        return f"{actors} {self.ACTIONS[obj.verb].format(target=target)}"
+
+
+class MarkReadSerializer(serializers.Serializer):
+    """
+    Body of NotificationViewSet.mark_read: the notification IDs to mark as
+    read, or none to mark all of them
+    """
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), required=False, max_length=1000
+    )
+
+
+class TakeoutSerializer(serializers.ModelSerializer):
+    """
+    Status and throughput of a data export
+    """
+    rows_per_second = serializers.SerializerMethodField()
+    sections = serializers.SerializerMethodField()
+    download_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Takeout
+        fields = [
+            'id', 'status', 'rows_written', 'bytes_written', 'seconds',
+            'rows_per_second', 'sections', 'created_at', 'finished_at', 'download_url'
+        ]
+        read_only_fields = fields
+
+    def get_rows_per_second(self, obj):
+        return round(obj.rows_written / obj.seconds) if obj.seconds else None
+
+    def get_sections(self, obj):
+        return {
+            name: {'rows': state['rows'], 'done': state['done']}
+            for name, state in obj.progress.items()
+        }
+
+    def get_download_url(self, obj):
+        if obj.status != Takeout.READY:
+            return None
+        return reverse(
+            'takeout-download', kwargs={'pk': obj.pk}, request=self.context.get('request')
+        )
@@ -0,0 +1,146 @@
+# main/signals.py
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from . import blocking, briefs, counters, moderation, notifications, profiles, tags
+from .models import (
+    User, Thread, Reply, Like, Follow, Block, Mute, Notification, BlockedTerm,
+)
+from .streams import publish_new_thread, publish_count_delta
+
+
+@receiver(post_save, sender=Thread)
+def thread_created(sender, instance, created, **kwargs):
+    if not created:
+        return
+    counters.create_counter(instance.pk)
+    profiles.invalidate(instance.author_id)
+    publish_new_thread(instance)
+    if instance.is_repost and instance.original_thread_id:
+        counters.increment(instance.original_thread_id, 'reposts', 1)
+        publish_count_delta(instance.original_thread_id, 'reposts', 1)
+        notifications.record(
+            Notification.REPOST, instance.author_id, thread_id=instance.original_thread_id
+        )
+
+
+@receiver(post_delete, sender=Thread)
+def thread_deleted(sender, instance, **kwargs):
+    profiles.invalidate(instance.author_id)
+    if instance.is_repost and instance.original_thread_id:
+        counters.increment(instance.original_thread_id, 'reposts', -1)
+        publish_count_delta(instance.original_thread_id, 'reposts', -1)
+
+
+@receiver(post_save, sender=Reply)
+def reply_created(sender, instance, created, **kwargs):
+    if created:
+        counters.increment(instance.thread_id, 'replies', 1)
+        publish_count_delta(instance.thread_id, 'replies', 1)
+        notifications.record(
+            Notification.REPLY, instance.author_id, thread_id=instance.thread_id
+        )
+
+
+@receiver(post_delete, sender=Reply)
+def reply_deleted(sender, instance, **kwargs):
+    counters.increment(instance.thread_id, 'replies', -1)
+    publish_count_delta(instance.thread_id, 'replies', -1)
+
+
+@receiver(post_save, sender=Thread)
+@receiver(post_save, sender=Reply)
+def post_saved(sender, instance, created, update_fields=None, **kwargs):
+    if created or update_fields is None or 'content' in update_fields:
+        tags.index_post(instance, created)
+
+
+@receiver(post_save, sender=Like)
+def like_created(sender, instance, created, **kwargs):
+    if not created:
+        return
+    if instance.thread_id:
+        counters.increment(instance.thread_id, 'likes', 1)
+        publish_count_delta(instance.thread_id, 'likes', 1)
+    notifications.record(
+        Notification.LIKE, instance.user_id,
+        thread_id=instance.thread_id, reply_id=instance.reply_id
+    )
+
+
+@receiver(post_delete, sender=Like)
+def like_deleted(sender, instance, **kwargs):
+    if instance.thread_id:
+        counters.increment(instance.thread_id, 'likes', -1)
+        publish_count_delta(instance.thread_id, 'likes', -1)
+
+
+@receiver(post_delete, sender=Notification)
+def notification_deleted(sender, instance, **kwargs):
+    # Also cascaded from deleted threads, replies and actors
+    if not instance.is_read:
+        notifications.adjust_unread({instance.recipient_id: -1})
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if created:
+        profiles.invalidate(instance.follower_id, instance.followed_id)
+        notifications.record(
+            Notification.FOLLOW, instance.follower_id, recipient_id=instance.followed_id
+        )
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    profiles.invalidate(instance.follower_id, instance.followed_id)
+
+
+@receiver(post_save, sender=Block)
+@receiver(post_delete, sender=Block)
+def block_changed(sender, instance, **kwargs):
+    blocking.invalidate(instance.blocker_id, instance.blocked_id)
+
+
+@receiver(post_save, sender=Mute)
+@receiver(post_delete, sender=Mute)
+def mute_changed(sender, instance, **kwargs):
+    blocking.invalidate(instance.muter_id)
+
+
+# Fields that appear in the cached public profile and brief user records.
+# QuerySet.update() sends no post_save: code that changes these fields
+# with it must call profiles.invalidate() and briefs.invalidate() itself.
+PROFILE_FIELDS = {'username', 'bio', 'verified', 'date_joined'}
+BRIEF_FIELDS = {'username', 'verified'}
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, update_fields=None, **kwargs):
+    # Logins and password changes save other fields only
+    if created:
+        return
+    if update_fields is None or PROFILE_FIELDS & set(update_fields):
+        profiles.invalidate(instance.pk)
+    if update_fields is None or BRIEF_FIELDS & set(update_fields):
+        briefs.invalidate(instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    profiles.invalidate(instance.pk)
+    briefs.invalidate(instance.pk)
+
+
+@receiver(post_save, sender=BlockedTerm)
+def blocked_term_saved(sender, instance, **kwargs):
+    moderation.blocklist_changed()
+    # Existing content may contain the new or changed term
+    moderation.rescan.enqueue()
+
+
+@receiver(post_delete, sender=BlockedTerm)
+def blocked_term_deleted(sender, instance, **kwargs):
+    moderation.blocklist_changed()
+    # Flags may rest on the deleted term alone
+    moderation.rescan.enqueue()
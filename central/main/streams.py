@@ -0,0 +1,189 @@
+# main/streams.py
+"""
+Server-sent event stream of live feed and engagement updates.
+
+A client opens ``GET /api/v1/stream/?threads=1,2,3`` and receives:
+
+* ``threads`` events listing new threads by the authors it follows
+* ``counts`` events with the summed like/reply/repost deltas of the threads
+  it is viewing, coalesced over ``STREAM_COALESCE_INTERVAL`` seconds;
+  threads by users it blocks or is blocked by are left out
+* a ``resync`` event when it fell too far behind and updates were dropped;
+  the client should refetch instead of applying deltas
+
+The stream is an async iterator, which only ASGI servers send as it is
+produced; under WSGI the endpoint answers 501.
+"""
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.http import JsonResponse, StreamingHttpResponse
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from . import blocking
+from .models import Follow, Thread
+from .pubsub import get_pubsub
+
+# Upper bound on the number of threads a single stream can watch
+MAX_WATCHED_THREADS = 100
+
+AUTHOR_PREFIX = 'author:'
+THREAD_PREFIX = 'thread:'
+
+
+def author_channel(user_id):
+    return f'{AUTHOR_PREFIX}{user_id}'
+
+
+def thread_channel(thread_id):
+    return f'{THREAD_PREFIX}{thread_id}'
+
+
+def publish_new_thread(thread):
+    message = {
+        'id': thread.id,
+        'author': thread.author_id,
+        'is_repost': thread.is_repost,
+        'original_thread': thread.original_thread_id,
+    }
+    transaction.on_commit(
+        lambda: get_pubsub().publish(author_channel(thread.author_id), message)
+    )
+
+
+def publish_count_delta(thread_id, field, delta):
+    message = {'thread': thread_id, field: delta}
+    transaction.on_commit(
+        lambda: get_pubsub().publish(thread_channel(thread_id), message)
+    )
+
+
+def _authenticate(request):
+    """
+    Accept the usual ``Authorization: Bearer`` header, or an
+    ``access_token`` query parameter for EventSource clients that cannot set
+    headers
+    """
+    authentication = JWTAuthentication()
+    try:
+        result = authentication.authenticate(request)
+        if result is None and request.GET.get('access_token'):
+            token = authentication.get_validated_token(request.GET['access_token'])
+            result = (authentication.get_user(token), token)
+    except AuthenticationFailed:
+        return None
+    return result[0] if result else None
+
+
+def _parse_ids(value):
+    ids = []
+    for part in value.split(','):
+        part = part.strip()
+        # isdigit() alone also accepts digits such as '²' that int() rejects
+        if part.isascii() and part.isdigit():
+            ids.append(int(part))
+    return ids[:MAX_WATCHED_THREADS]
+
+
+def _watchable_threads(user, thread_ids):
+    """
+    The threads in ``thread_ids`` that exist and whose author does not
+    block, and is not blocked by, ``user``
+    """
+    hidden = blocking.for_user(user)
+    threads = Thread.objects.filter(pk__in=thread_ids).values_list('pk', 'author_id')
+    return [pk for pk, author_id in threads if not hidden.is_blocked(author_id)]
+
+
+def _event(name, data):
+    return f'event: {name}\ndata: {json.dumps(data, separators=(",", ":"))}\n\n'
+
+
+async def _event_stream(channels):
+    # Subscribe lazily so the subscription belongs to the loop that actually
+    # consumes the stream
+    subscription = get_pubsub().subscribe(channels)
+    interval = getattr(settings, 'STREAM_COALESCE_INTERVAL', 1.0)
+    heartbeat = getattr(settings, 'STREAM_HEARTBEAT_INTERVAL', 15.0)
+    loop = asyncio.get_running_loop()
+
+    new_threads = []
+    counts = {}
+    flush_at = None
+    last_sent = loop.time()
+    try:
+        yield 'retry: 3000\n\n'
+        while True:
+            now = loop.time()
+            deadline = flush_at if flush_at is not None else last_sent + heartbeat
+            item = await subscription.get(max(deadline - now, 0))
+
+            if item is not None:
+                channel, message = item
+                if channel.startswith(AUTHOR_PREFIX):
+                    new_threads.append(message)
+                else:
+                    deltas = counts.setdefault(str(message['thread']), {})
+                    for field, delta in message.items():
+                        if field != 'thread':
+                            deltas[field] = deltas.get(field, 0) + delta
+                if flush_at is None:
+                    flush_at = loop.time() + interval
+
+            now = loop.time()
+            if subscription.overflowed:
+                while not subscription.queue.empty():
+                    subscription.queue.get_nowait()
+                subscription.overflowed = False
+                new_threads, counts, flush_at = [], {}, None
+                last_sent = now
+                yield _event('resync', {})
+            elif flush_at is not None and now >= flush_at:
+                if new_threads:
+                    yield _event('threads', new_threads)
+                if counts:
+                    yield _event('counts', counts)
+                new_threads, counts, flush_at = [], {}, None
+                last_sent = now
+            elif now - last_sent >= heartbeat:
+                yield ': keep-alive\n\n'
+                last_sent = now
+    finally:
+        subscription.close()
+
+
+async def live_stream(request):
+    if not isinstance(request, ASGIRequest):
+        # A WSGI server would buffer the endless response
+        return JsonResponse(
+            {'detail': 'The live stream needs the ASGI server.'},
+            status=501
+        )
+
+    user = await sync_to_async(_authenticate)(request)
+    if user is None:
+        return JsonResponse(
+            {'detail': 'Authentication credentials were not provided.'},
+            status=401
+        )
+
+    followed = await sync_to_async(list)(
+        Follow.objects.filter(follower=user).values_list('followed_id', flat=True)
+    )
+    thread_ids = await sync_to_async(_watchable_threads)(
+        user, _parse_ids(request.GET.get('threads', ''))
+    )
+    channels = [author_channel(user_id) for user_id in followed]
+    channels += [thread_channel(thread_id) for thread_id in thread_ids]
+
+    response = StreamingHttpResponse(
+        _event_stream(channels), content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,134 @@
+# main/tags.py
+"""
+Hashtag and @mention index.
+
+Threads and replies are parsed when they are saved (main/signals.py): every
+distinct ``#tag`` becomes a Hashtag row and every ``@username`` of an
+existing user a Mention row, stamped with the post's author and creation
+time. Tags are stored casefolded and NFKC-normalized, so ``#Django`` and
+``#django`` share a timeline. The ``(tag, created_at)`` and
+``(user, created_at)`` indexes make each timeline page one index range
+scan.
+
+``index_range()`` rebuilds the entries of a primary-key range of threads
+or replies; ``manage.py index_tags`` runs it over existing content in
+parallel batches.
+"""
+import re
+import unicodedata
+
+from django.db import transaction
+
+from .models import Reply, User, Hashtag, Mention
+
+# Not preceded by a word character, '#' or '&' (HTML entities such as &#39;)
+HASHTAG_RE = re.compile(r'(?<![\w#&])#(\w{1,100})')
+# Django usernames may also contain '.', '+', '-' and '@'; a trailing '.'
+# is taken to end the sentence
+MENTION_RE = re.compile(r'(?<![\w@])@(\w[\w.@+-]{0,149})')
+
+
+def normalize_tag(tag):
+    return unicodedata.normalize('NFKC', tag).casefold()[:100]
+
+
+def parse(content):
+    """
+    Return the normalized hashtags and the mentioned usernames in ``content``
+    """
+    if not content:
+        return set(), set()
+    tags = {normalize_tag(tag) for tag in HASHTAG_RE.findall(content) if not tag.isdigit()}
+    usernames = {name.rstrip('.') for name in MENTION_RE.findall(content)}
+    return tags, usernames
+
+
+def build_entries(posts):
+    """
+    Unsaved Hashtag and Mention rows for ``posts``, an iterable of
+    ``(thread_id, reply_id, author_id, content, created_at)`` tuples.
+    Mentioned usernames are resolved with one query.
+    """
+    hashtags = []
+    mentioned = []
+    for thread_id, reply_id, author_id, content, created_at in posts:
+        tags, usernames = parse(content)
+        hashtags.extend(
+            Hashtag(tag=tag, thread_id=thread_id, reply_id=reply_id,
+                    author_id=author_id, created_at=created_at)
+            for tag in tags
+        )
+        if usernames:
+            mentioned.append((usernames, thread_id, reply_id, author_id, created_at))
+
+    mentions = []
+    if mentioned:
+        names = set().union(*(usernames for usernames, *_ in mentioned))
+        user_ids = dict(User.objects.filter(username__in=names).values_list('username', 'id'))
+        mentions = [
+            Mention(user_id=user_ids[name], thread_id=thread_id, reply_id=reply_id,
+                    author_id=author_id, created_at=created_at)
+            for usernames, thread_id, reply_id, author_id, created_at in mentioned
+            for name in usernames if name in user_ids
+        ]
+    return hashtags, mentions
+
+
+def _entries_of(post):
+    if isinstance(post, Reply):
+        return {'reply_id': post.pk}
+    return {'thread_id': post.pk, 'reply__isnull': True}
+
+
+def index_post(post, created=False):
+    """
+    Index a saved thread or reply, replacing its entries unless it is new
+    """
+    if isinstance(post, Reply):
+        key = (post.thread_id, post.pk)
+    else:
+        key = (post.pk, None)
+    hashtags, mentions = build_entries([(*key, post.author_id, post.content, post.created_at)])
+    if created and not hashtags and not mentions:
+        return
+    with transaction.atomic():
+        if not created:
+            Hashtag.objects.filter(**_entries_of(post)).delete()
+            Mention.objects.filter(**_entries_of(post)).delete()
+        Hashtag.objects.bulk_create(hashtags)
+        Mention.objects.bulk_create(mentions)
+
+
+def index_range(model, start, stop):
+    """
+    Rebuild the entries of the threads or replies with ``start <= pk < stop``
+    and return the number of posts read.
+
+    The posts are read locked, so an edit made meanwhile waits and then
+    reindexes the post itself, and only the entries of the posts read are
+    replaced: a post created after the read keeps the entries index_post()
+    gave it.
+    """
+    with transaction.atomic():
+        posts = model.objects.select_for_update().filter(
+            pk__gte=start, pk__lt=stop
+        ).order_by()
+        if model is Reply:
+            posts = list(
+                posts.values_list('thread_id', 'pk', 'author_id', 'content', 'created_at')
+            )
+            existing = {'reply_id__in': [post[1] for post in posts]}
+        else:
+            posts = [
+                (pk, None, author_id, content, created_at)
+                for pk, author_id, content, created_at
+                in posts.values_list('pk', 'author_id', 'content', 'created_at')
+            ]
+            existing = {'thread_id__in': [post[0] for post in posts], 'reply__isnull': True}
+
+        hashtags, mentions = build_entries(posts)
+        Hashtag.objects.filter(**existing).delete()
+        Mention.objects.filter(**existing).delete()
+        Hashtag.objects.bulk_create(hashtags, batch_size=1000)
+        Mention.objects.bulk_create(mentions, batch_size=1000)
+    return len(posts)
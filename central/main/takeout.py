@@ -0,0 +1,236 @@
+# main/takeout.py
+"""
+Per-user data export ("takeout").
+
+``request_takeout()`` creates a Takeout and queues ``build_takeout`` for
+the task worker. Each section (threads, replies, likes, ...) is read in
+primary-key order with a server-side cursor and written as NDJSON to a
+working directory, so memory does not depend on how much the user has
+posted. Every ``TAKEOUT_CHECKPOINT_ROWS`` rows the file is flushed and its
+size and last key are saved on the Takeout: a retried build truncates the
+file to that point and carries on from the next key. The finished files
+are packed into a ZIP under ``TAKEOUT_DIR``. Once it is there, the user's
+older takeouts are deleted together with their files.
+"""
+import logging
+import os
+import shutil
+import time
+import zipfile
+from dataclasses import dataclass
+from pathlib import Path
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+
+from .models import (
+    User, Thread, Reply, Like, Follow, Takeout, ArchivedThread, ArchivedReply, ArchivedLike,
+)
+from .taskqueue import ClaimLost, task, touch
+
+logger = logging.getLogger(__name__)
+
+encoder = DjangoJSONEncoder(ensure_ascii=False, separators=(',', ':'))
+
+
+@dataclass(frozen=True)
+class Section:
+    name: str
+    model: type
+    owner: str
+    # Output key -> lookup; the first one must be the primary key
+    columns: dict
+
+    def rows(self, user_id, after):
+        return (
+            self.model.objects.filter(**{self.owner: user_id}, pk__gt=after)
+            .order_by('pk').values_list(*self.columns.values())
+        )
+
+
+SECTIONS = (
+    Section('threads', Thread, 'author_id', {
+        'id': 'id', 'content': 'content', 'created_at': 'created_at',
+        'updated_at': 'updated_at', 'is_repost': 'is_repost',
+        'original_thread': 'original_thread_id',
+    }),
+    Section('replies', Reply, 'author_id', {
+        'id': 'id', 'thread': 'thread_id', 'content': 'content',
+        'created_at': 'created_at', 'updated_at': 'updated_at',
+    }),
+    Section('likes', Like, 'user_id', {
+        'id': 'id', 'thread': 'thread_id', 'reply': 'reply_id', 'created_at': 'created_at',
+    }),
+    Section('following', Follow, 'follower_id', {
+        'id': 'id', 'user': 'followed_id', 'username': 'followed__username',
+        'created_at': 'created_at',
+    }),
+    Section('followers', Follow, 'followed_id', {
+        'id': 'id', 'user': 'follower_id', 'username': 'follower__username',
+        'created_at': 'created_at',
+    }),
+    Section('archived_threads', ArchivedThread, 'author_id', {
+        'id': 'id', 'content': 'content', 'created_at': 'created_at',
+        'updated_at': 'updated_at', 'is_repost': 'is_repost',
+        'original_thread': 'original_thread_id', 'likes_count': 'likes_count',
+        'replies_count': 'replies_count', 'reposts_count': 'reposts_count',
+    }),
+    Section('archived_replies', ArchivedReply, 'author_id', {
+        'id': 'id', 'thread': 'thread_id', 'content': 'content',
+        'created_at': 'created_at', 'updated_at': 'updated_at',
+    }),
+    Section('archived_likes', ArchivedLike, 'user_id', {
+        'id': 'id', 'thread': 'thread_id', 'reply': 'reply_id', 'created_at': 'created_at',
+    }),
+)
+
+PROFILE_FIELDS = ('id', 'username', 'email', 'first_name', 'last_name', 'bio',
+                  'verified', 'date_joined', 'last_login')
+
+
+def takeout_dir():
+    return Path(getattr(settings, 'TAKEOUT_DIR', settings.BASE_DIR / 'takeouts'))
+
+
+def request_takeout(user):
+    """
+    Return the user's unfinished takeout, or create and queue a new one.
+    A failed takeout whose build is waiting to be retried is unfinished.
+    """
+    with transaction.atomic():
+        # Locking the user serializes concurrent requests: there may be no
+        # takeout row to lock yet
+        User.objects.select_for_update().filter(pk=user.pk).exists()
+        takeout = Takeout.objects.filter(
+            user=user, status__in=[Takeout.PENDING, Takeout.RUNNING]
+        ).first()
+        if takeout is None:
+            failed = Takeout.objects.filter(user=user, status=Takeout.FAILED).first()
+            if failed is not None and build_takeout.is_pending(takeout_id=failed.pk):
+                return failed
+            takeout = Takeout.objects.create(user=user)
+            build_takeout.enqueue(takeout_id=takeout.pk)
+    return takeout
+
+
+class Checkpointer:
+    """
+    Saves section progress and running totals on the Takeout row, and
+    renews the task's claim so a long export is not run twice
+    """
+
+    def __init__(self, takeout):
+        self.takeout = takeout
+        self.started = time.perf_counter()
+        self.seconds = takeout.seconds
+
+    def save(self, name, state):
+        takeout = self.takeout
+        takeout.progress[name] = state
+        sections = takeout.progress.values()
+        takeout.rows_written = sum(s['rows'] for s in sections)
+        takeout.bytes_written = sum(s['offset'] for s in sections)
+        takeout.seconds = self.seconds + time.perf_counter() - self.started
+        # Before writing: a reclaimed build must not overwrite the new owner's
+        # progress
+        touch()
+        takeout.save(update_fields=['progress', 'rows_written', 'bytes_written', 'seconds'])
+
+
+def export_section(section, user_id, path, state, checkpointer):
+    checkpoint_rows = getattr(settings, 'TAKEOUT_CHECKPOINT_ROWS', 10000)
+    chunk_size = getattr(settings, 'TAKEOUT_CHUNK_SIZE', 2000)
+    keys = tuple(section.columns)
+    state = {'rows': 0, 'offset': 0, 'last_id': 0, 'done': False, **state}
+
+    with open(path, 'ab') as f:
+        # Drop anything written after the last checkpoint of a failed attempt
+        f.truncate(state['offset'])
+        since_checkpoint = 0
+        for values in section.rows(user_id, state['last_id']).iterator(chunk_size=chunk_size):
+            f.write(encoder.encode(dict(zip(keys, values))).encode() + b'\n')
+            state['last_id'] = values[0]
+            state['rows'] += 1
+            since_checkpoint += 1
+            if since_checkpoint == checkpoint_rows:
+                f.flush()
+                os.fsync(f.fileno())
+                state['offset'] = f.tell()
+                checkpointer.save(section.name, dict(state))
+                since_checkpoint = 0
+        f.flush()
+        state['offset'] = f.tell()
+    state['done'] = True
+    checkpointer.save(section.name, state)
+
+
+@task(unique=True, max_attempts=5, concurrency=2)
+def build_takeout(takeout_id):
+    takeout = Takeout.objects.select_related('user').filter(pk=takeout_id).first()
+    if takeout is None or takeout.status == Takeout.READY:
+        return
+    takeout.status = Takeout.RUNNING
+    takeout.save(update_fields=['status'])
+
+    workdir = takeout_dir() / 'work' / str(takeout.pk)
+    workdir.mkdir(parents=True, exist_ok=True)
+    checkpointer = Checkpointer(takeout)
+    try:
+        user = takeout.user
+        profile = {field: getattr(user, field) for field in PROFILE_FIELDS}
+        (workdir / 'profile.json').write_text(encoder.encode(profile), encoding='utf-8')
+
+        for section in SECTIONS:
+            state = takeout.progress.get(section.name, {})
+            if not state.get('done'):
+                export_section(
+                    section, user.pk, workdir / f'{section.name}.ndjson', state, checkpointer
+                )
+
+        touch()
+        filename = f'takeout-{user.pk}-{takeout.pk}.zip'
+        partial = takeout_dir() / f'{filename}.part'
+        with zipfile.ZipFile(partial, 'w', zipfile.ZIP_DEFLATED) as archive:
+            archive.write(workdir / 'profile.json', 'profile.json')
+            for section in SECTIONS:
+                archive.write(workdir / f'{section.name}.ndjson', f'{section.name}.ndjson')
+        partial.rename(takeout_dir() / filename)
+    except ClaimLost:
+        # Another worker runs the build now and owns the Takeout row
+        raise
+    except Exception:
+        takeout.status = Takeout.FAILED
+        takeout.save(update_fields=['status'])
+        raise
+
+    shutil.rmtree(workdir, ignore_errors=True)
+    takeout.status = Takeout.READY
+    takeout.file = filename
+    takeout.finished_at = timezone.now()
+    takeout.save(update_fields=['status', 'file', 'finished_at'])
+    logger.info(
+        'Takeout %s: %d rows, %d bytes in %.1fs (%.0f rows/s)',
+        takeout.pk, takeout.rows_written, takeout.bytes_written, takeout.seconds,
+        takeout.rows_written / takeout.seconds if takeout.seconds else 0,
+    )
+    remove_older(takeout)
+
+
+def remove_older(takeout):
+    """
+    Delete the user's takeouts finished before ``takeout``, with their ZIPs
+    and the work directories of failed builds that are not retried
+    """
+    older = Takeout.objects.filter(
+        user_id=takeout.user_id, created_at__lt=takeout.created_at,
+        status__in=[Takeout.READY, Takeout.FAILED],
+    )
+    for old in older:
+        if old.status == Takeout.FAILED and build_takeout.is_pending(takeout_id=old.pk):
+            continue
+        if old.file:
+            (takeout_dir() / old.file).unlink(missing_ok=True)
+        shutil.rmtree(takeout_dir() / 'work' / str(old.pk), ignore_errors=True)
+        old.delete()
@@ -0,0 +1,280 @@
+# main/taskqueue.py
+"""
+Small database-backed task queue for side effects that should not run
+inside the request.
+
+Declare a task with the ``task`` decorator and enqueue it with
+``my_task.enqueue(**kwargs)``. By default the row is inserted when the
+surrounding transaction commits, so a worker never sees a task for data that
+was rolled back. ``python manage.py runworker`` executes pending tasks.
+
+Options per task:
+
+* ``unique``: identical pending tasks (same name and arguments) are stored
+  once, so bursts of the same follow-up work collapse into one run
+* ``batch_size``: the worker claims up to this many pending tasks of the
+  same name and calls the function once with ``items=[kwargs, ...]``
+* ``max_attempts``: failures are retried with exponential backoff
+* ``concurrency``: upper bound on runs of this task across workers
+
+A claimed task that runs longer than ``TASKS_LOCK_TIMEOUT`` seconds is
+taken for abandoned and claimed again, so long tasks call ``touch()``
+regularly. It renews the claim, or raises ClaimLost when another worker
+has already taken the task over, in which case the task should stop
+without further side effects.
+"""
+import hashlib
+import importlib
+import json
+import logging
+import threading
+import traceback
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+registry = {}
+
+# Claim token of the tasks the current thread is executing
+_running = threading.local()
+
+
+class ClaimLost(Exception):
+    """
+    The running task was reclaimed by another worker
+    """
+
+
+class TaskDefinition:
+    def __init__(self, func, name, unique, batch_size, max_attempts, concurrency):
+        self.func = func
+        self.name = name
+        self.unique = unique
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.concurrency = concurrency
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def dedupe_key(self, kwargs):
+        payload = json.dumps([self.name, kwargs], sort_keys=True, default=str)
+        return hashlib.sha1(payload.encode()).hexdigest()
+
+    def is_pending(self, **kwargs):
+        """
+        Whether a unique task with ``kwargs`` is waiting to run, retries
+        included
+        """
+        return Task.objects.filter(
+            dedupe_key=self.dedupe_key(kwargs), status=Task.PENDING
+        ).exists()
+
+    def enqueue(self, on_commit=True, delay=None, **kwargs):
+        """
+        Schedule the task with JSON-serializable ``kwargs``
+        """
+        if getattr(settings, 'TASKS_ALWAYS_EAGER', False):
+            if self.batch_size:
+                run = lambda: self.func(items=[kwargs])  # noqa: E731
+            else:
+                run = lambda: self.func(**kwargs)  # noqa: E731
+            if on_commit:
+                transaction.on_commit(run)
+            else:
+                run()
+            return
+
+        task = Task(
+            name=self.name,
+            kwargs=kwargs,
+            max_attempts=self.max_attempts,
+            run_at=timezone.now() + (delay or timedelta()),
+        )
+        if self.unique:
+            task.dedupe_key = self.dedupe_key(kwargs)
+
+        def insert():
+            # A pending duplicate of a unique task is silently dropped
+            Task.objects.bulk_create([task], ignore_conflicts=self.unique)
+
+        if on_commit:
+            transaction.on_commit(insert)
+        else:
+            insert()
+
+
+def task(name=None, unique=False, batch_size=None, max_attempts=3, concurrency=None):
+    def decorator(func):
+        definition = TaskDefinition(
+            func, name or f'{func.__module__}.{func.__name__}',
+            unique, batch_size, max_attempts, concurrency,
+        )
+        registry[definition.name] = definition
+        return definition
+    return decorator
+
+
+def load_task_modules():
+    """
+    Import the modules listed in ``TASKS_MODULES`` so their tasks register
+    """
+    for module in getattr(settings, 'TASKS_MODULES', ['main.tasks']):
+        importlib.import_module(module)
+
+
+def claim(worker_id):
+    """
+    Claim the next batch of due tasks for ``worker_id`` and return them.
+
+    Claiming is a conditional UPDATE on ``status``, so two workers can never
+    claim the same row. Tasks with a ``concurrency`` limit are claimed under
+    row locks (``_claim_limited()``), so concurrent claims cannot exceed it.
+    Tasks whose claim was not renewed (``touch()``) for ``TASKS_LOCK_TIMEOUT``
+    seconds are assumed to belong to a dead worker and are reclaimed.
+    """
+    now = timezone.now()
+    lock_timeout = getattr(settings, 'TASKS_LOCK_TIMEOUT', 300)
+    Task.objects.filter(
+        status=Task.RUNNING, locked_at__lt=now - timedelta(seconds=lock_timeout)
+    ).update(status=Task.PENDING, locked_at=None, locked_by='', claim_token=None)
+
+    candidates = list(
+        Task.objects.filter(status=Task.PENDING, run_at__lte=now)
+        .order_by('run_at', 'id')
+        .values_list('id', 'name')[:100]
+    )
+    if not candidates:
+        return []
+
+    tried = set()
+    for task_id, name in candidates:
+        definition = registry.get(name)
+        if definition is None or name in tried:
+            continue
+        token = uuid.uuid4()
+        if definition.concurrency:
+            # Later candidates of the same name are covered by this attempt
+            tried.add(name)
+            claimed = _claim_limited(definition, worker_id, now, token)
+        else:
+            ids = [task_id]
+            if definition.batch_size:
+                ids = [pk for pk, other in candidates if other == name][:definition.batch_size]
+            claimed = _mark_claimed(ids, worker_id, now, token)
+        if claimed:
+            return list(Task.objects.filter(claim_token=token).order_by('id'))
+    return []
+
+
+def _mark_claimed(ids, worker_id, now, token):
+    # Clearing dedupe_key lets a new duplicate be queued while this runs
+    return Task.objects.filter(id__in=ids, status=Task.PENDING).update(
+        status=Task.RUNNING, locked_at=now, locked_by=worker_id,
+        claim_token=token, dedupe_key=None
+    )
+
+
+def _claim_limited(definition, worker_id, now, token):
+    """
+    Claim a run of a task with a ``concurrency`` limit. Every claimer locks
+    all pending and running rows of the task in the same order, so counting
+    the runs in progress and claiming happen one worker at a time.
+    """
+    with transaction.atomic():
+        rows = list(
+            Task.objects.select_for_update()
+            .filter(name=definition.name, status__in=[Task.PENDING, Task.RUNNING])
+            .order_by('id')
+            .values_list('id', 'status', 'run_at', 'claim_token')
+        )
+        runs = {claim for _, status, _, claim in rows if status == Task.RUNNING}
+        if len(runs) >= definition.concurrency:
+            return 0
+        due = [pk for pk, status, run_at, _ in rows if status == Task.PENDING and run_at <= now]
+        return _mark_claimed(due[:definition.batch_size or 1], worker_id, now, token)
+
+
+def touch():
+    """
+    Renew the claim of the task running in this thread, so it is not
+    reclaimed while it makes progress. Raises ClaimLost when another worker
+    has reclaimed it. Does nothing outside the worker (e.g. eager tasks).
+    """
+    token = getattr(_running, 'claim_token', None)
+    if token is None:
+        return
+    renewed = Task.objects.filter(claim_token=token, status=Task.RUNNING).update(
+        locked_at=timezone.now()
+    )
+    if not renewed:
+        raise ClaimLost(token)
+
+
+def execute(tasks):
+    """
+    Run a claimed batch: delete the rows on success, schedule a retry with
+    exponential backoff on failure, or mark them failed once
+    ``max_attempts`` is reached
+    """
+    definition = registry[tasks[0].name]
+    token = tasks[0].claim_token
+    _running.claim_token = token
+    try:
+        if definition.batch_size:
+            definition.func(items=[t.kwargs for t in tasks])
+        else:
+            definition.func(**tasks[0].kwargs)
+    except ClaimLost:
+        # The rows belong to the worker that reclaimed them now
+        logger.warning('Task %s was reclaimed by another worker', definition.name)
+        return False
+    except Exception:
+        error = traceback.format_exc()
+        logger.exception('Task %s failed', definition.name)
+        base = getattr(settings, 'TASKS_RETRY_BACKOFF', 10)
+        # Leave alone rows that were reclaimed while the task ran
+        owned = set(
+            Task.objects.filter(claim_token=token).values_list('id', flat=True)
+        )
+        tasks = [t for t in tasks if t.id in owned]
+        for t in tasks:
+            t.attempts += 1
+            t.last_error = error
+            t.locked_at, t.locked_by, t.claim_token = None, '', None
+            if t.attempts >= t.max_attempts:
+                t.status = Task.FAILED
+            else:
+                t.status = Task.PENDING
+                t.run_at = timezone.now() + timedelta(seconds=base * 2 ** (t.attempts - 1))
+                if definition.unique:
+                    # Pending again, so duplicates must find it (_mark_claimed
+                    # cleared the key)
+                    t.dedupe_key = definition.dedupe_key(t.kwargs)
+        if definition.unique:
+            # A duplicate queued while this ran will do the work instead
+            queued = set(Task.objects.filter(
+                dedupe_key__in=[t.dedupe_key for t in tasks if t.dedupe_key],
+                status=Task.PENDING,
+            ).values_list('dedupe_key', flat=True))
+            Task.objects.filter(
+                id__in=[t.id for t in tasks if t.dedupe_key in queued]
+            ).delete()
+            tasks = [t for t in tasks if t.dedupe_key not in queued]
+        Task.objects.bulk_update(tasks, [
+            'attempts', 'last_error', 'locked_at', 'locked_by',
+            'claim_token', 'status', 'run_at', 'dedupe_key',
+        ])
+        return False
+    finally:
+        _running.claim_token = None
+
+    Task.objects.filter(claim_token=token).delete()
+    return True
@@ -1,3 +1,993 @@
-from django.test import TestCase
+from datetime import timedelta
 
-# Create your tests here.
+import gzip
+import io
+import json
+import sys
+import tempfile
+import threading
+import zipfile
+from decimal import Decimal
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
+
+import brotli
+from django.apps import apps
+from django.core.cache import caches
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Value
+from django.db.models.functions import Concat
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.exceptions import NotFound
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.test import APIClient, APIRequestFactory
+
+from . import (
+    archive, briefs, checks, counters, dataio, generations, moderation, notifications, profiles,
+    streams, tags, takeout, taskqueue,
+)
+from .fast_serializers import recent_replies
+from .management.commands import runworker
+from .middleware import CompressionMiddleware
+from .pagination import KeysetPagination
+from .models import (
+    User, Thread, Reply, Like, Follow, Notification, Task, ThreadCounter, ThreadCounterShard,
+    ArchivedThread, Takeout, BlockedTerm, ModerationFlag, Hashtag, Mention,
+)
+from .pubsub import get_pubsub
+from .renderers import FastJSONRenderer
+from .throttling import (
+    CacheBucketStore, EngagementThrottle, InMemoryBucketStore, get_store,
+)
+
+calls = []
+
+
+@taskqueue.task(name='main.tests.record')
+def record(value):
+    calls.append(value)
+
+
+@taskqueue.task(name='main.tests.fail', max_attempts=2)
+def fail():
+    raise RuntimeError('boom')
+
+
+@taskqueue.task(name='main.tests.heartbeat')
+def heartbeat():
+    taskqueue.touch()
+
+
+@taskqueue.task(name='main.tests.limited', concurrency=1)
+def limited(value):
+    pass
+
+
+class TaskQueueTests(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_claim_and_execute(self):
+        record.enqueue(on_commit=False, value=1)
+        tasks = taskqueue.claim('w1')
+        self.assertEqual([t.status for t in tasks], [Task.RUNNING])
+        self.assertEqual(taskqueue.claim('w2'), [])
+        self.assertTrue(taskqueue.execute(tasks))
+        self.assertEqual(calls, [1])
+        self.assertFalse(Task.objects.exists())
+
+    def test_unique_tasks_are_stored_once(self):
+        record.unique = True
+        try:
+            record.enqueue(on_commit=False, value=1)
+            record.enqueue(on_commit=False, value=1)
+            self.assertTrue(record.is_pending(value=1))
+        finally:
+            record.unique = False
+        self.assertEqual(Task.objects.count(), 1)
+
+    @override_settings(TASKS_RETRY_BACKOFF=10)
+    def test_failure_is_retried_then_failed(self):
+        fail.enqueue(on_commit=False)
+        with self.assertLogs('main.taskqueue', 'ERROR'):
+            self.assertFalse(taskqueue.execute(taskqueue.claim('w1')))
+        task = Task.objects.get()
+        self.assertEqual((task.status, task.attempts), (Task.PENDING, 1))
+        self.assertGreater(task.run_at, timezone.now() + timedelta(seconds=5))
+        self.assertIn('boom', task.last_error)
+        # Not due until the backoff has passed
+        self.assertEqual(taskqueue.claim('w1'), [])
+
+        Task.objects.update(run_at=timezone.now())
+        with self.assertLogs('main.taskqueue', 'ERROR'):
+            self.assertFalse(taskqueue.execute(taskqueue.claim('w1')))
+        task = Task.objects.get()
+        self.assertEqual((task.status, task.attempts), (Task.FAILED, 2))
+
+    @override_settings(TASKS_LOCK_TIMEOUT=60)
+    def test_abandoned_claim_is_reclaimed(self):
+        heartbeat.enqueue(on_commit=False)
+        first = taskqueue.claim('w1')
+        Task.objects.update(locked_at=timezone.now() - timedelta(seconds=61))
+        second = taskqueue.claim('w2')
+        self.assertEqual([t.pk for t in second], [t.pk for t in first])
+        self.assertNotEqual(second[0].claim_token, first[0].claim_token)
+
+        # The first worker's heartbeat finds out and leaves the row alone
+        with self.assertLogs('main.taskqueue', 'WARNING'):
+            self.assertFalse(taskqueue.execute(first))
+        task = Task.objects.get()
+        self.assertEqual((task.locked_by, task.attempts), ('w2', 0))
+        self.assertTrue(taskqueue.execute(second))
+        self.assertFalse(Task.objects.exists())
+
+    def test_touch_renews_the_claim(self):
+        heartbeat.enqueue(on_commit=False)
+        tasks = taskqueue.claim('w1')
+        Task.objects.update(locked_at=timezone.now() - timedelta(seconds=30))
+        taskqueue._running.claim_token = tasks[0].claim_token
+        try:
+            taskqueue.touch()
+        finally:
+            taskqueue._running.claim_token = None
+        self.assertGreater(Task.objects.get().locked_at, timezone.now() - timedelta(seconds=5))
+
+    def test_concurrency_limit(self):
+        limited.enqueue(on_commit=False, value=1)
+        limited.enqueue(on_commit=False, value=2)
+        first = taskqueue.claim('w1')
+        self.assertEqual(len(first), 1)
+        self.assertEqual(taskqueue.claim('w2'), [])
+        self.assertTrue(taskqueue.execute(first))
+        self.assertEqual(len(taskqueue.claim('w2')), 1)
+
+    def test_worker_survives_database_errors(self):
+        command = runworker.Command()
+        command.stop = threading.Event()
+        claim = mock.patch.object(
+            taskqueue, 'claim', side_effect=[DatabaseError('gone'), []]
+        )
+        with claim as claimed, self.assertLogs(runworker.logger, 'ERROR'):
+            command.work('w1', 0, once=True)
+        self.assertEqual(claimed.call_count, 2)
+
+
+class HiddenAuthorTests(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.alice = User.objects.create_user('alice', password='x')
+        self.bob = User.objects.create_user('bob', password='x')
+        self.carol = User.objects.create_user('carol', password='x')
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+        self.client.post(f'/api/v1/users/{self.bob.pk}/block/')
+
+    def test_list_pages_stay_full(self):
+        for i in range(20):
+            Thread.objects.create(author=self.carol, content=f'carol {i}')
+        for i in range(5):
+            Thread.objects.create(author=self.bob, content=f'bob {i}')
+        results = self.client.get('/api/v1/threads/').json()['results']
+        self.assertEqual(len(results), 20)
+        self.assertEqual({thread['author']['id'] for thread in results}, {self.carol.pk})
+
+    def test_recent_replies_skip_hidden_authors(self):
+        thread = Thread.objects.create(author=self.carol, content='carol')
+        for i in range(3):
+            Reply.objects.create(thread=thread, author=self.carol, content=f'carol {i}')
+        for i in range(4):
+            Reply.objects.create(thread=thread, author=self.bob, content=f'bob {i}')
+        rows = recent_replies([thread.pk], hidden={self.bob.pk})
+        self.assertEqual([row.author.id for row in rows], [self.carol.pk] * 3)
+        replies = self.client.get(f'/api/v1/threads/{thread.pk}/').json()['replies']
+        self.assertEqual(len(replies), 3)
+
+
+class RendererTests(SimpleTestCase):
+    data = {
+        'id': 1,
+        'content': 'caf\u00e9 \u2028 \U0001f600 "quoted"',
+        'ratio': Decimal('1.5'),
+        'tags': ['a', None, True, 2.5],
+        'nested': {'empty': {}, 'list': []},
+    }
+
+    def test_orjson_matches_json_renderer(self):
+        expected = JSONRenderer().render(self.data)
+        self.assertEqual(FastJSONRenderer().render(self.data), expected)
+
+    @override_settings(JSON_RENDERER_USE_ORJSON=False)
+    def test_stdlib_fallback(self):
+        expected = JSONRenderer().render(self.data)
+        self.assertEqual(FastJSONRenderer().render(self.data), expected)
+
+
+@override_settings(COMPRESSION_MIN_SIZE=100)
+class CompressionTests(SimpleTestCase):
+    body = b'{"content": "hello"}' * 50
+
+    def respond(self, accept_encoding, body=None):
+        middleware = CompressionMiddleware(lambda request: HttpResponse(body or self.body))
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING=accept_encoding)
+        return middleware(request)
+
+    def test_prefers_brotli(self):
+        response = self.respond('gzip, deflate, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(brotli.decompress(response.content), self.body)
+        self.assertEqual(response['Content-Length'], str(len(response.content)))
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+    def test_honours_q_values(self):
+        response = self.respond('br;q=0.5, gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), self.body)
+        self.assertEqual(self.respond('br;q=0, *')['Content-Encoding'], 'gzip')
+
+    def test_identity(self):
+        for header in ('', 'identity', 'br;q=0, gzip;q=0'):
+            response = self.respond(header)
+            self.assertFalse(response.has_header('Content-Encoding'))
+            self.assertEqual(response.content, self.body)
+            self.assertIn('Accept-Encoding', response['Vary'])
+
+    async def test_async_responses(self):
+        async def get_response(request):
+            return HttpResponse(self.body)
+
+        middleware = CompressionMiddleware(get_response)
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip')
+        response = await middleware(request)
+        self.assertEqual(gzip.decompress(response.content), self.body)
+
+    def test_small_bodies_are_left_alone(self):
+        response = self.respond('br, gzip', body=b'{}')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertFalse(response.has_header('Vary'))
+
+
+class StreamTests(TestCase):
+    def test_needs_asgi(self):
+        self.assertEqual(self.client.get('/api/v1/stream/').status_code, 501)
+
+    async def test_needs_authentication(self):
+        response = await self.async_client.get('/api/v1/stream/')
+        self.assertEqual(response.status_code, 401)
+        response = await self.async_client.get('/api/v1/stream/?access_token=nope')
+        self.assertEqual(response.status_code, 401)
+
+    def test_blocked_threads_are_not_watched(self):
+        caches['default'].clear()
+        alice = User.objects.create_user('alice', password='x')
+        bob = User.objects.create_user('bob', password='x')
+        bob_thread = Thread.objects.create(author=bob, content='by bob')
+        alice_thread = Thread.objects.create(author=alice, content='by alice')
+        thread_ids = [bob_thread.pk, alice_thread.pk, alice_thread.pk + 100]
+        self.assertCountEqual(streams._watchable_threads(alice, thread_ids), thread_ids[:2])
+
+        client = APIClient()
+        client.force_authenticate(alice)
+        client.post(f'/api/v1/users/{bob.pk}/block/')
+        self.assertEqual(streams._watchable_threads(alice, thread_ids), [alice_thread.pk])
+        self.assertEqual(streams._watchable_threads(bob, thread_ids), [bob_thread.pk])
+
+    @override_settings(STREAM_COALESCE_INTERVAL=0.05)
+    async def test_events_are_coalesced(self):
+        events = streams._event_stream([streams.author_channel(1), streams.thread_channel(5)])
+        self.assertEqual(await anext(events), 'retry: 3000\n\n')
+        pubsub = get_pubsub()
+        pubsub.publish(streams.author_channel(1), {'id': 7})
+        pubsub.publish(streams.thread_channel(5), {'thread': 5, 'likes': 1})
+        pubsub.publish(streams.thread_channel(5), {'thread': 5, 'likes': 1, 'replies': 1})
+        pubsub.publish(streams.thread_channel(6), {'thread': 6, 'likes': 1})
+        self.assertEqual(await anext(events), 'event: threads\ndata: [{"id":7}]\n\n')
+        self.assertEqual(
+            await anext(events), 'event: counts\ndata: {"5":{"likes":2,"replies":1}}\n\n'
+        )
+        await events.aclose()
+
+    @override_settings(PUBSUB_QUEUE_SIZE=2)
+    async def test_overflow_asks_for_resync(self):
+        events = streams._event_stream([streams.thread_channel(5)])
+        await anext(events)
+        for _ in range(3):
+            get_pubsub().publish(streams.thread_channel(5), {'thread': 5, 'likes': 1})
+        self.assertEqual(await anext(events), 'event: resync\ndata: {}\n\n')
+        await events.aclose()
+
+
+@override_settings(NOTIFICATIONS_WINDOW=3600)
+class NotificationTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user('alice', password='x')
+        self.bob = User.objects.create_user('bob', password='x')
+        self.carol = User.objects.create_user('carol', password='x')
+        self.thread = Thread.objects.create(author=self.alice, content='by alice')
+        self.start = notifications.window_start(timezone.now())
+
+    def like(self, actor, minutes=0):
+        return notifications.Event(
+            Notification.LIKE, actor.pk, self.thread.pk, None, None,
+            self.start + timedelta(minutes=minutes),
+        )
+
+    def unread(self):
+        self.alice.refresh_from_db()
+        return self.alice.unread_notifications
+
+    def test_events_in_one_window_are_folded(self):
+        notifications.write_notifications([
+            self.like(self.bob), self.like(self.carol, 5), self.like(self.alice, 6),
+        ])
+        notification = Notification.objects.get()
+        self.assertEqual(
+            (notification.recipient_id, notification.actors_count, notification.last_actor_id),
+            (self.alice.pk, 2, self.carol.pk)
+        )
+        self.assertEqual(self.unread(), 1)
+
+        # A later batch in the same window adds to it
+        notifications.write_notifications([self.like(self.bob, 10)])
+        notification.refresh_from_db()
+        self.assertEqual((notification.actors_count, notification.last_actor_id), (3, self.bob.pk))
+        self.assertEqual(self.unread(), 1)
+
+    def test_next_window_gets_its_own_row(self):
+        notifications.write_notifications([self.like(self.bob), self.like(self.carol, 61)])
+        self.assertEqual(Notification.objects.count(), 2)
+        self.assertEqual(self.unread(), 2)
+
+    def test_read_notifications_count_again_when_updated(self):
+        notifications.write_notifications([self.like(self.bob)])
+        Notification.objects.update(is_read=True)
+        User.objects.filter(pk=self.alice.pk).update(unread_notifications=0)
+        notifications.write_notifications([self.like(self.carol, 1)])
+        self.assertFalse(Notification.objects.get().is_read)
+        self.assertEqual(self.unread(), 1)
+
+        Notification.objects.get().delete()
+        self.assertEqual(self.unread(), 0)
+
+    def test_deleted_targets_are_skipped(self):
+        event = self.like(self.bob)
+        self.thread.delete()
+        notifications.write_notifications([event])
+        self.assertFalse(Notification.objects.exists())
+
+
+class AdminChangelistTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser('admin', password='x')
+        self.client.force_login(self.admin)
+
+    def add_rows(self, n):
+        for i in range(n):
+            user = User.objects.create_user(f'user{User.objects.count()}')
+            thread = Thread.objects.create(author=user, content='x' * 60)
+            reply = Reply.objects.create(thread=thread, author=self.admin, content='reply')
+            Like.objects.create(user=user, thread=thread)
+            Like.objects.create(user=self.admin, reply=reply)
+            Follow.objects.create(follower=user, followed=self.admin)
+
+    def queries(self, path):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(path).status_code, 200)
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_rows(self):
+        for model in ('thread', 'reply', 'like', 'follow'):
+            path = f'/admin/main/{model}/'
+            self.add_rows(2)
+            before = self.queries(path)
+            self.add_rows(3)
+            self.assertEqual(self.queries(path), before, model)
+
+
+class RepostTests(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.alice = User.objects.create_user('alice')
+        self.bob = User.objects.create_user('bob')
+        self.thread = Thread.objects.create(author=self.alice, content='by alice')
+        self.client = APIClient()
+        self.client.force_authenticate(self.bob)
+
+    def repost(self, thread):
+        return self.client.post(f'/api/v1/threads/{thread.pk}/repost/')
+
+    def test_one_repost_per_user(self):
+        response = self.repost(self.thread)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['original']['id'], self.thread.pk)
+        self.assertEqual(self.repost(self.thread).status_code, 400)
+        self.assertEqual(Thread.objects.filter(is_repost=True).count(), 1)
+        detail = self.client.get(f'/api/v1/threads/{self.thread.pk}/').json()
+        self.assertEqual((detail['reposts_count'], detail['is_reposted']), (1, True))
+
+    def test_reposting_a_repost_reposts_the_root(self):
+        carol = User.objects.create_user('carol')
+        repost = Thread.objects.create(author=carol, is_repost=True, original_thread=self.thread)
+        response = self.repost(repost)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['original_thread'], self.thread.pk)
+        # Already reposted through the other repost
+        self.assertEqual(self.repost(self.thread).status_code, 400)
+
+    def test_original_gone(self):
+        repost = Thread.objects.create(
+            author=self.alice, is_repost=True, original_thread=self.thread
+        )
+        self.thread.delete()
+        self.assertEqual(self.repost(repost).status_code, 400)
+
+
+class CounterTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user('alice', password='x')
+        self.bob = User.objects.create_user('bob', password='x')
+        self.thread = Thread.objects.create(author=self.alice, content='hello')
+        Like.objects.create(user=self.bob, thread=self.thread)
+        Reply.objects.create(thread=self.thread, author=self.bob, content='hi')
+        Thread.objects.create(author=self.bob, is_repost=True, original_thread=self.thread)
+
+    def counts(self):
+        thread = Thread.with_counts().get(pk=self.thread.pk)
+        return thread.likes_count, thread.replies_count, thread.reposts_count
+
+    def test_signals_keep_counts(self):
+        self.assertEqual(self.counts(), (1, 1, 1))
+
+    def test_rebuild(self):
+        ThreadCounter.objects.filter(thread=self.thread).update(likes=7, replies=0)
+        counters.rebuild(self.thread.pk)
+        self.assertEqual(self.counts(), (1, 1, 1))
+
+    def test_rebuild_many_resets_shards(self):
+        ThreadCounter.objects.filter(thread=self.thread).delete()
+        ThreadCounterShard.objects.create(thread=self.thread, shard=0, likes=5)
+        counters.rebuild_many([self.thread.pk])
+        counter = ThreadCounter.objects.get(thread=self.thread)
+        self.assertEqual((counter.likes, counter.replies, counter.reposts), (1, 1, 1))
+        self.assertEqual(ThreadCounterShard.objects.get().likes, 0)
+
+
+class ThrottleTests(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        get_store.cache_clear()
+
+    def test_token_bucket_refills_evenly(self):
+        store = InMemoryBucketStore()
+        with mock.patch('main.throttling.time.monotonic', return_value=1000.0) as clock:
+            self.assertEqual([store.consume('k', 3, 60) for _ in range(3)], [0, 0, 0])
+            self.assertAlmostEqual(store.consume('k', 3, 60), 20)
+            clock.return_value += 20
+            self.assertEqual(store.consume('k', 3, 60), 0)
+            self.assertGreater(store.consume('k', 3, 60), 0)
+            # Other keys have their own budget
+            self.assertEqual(store.consume('other', 3, 60), 0)
+
+    def test_cache_store_counts_per_window(self):
+        store = CacheBucketStore()
+        with mock.patch('main.throttling.time.time', return_value=6000.0) as clock:
+            self.assertEqual([store.consume('k', 2, 60) for _ in range(2)], [0, 0])
+            self.assertAlmostEqual(store.consume('k', 2, 60), 60)
+            clock.return_value += 60
+            self.assertEqual(store.consume('k', 2, 60), 0)
+
+    @mock.patch.dict(EngagementThrottle.THROTTLE_RATES, {'engagement': '1/min'})
+    def test_engagement_is_throttled_separately(self):
+        alice = User.objects.create_user('alice')
+        bob = User.objects.create_user('bob')
+        client = APIClient()
+        client.force_authenticate(alice)
+        follow = f'/api/v1/users/{bob.pk}/follow/'
+        self.assertEqual(client.post(follow).status_code, 201)
+        self.assertEqual(client.post(f'/api/v1/users/{bob.pk}/unfollow/').status_code, 204)
+        response = client.post(follow)
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+        # Reads still have budget
+        self.assertEqual(client.get('/api/v1/threads/').status_code, 200)
+
+
+class DataIOTests(TestCase):
+    def setUp(self):
+        alice = User.objects.create_user('alice')
+        bob = User.objects.create_user('bob')
+        thread = Thread.objects.create(author=alice, content='caf\u00e9, "quoted"\nline')
+        Thread.objects.create(author=bob, is_repost=True, original_thread=thread)
+        reply = Reply.objects.create(thread=thread, author=bob, content='hi')
+        Like.objects.create(user=bob, thread=thread)
+        Like.objects.create(user=alice, reply=reply)
+        Follow.objects.create(follower=bob, followed=alice)
+
+    def roundtrip(self, fmt):
+        with tempfile.TemporaryDirectory() as directory:
+            exported = dict(dataio.export_dataset(directory, fmt))
+            with open(f'{directory}/manifest.json') as f:
+                manifest = json.load(f)
+            User.objects.filter(username__in=['alice', 'bob']).update(
+                username=Concat('username', Value('-old'))
+            )
+            imported = dict(dataio.import_dataset(directory))
+        return exported, manifest, imported
+
+    def test_roundtrip(self):
+        for fmt in dataio.FORMATS:
+            with self.subTest(fmt=fmt), transaction.atomic():
+                before = Thread.objects.order_by('-pk').values_list('pk', flat=True).first()
+                exported, manifest, imported = self.roundtrip(fmt)
+                self.assertEqual(exported, imported)
+                self.assertEqual(exported['threads'], 2)
+                self.assertEqual(manifest['tables']['likes']['rows'], 2)
+
+                thread = Thread.objects.get(pk__gt=before, is_repost=False)
+                self.assertEqual(thread.content, 'caf\u00e9, "quoted"\nline')
+                self.assertEqual(thread.author.username, 'alice')
+                repost = Thread.objects.get(pk__gt=before, is_repost=True)
+                self.assertEqual(
+                    (repost.author.username, repost.original_thread_id), ('bob', thread.pk)
+                )
+                counted = Thread.with_counts().get(pk=thread.pk)
+                self.assertEqual(
+                    (counted.likes_count, counted.replies_count, counted.reposts_count),
+                    (1, 1, 1)
+                )
+                reply_likes = Like.objects.filter(reply__thread=thread)
+                self.assertEqual(
+                    list(reply_likes.values_list('user__username', flat=True)), ['alice']
+                )
+                transaction.set_rollback(True)
+
+    def test_unknown_tables(self):
+        with self.assertRaises(ValueError):
+            dataio.get_tables(['threads', 'nope'])
+        self.assertEqual(
+            [table.name for table in dataio.get_tables(['likes', 'users'])], ['users', 'likes']
+        )
+
+
+class ArchiveTests(TestCase):
+    def test_every_reverse_relation_is_handled(self):
+        self.assertEqual(archive.unhandled_relations(), [])
+
+    def test_archived_repost(self):
+        caches['default'].clear()
+        alice = User.objects.create_user('alice')
+        bob = User.objects.create_user('bob')
+        thread = Thread.objects.create(author=alice, content='by alice')
+        repost = Thread.objects.create(author=bob, is_repost=True, original_thread=thread)
+        client = APIClient()
+        client.force_authenticate(bob)
+        # Cache bob's profile
+        self.assertEqual(client.get(f'/api/v1/users/{bob.pk}/').json()['threads_count'], 1)
+
+        # The original has a live repost, so only the repost is cold
+        self.assertEqual(archive.archive_batch(timezone.now() + timedelta(days=1)), 1)
+        self.assertTrue(ArchivedThread.objects.filter(pk=repost.pk).exists())
+        self.assertEqual(client.get(f'/api/v1/users/{bob.pk}/').json()['threads_count'], 0)
+        detail = client.get(f'/api/v1/threads/{thread.pk}/').json()
+        self.assertEqual((detail['reposts_count'], detail['is_reposted']), (0, True))
+        listed = client.get('/api/v1/threads/').json()['results']
+        self.assertEqual([t['is_reposted'] for t in listed if t['id'] == thread.pk], [True])
+        self.assertEqual(client.post(f'/api/v1/threads/{thread.pk}/repost/').status_code, 400)
+
+
+class ProfileCacheTests(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.alice = User.objects.create_user('alice')
+        self.bob = User.objects.create_user('bob')
+
+    def test_payload_built_before_a_change_is_not_served(self):
+        key, payload = profiles.get_cached(self.alice.pk)
+        self.assertIsNone(payload)
+        # A writer changes the profile while the reader builds the payload
+        profiles.invalidate(self.alice.pk)
+        profiles.store(key, {'followers_count': 0})
+        self.assertIsNone(profiles.get_cached(self.alice.pk)[1])
+
+        key, _ = profiles.get_cached(self.alice.pk)
+        profiles.store(key, {'followers_count': 1})
+        self.assertEqual(profiles.get_cached(self.alice.pk)[1], {'followers_count': 1})
+
+    def test_follow_updates_the_cached_profile(self):
+        client = APIClient()
+        client.force_authenticate(self.bob)
+        path = f'/api/v1/users/{self.alice.pk}/'
+        profile = client.get(path).json()
+        self.assertEqual((profile['followers_count'], profile['is_following']), (0, False))
+        client.post(f'/api/v1/users/{self.alice.pk}/follow/')
+        profile = client.get(path).json()
+        self.assertEqual((profile['followers_count'], profile['is_following']), (1, True))
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        author = User.objects.create_user('alice', password='x')
+        now = timezone.now()
+        for i in range(5):
+            Thread.objects.create(author=author, content=str(i))
+        # Three rows share a timestamp, so the id breaks the tie
+        times = [now, now, now, now - timedelta(days=1), now + timedelta(days=1)]
+        pks = Thread.objects.order_by('pk').values_list('pk', flat=True)
+        for pk, created_at in zip(pks, times):
+            Thread.objects.filter(pk=pk).update(created_at=created_at)
+        self.expected = list(
+            Thread.objects.order_by('-created_at', '-pk').values_list('pk', flat=True)
+        )
+
+    def paginate(self, params):
+        paginator = KeysetPagination()
+        request = Request(APIRequestFactory().get('/', params))
+        rows = paginator.paginate_queryset(Thread.objects.all(), request)
+        return [row.pk for row in rows], paginator.get_next_link()
+
+    def test_pages_follow_the_cursor(self):
+        pages = []
+        params = {'page_size': 2}
+        while True:
+            page, next_link = self.paginate(params)
+            pages.append(page)
+            if next_link is None:
+                break
+            params['cursor'] = parse_qs(urlparse(next_link).query)['cursor'][0]
+        self.assertEqual([len(page) for page in pages], [2, 2, 1])
+        self.assertEqual(sum(pages, []), self.expected)
+
+    def test_default_page_size(self):
+        self.assertEqual(KeysetPagination.page_size, api_settings.PAGE_SIZE)
+        page, next_link = self.paginate({})
+        self.assertEqual((page, next_link), (self.expected, None))
+
+    def test_invalid_cursor(self):
+        with self.assertRaises(NotFound):
+            self.paginate({'cursor': 'not-a-cursor'})
+
+
+class TakeoutTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(TAKEOUT_DIR=directory.name, TAKEOUT_CHECKPOINT_ROWS=2)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.user = User.objects.create_user('alice')
+        for i in range(5):
+            thread = Thread.objects.create(author=self.user, content=f'thread {i}')
+        Like.objects.create(user=self.user, thread=thread)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def request(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/v1/takeouts/')
+        self.assertEqual(response.status_code, 202)
+        return response.json()
+
+    def run_worker(self, expect_failure=False):
+        Task.objects.update(run_at=timezone.now())
+        if expect_failure:
+            with self.assertLogs('main.taskqueue', 'ERROR'):
+                self.assertFalse(taskqueue.execute(taskqueue.claim('w1')))
+        else:
+            self.assertTrue(taskqueue.execute(taskqueue.claim('w1')))
+
+    def download(self, pk):
+        response = self.client.get(f'/api/v1/takeouts/{pk}/download/')
+        self.assertEqual(response.status_code, 200)
+        with zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content))) as archive:
+            return {
+                name: archive.read(name).decode().splitlines() for name in archive.namelist()
+            }
+
+    def test_build_and_download(self):
+        pk = self.request()['id']
+        self.assertEqual(self.client.get(f'/api/v1/takeouts/{pk}/download/').status_code, 409)
+        self.run_worker()
+        detail = self.client.get(f'/api/v1/takeouts/{pk}/').json()
+        self.assertEqual((detail['status'], detail['rows_written']), ('ready', 6))
+        self.assertEqual(
+            detail['download_url'], f'http://testserver/api/v1/takeouts/{pk}/download/'
+        )
+        files = self.download(pk)
+        self.assertEqual(len(files['threads.ndjson']), 5)
+        self.assertEqual(len(files['likes.ndjson']), 1)
+        self.assertEqual(json.loads(files['profile.json'][0])['username'], 'alice')
+
+    def test_failed_build_resumes(self):
+        export_section = takeout.export_section
+        failures = []
+
+        def fail_on_likes(section, *args):
+            if section.name == 'likes' and not failures:
+                failures.append(section.name)
+                raise RuntimeError('disk full')
+            return export_section(section, *args)
+
+        pk = self.request()['id']
+        with mock.patch.object(takeout, 'export_section', fail_on_likes):
+            self.run_worker(expect_failure=True)
+            failed = Takeout.objects.get()
+            self.assertEqual(failed.status, Takeout.FAILED)
+            self.assertTrue(failed.progress['threads']['done'])
+
+            # The retry is queued, so asking again returns the same takeout
+            self.assertEqual(self.request()['id'], pk)
+            self.assertEqual((Takeout.objects.count(), Task.objects.count()), (1, 1))
+
+            self.run_worker()
+        files = self.download(pk)
+        self.assertEqual(len(files['threads.ndjson']), 5)
+        self.assertEqual(len(files['likes.ndjson']), 1)
+
+    def test_newer_takeout_replaces_older(self):
+        first = self.request()['id']
+        self.run_worker()
+        path = takeout.takeout_dir() / Takeout.objects.get(pk=first).file
+        self.assertTrue(path.exists())
+        Takeout.objects.filter(pk=first).update(created_at=timezone.now() - timedelta(days=1))
+
+        second = self.request()['id']
+        self.run_worker()
+        self.assertEqual(list(Takeout.objects.values_list('pk', flat=True)), [second])
+        self.assertFalse(path.exists())
+        self.download(second)
+
+
+class ModerationTests(TestCase):
+    MATCHERS = (moderation.AhoCorasickMatcher, moderation.RegexMatcher)
+
+    def test_matchers_find_whole_words(self):
+        terms = {'spam ham', 'ham', 'eggs'}
+        cases = {
+            'buy spam ham and eggs': {'spam ham', 'ham', 'eggs'},
+            'hamster eggshell': set(),
+            'egg_eggs eggs_': set(),
+            '#ham, (eggs)!': {'ham', 'eggs'},
+            '': set(),
+        }
+        for matcher_class in self.MATCHERS:
+            matcher = matcher_class(terms)
+            for text, found in cases.items():
+                with self.subTest(matcher=matcher_class.__name__, text=text):
+                    self.assertEqual(matcher.find(text), found)
+
+    def test_blocklist_normalizes_terms_and_content(self):
+        for matcher_class in self.MATCHERS:
+            blocklist = moderation.Blocklist(
+                [('Spam  Ham', BlockedTerm.REJECT), ('ＥＧＧＳ', BlockedTerm.FLAG)],
+                matcher_class,
+            )
+            with self.subTest(matcher=matcher_class.__name__):
+                verdict = blocklist.scan('SPAM\tham with eggs')
+                self.assertEqual(verdict.rejected, {'spam ham'})
+                self.assertEqual(verdict.flagged, {'eggs'})
+                self.assertEqual(blocklist.scan('clean'), moderation.CLEAN)
+
+    def test_rescan_flags_and_unflags(self):
+        author = User.objects.create_user('alice', password='x')
+        thread = Thread.objects.create(author=author, content='green eggs')
+        term = BlockedTerm.objects.create(term='eggs', action=BlockedTerm.FLAG)
+        moderation.rescan()
+        self.assertEqual(ModerationFlag.objects.get(thread=thread).terms, ['eggs'])
+        term.delete()
+        BlockedTerm.objects.create(term='ham', action=BlockedTerm.FLAG)
+        moderation.rescan()
+        self.assertFalse(ModerationFlag.objects.exists())
+
+
+class VisibilityTests(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.alice = User.objects.create_user('alice', password='x')
+        self.bob = User.objects.create_user('bob', password='x')
+        self.carol = User.objects.create_user('carol', password='x')
+        self.client_a = self.client_for(self.alice)
+        self.client_b = self.client_for(self.bob)
+        self.bob_thread = Thread.objects.create(author=self.bob, content='by bob')
+        self.carol_thread = Thread.objects.create(author=self.carol, content='by carol')
+        Reply.objects.create(thread=self.carol_thread, author=self.bob, content='bob replies')
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def status(self, path, method='get', client=None):
+        return getattr(client or self.client_a, method)(path).status_code
+
+    def thread_ids(self, path):
+        return {thread['id'] for thread in self.client_a.get(path).json()['results']}
+
+    def test_block_hides_both_ways(self):
+        self.assertEqual(self.status(f'/api/v1/users/{self.bob.pk}/block/', 'post'), 201)
+        self.assertEqual(self.status(f'/api/v1/threads/{self.bob_thread.pk}/'), 404)
+        alice_thread = Thread.objects.create(author=self.alice, content='by alice')
+        path = f'/api/v1/threads/{alice_thread.pk}/'
+        self.assertEqual(self.status(path, client=self.client_b), 404)
+        self.assertEqual(self.status(f'/api/v1/users/{self.bob.pk}/threads/'), 404)
+        self.assertNotIn(self.bob_thread.pk, self.thread_ids('/api/v1/threads/'))
+        replies = self.client_a.get(f'/api/v1/threads/{self.carol_thread.pk}/').json()['replies']
+        self.assertEqual(replies, [])
+
+        self.client_a.post(f'/api/v1/users/{self.bob.pk}/unblock/')
+        self.assertEqual(self.status(f'/api/v1/threads/{self.bob_thread.pk}/'), 200)
+
+    def test_mute_hides_from_lists_only(self):
+        self.client_a.post(f'/api/v1/users/{self.bob.pk}/follow/')
+        self.assertIn(self.bob_thread.pk, self.thread_ids('/api/v1/feed/'))
+        self.assertEqual(self.status(f'/api/v1/users/{self.bob.pk}/mute/', 'post'), 201)
+        self.assertNotIn(self.bob_thread.pk, self.thread_ids('/api/v1/feed/'))
+        self.assertNotIn(self.bob_thread.pk, self.thread_ids('/api/v1/threads/'))
+        self.assertEqual(self.status(f'/api/v1/threads/{self.bob_thread.pk}/'), 200)
+        profile = self.client_a.get(f'/api/v1/users/{self.bob.pk}/threads/').json()
+        self.assertEqual([thread['id'] for thread in profile], [self.bob_thread.pk])
+        self.assertEqual(profile[0]['recent_replies'], [])
+
+    def test_block_removes_follows_likes_and_reposts(self):
+        Follow.objects.create(follower=self.bob, followed=self.alice)
+        alice_thread = Thread.objects.create(author=self.alice, content='by alice')
+        Like.objects.create(user=self.bob, thread=alice_thread)
+        Like.objects.create(user=self.alice, thread=self.bob_thread)
+        Thread.objects.create(author=self.bob, is_repost=True, original_thread=alice_thread)
+        self.client_a.post(f'/api/v1/users/{self.bob.pk}/block/')
+        self.assertFalse(Follow.objects.exists())
+        self.assertFalse(Like.objects.exists())
+        self.assertFalse(Thread.objects.filter(is_repost=True).exists())
+        self.assertEqual(Thread.with_counts().get(pk=alice_thread.pk).likes_count, 0)
+
+    def test_unlike_after_block(self):
+        self.client_a.post(f'/api/v1/users/{self.bob.pk}/block/')
+        Like.objects.create(user=self.alice, thread=self.bob_thread)
+        path = f'/api/v1/threads/{self.bob_thread.pk}/'
+        self.assertEqual(self.status(path + 'like/', 'post'), 404)
+        self.assertEqual(self.status(path + 'unlike/', 'post'), 204)
+
+    def test_repost_of_blocked_original(self):
+        repost = Thread.objects.create(
+            author=self.carol, is_repost=True, original_thread=self.bob_thread
+        )
+        self.client_a.post(f'/api/v1/users/{self.bob.pk}/block/')
+        self.assertEqual(self.status(f'/api/v1/threads/{repost.pk}/repost/', 'post'), 404)
+
+    def test_archived_threads_of_blocked_authors(self):
+        archive.archive_batch(timezone.now() + timedelta(days=1))
+        self.assertEqual(self.status(f'/api/v1/threads/{self.carol_thread.pk}/'), 200)
+        self.client_a.post(f'/api/v1/users/{self.bob.pk}/block/')
+        self.assertEqual(self.status(f'/api/v1/threads/{self.bob_thread.pk}/'), 404)
+        replies = self.client_a.get(f'/api/v1/threads/{self.carol_thread.pk}/').json()['replies']
+        self.assertEqual(replies, [])
+        path = f'/api/v1/threads/{self.carol_thread.pk}/'
+        self.assertEqual(len(self.client_for(self.carol).get(path).json()['replies']), 1)
+
+
+class DeployCheckTests(SimpleTestCase):
+    @override_settings(
+        CACHES={
+            'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+            'shared': {'BACKEND': 'django.core.cache.backends.redis.RedisCache'},
+        },
+        BLOCKS_CACHE='shared', BRIEF_CACHE='shared', PROFILE_CACHE='default',
+        THROTTLE_CACHE='shared',
+    )
+    def test_local_caches_are_reported(self):
+        errors = checks.check_shared_caches(None)
+        self.assertEqual([error.id for error in errors], ['main.E001'])
+        self.assertIn('PROFILE_CACHE', errors[0].msg)
+
+    @override_settings(PUBSUB_BACKEND='main.pubsub.RedisPubSub')
+    def test_shared_pubsub_passes(self):
+        self.assertEqual(checks.check_pubsub(None), [])
+
+
+class TagIndexTests(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.alice = User.objects.create_user('alice')
+        self.bob = User.objects.create_user('bob')
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+    def timeline(self, path, **params):
+        body = self.client.get(path, params).json()
+        return [entry['thread']['content'] for entry in body['results']], body['next']
+
+    def test_parse(self):
+        self.assertEqual(
+            tags.parse('#Django #ｄｊａｎｇｏ a#b &#39; #123 @bob. @no_one #'),
+            ({'django'}, {'bob', 'no_one'})
+        )
+
+    def test_timelines(self):
+        for i in range(3):
+            Thread.objects.create(author=self.bob, content=f'{i} #Django @alice')
+        Thread.objects.create(author=self.bob, content='#other')
+        contents, next_link = self.timeline('/api/v1/hashtags/DJANGO/', page_size=2)
+        self.assertEqual(contents, ['2 #Django @alice', '1 #Django @alice'])
+        cursor = parse_qs(urlparse(next_link).query)['cursor'][0]
+        contents, next_link = self.timeline('/api/v1/hashtags/django/', page_size=2, cursor=cursor)
+        self.assertEqual((contents, next_link), (['0 #Django @alice'], None))
+        contents, _ = self.timeline(f'/api/v1/users/{self.alice.pk}/mentions/')
+        self.assertEqual(len(contents), 3)
+
+    def test_hidden_authors_leave_pages_full(self):
+        carol = User.objects.create_user('carol')
+        Thread.objects.create(author=carol, content='#django by carol')
+        Thread.objects.create(author=self.bob, content='#django by bob')
+        bob_thread = Thread.objects.create(author=self.bob, content='no tags')
+        Reply.objects.create(thread=bob_thread, author=carol, content='#django')
+        self.client.post(f'/api/v1/users/{self.bob.pk}/block/')
+        contents, next_link = self.timeline('/api/v1/hashtags/django/', page_size=1)
+        self.assertEqual((contents, next_link), (['#django by carol'], None))
+
+    def test_edits_and_index_range(self):
+        thread = Thread.objects.create(author=self.bob, content='#old @alice')
+        thread.content = '#new'
+        thread.save()
+        self.assertEqual(list(Hashtag.objects.values_list('tag', flat=True)), ['new'])
+        self.assertFalse(Mention.objects.exists())
+
+        Hashtag.objects.all().delete()
+        self.assertEqual(tags.index_range(Thread, thread.pk, thread.pk + 1), 1)
+        self.assertEqual(list(Hashtag.objects.values_list('tag', flat=True)), ['new'])
+
+
+class BriefTests(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.alice = User.objects.create_user('alice')
+        # IDs are reused after each test's rollback
+        briefs._local().delete_many([self.alice.pk])
+
+    def username(self):
+        return briefs.get(self.alice.pk)[1]
+
+    def test_invalidate_bumps_the_generation(self):
+        self.assertEqual(self.username(), 'alice')
+        # Without signals nothing notices the change
+        User.objects.filter(pk=self.alice.pk).update(username='alicia')
+        self.assertEqual(self.username(), 'alice')
+        briefs.invalidate(self.alice.pk)
+        self.assertEqual(self.username(), 'alicia')
+
+    def test_other_processes_see_the_new_generation(self):
+        self.assertEqual(self.username(), 'alice')
+        User.objects.filter(pk=self.alice.pk).update(username='alicia')
+        # Another process bumped the generation; this one's LRU entry expires
+        generations.bump(caches['default'], 'brief', self.alice.pk)
+        briefs._local().delete_many([self.alice.pk])
+        self.assertEqual(self.username(), 'alicia')
+
+    def test_rename_through_the_model(self):
+        self.assertEqual(self.username(), 'alice')
+        self.alice.username = 'alicia'
+        self.alice.save()
+        self.assertEqual(self.username(), 'alicia')
+        self.assertEqual(briefs.get_many([self.alice.pk, None, 0]), {
+            self.alice.pk: (self.alice.pk, 'alicia', False)
+        })
+
+
+class LazyAdminTests(SimpleTestCase):
+    def ready(self, *argv):
+        with mock.patch.object(sys, 'argv', ['manage.py', *argv]), \
+                mock.patch('django.contrib.admin.autodiscover') as autodiscover:
+            apps.get_app_config('main').ready()
+        return autodiscover.called
+
+    @override_settings(ADMIN_LAZY=True)
+    def test_check_registers_the_model_admins(self):
+        self.assertTrue(self.ready('check', '--deploy'))
+        self.assertFalse(self.ready('runserver'))
+        self.assertFalse(self.ready())
+
+    @override_settings(ADMIN_LAZY=False)
+    def test_eager_admin_is_left_alone(self):
+        self.assertFalse(self.ready('check'))
@@ -0,0 +1,167 @@
+# main/throttling.py
+"""
+Token-bucket request throttling.
+
+Rates use DRF's ``DEFAULT_THROTTLE_RATES`` syntax (``'60/min'``): the
+number is the bucket size and it refills evenly over the period, so a
+client may burst up to the full budget and then continues at the average
+rate. Unlike ``SimpleRateThrottle``, which reads and rewrites a list of
+timestamps per request, a check is a single operation on the bucket store,
+chosen with the ``THROTTLE_STORE`` setting. The shared CacheBucketStore
+approximates the bucket with fixed windows.
+"""
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+from rest_framework.throttling import SimpleRateThrottle
+
+
+class BaseBucketStore:
+    def consume(self, key, capacity, period):
+        """
+        Take one token from the bucket ``key`` holding ``capacity`` tokens
+        that refills every ``period`` seconds. Returns 0 when allowed,
+        otherwise the seconds until a token is available.
+        """
+        raise NotImplementedError
+
+
+class InMemoryBucketStore(BaseBucketStore):
+    """
+    Exact token buckets held in this process. Budgets are per process, so
+    with several workers a client gets up to ``workers`` times the rate.
+    """
+    # Least recently used buckets are dropped beyond this many keys
+    max_keys = 100000
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # Ordered by last use, so eviction pops from the front
+        self.buckets = OrderedDict()
+
+    def consume(self, key, capacity, period):
+        now = time.monotonic()
+        refill = capacity / period
+        with self.lock:
+            tokens, updated = self.buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * refill)
+            wait = 0
+            if tokens < 1:
+                wait = (1 - tokens) / refill
+            else:
+                tokens -= 1
+            self.buckets[key] = (tokens, now)
+            if len(self.buckets) > self.max_keys:
+                self.buckets.popitem(last=False)
+        return wait
+
+
+class CacheBucketStore(BaseBucketStore):
+    """
+    Fixed-window counters shared through the cache named by
+    ``THROTTLE_CACHE``, for deployments with several processes.
+
+    This is not a token bucket: the cache API has no atomic
+    read-modify-write, so the whole budget becomes available again at the
+    start of each period. Each period has its own counter and a check is
+    one ``incr`` (plus an ``add`` for the first request of a period). A
+    client can therefore send up to twice the budget around a window
+    boundary.
+    """
+
+    def __init__(self):
+        self.cache = caches[getattr(settings, 'THROTTLE_CACHE', 'default')]
+
+    def consume(self, key, capacity, period):
+        now = time.time()
+        window = int(now // period)
+        key = f'throttle:{key}:{window}'
+        try:
+            used = self.cache.incr(key)
+        except ValueError:
+            if self.cache.add(key, 1, timeout=period + 1):
+                used = 1
+            else:
+                used = self.cache.incr(key)
+        if used <= capacity:
+            return 0
+        return (window + 1) * period - now
+
+
+@lru_cache(maxsize=None)
+def get_store():
+    backend = getattr(settings, 'THROTTLE_STORE', 'main.throttling.InMemoryBucketStore')
+    return import_string(backend)()
+
+
+class TokenBucketThrottle(SimpleRateThrottle):
+    """
+    Token-bucket version of ``SimpleRateThrottle``; subclasses provide
+    ``get_cache_key`` and ``scope`` as usual
+    """
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+        self.wait_time = get_store().consume(self.key, self.num_requests, self.duration)
+        return not self.wait_time
+
+    def wait(self):
+        return self.wait_time
+
+
+class ReadWriteThrottle(TokenBucketThrottle):
+    """
+    Separate budgets for safe (``read``) and other (``write``) requests per
+    user, or per IP address for anonymous clients
+    """
+    write_scope = 'write'
+
+    def __init__(self):
+        # The scope, and so the rate, is only known per request
+        pass
+
+    def allow_request(self, request, view):
+        if request.method in ('GET', 'HEAD', 'OPTIONS'):
+            self.scope = 'read'
+        else:
+            self.scope = self.write_scope
+        self.rate = self.get_rate()
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        return super().allow_request(request, view)
+
+    def get_rate(self):
+        # Scopes without a configured rate are not throttled
+        return self.THROTTLE_RATES.get(self.scope)
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            ident = request.user.pk
+        else:
+            ident = self.get_ident(request)
+        return f'{self.scope}:{ident}'
+
+
+class EngagementThrottle(ReadWriteThrottle):
+    """
+    Separate write budget for likes, reposts and follows
+    """
+    write_scope = 'engagement'
+
+
+class AuthThrottle(TokenBucketThrottle):
+    """
+    Budget for login, registration and password reset, keyed by IP address
+    """
+    scope = 'auth'
+
+    def get_cache_key(self, request, view):
+        return f'{self.scope}:{self.get_ident(request)}'
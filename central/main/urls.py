@@ -6,4 +6,7 @@ router = DefaultRouter()
 router.register(r'users', views.UserViewSet)
 router.register(r'threads', views.ThreadViewSet, basename='thread')
 router.register(r'replies', views.ReplyViewSet, basename='reply')
-router.register(r'feed', views.FeedViewSet, basename='feed')
\ No newline at end of file
+router.register(r'feed', views.FeedViewSet, basename='feed')
+router.register(r'hashtags', views.HashtagViewSet, basename='hashtag')
+router.register(r'notifications', views.NotificationViewSet, basename='notification')
+router.register(r'takeouts', views.TakeoutViewSet, basename='takeout')
\ No newline at end of file
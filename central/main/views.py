@@ -1,15 +1,128 @@
-from rest_framework import viewsets, status, filters
+from rest_framework import viewsets, status, filters, generics, mixins
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly
-from django.shortcuts import get_object_or_404
-from django.db.models import Prefetch
-from .models import Thread, Reply, Like, Follow, User
+from django.http import FileResponse, Http404
+from django.db import IntegrityError, transaction
+from django.db.models import BooleanField, Exists, OuterRef, Prefetch, Q, Value
+from .models import (
+    Thread, Reply, Like, Follow, Block, Mute, User, Notification, ArchivedThread,
+    Takeout, Hashtag, Mention
+)
 from .serializers import (
     ThreadSerializer, ThreadDetailSerializer, ReplySerializer,
     LikeSerializer, FollowSerializer, UserDetailSerializer,
-    UserBriefSerializer
+    UserBriefSerializer, FollowEntrySerializer, NotificationSerializer,
+    ArchivedThreadSerializer, ArchivedReplySerializer, TakeoutSerializer,
+    MarkReadSerializer,
+)
+from . import blocking, briefs, notifications, profiles, tags
+from .fast_serializers import (
+    RECENT_REPLIES, FastThreadSerializer, FastReplySerializer, FastIndexEntrySerializer
 )
+from .pagination import KeysetPagination, NotificationCursorPagination
+from .throttling import EngagementThrottle
+
+
+class FastListMixin:
+    """
+    Serve ``list`` through a values-based fast serializer instead of the
+    ModelSerializer used for the other actions
+    """
+    fast_serializer_class = None
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        context = self.get_serializer_context()
+        hidden = context.get('hidden')
+        if hidden:
+            # Before paginating, so pages are not left short
+            queryset = queryset.exclude(author_id__in=list(hidden))
+        rows = self.fast_serializer_class.rows_for(queryset)
+
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            serializer = self.fast_serializer_class(page, context=context)
+            return self.get_paginated_response(serializer.data)
+
+        serializer = self.fast_serializer_class(rows, context=context)
+        return Response(serializer.data)
+
+
+class ArchiveFallbackMixin:
+    """
+    Serve ``retrieve`` from the archive tables (main.archive) when the row
+    is no longer live. Archived rows are read-only, so other actions 404,
+    and like live ones they 404 when either user blocks the other.
+    """
+    archive_serializer_class = None
+
+    def get_archive_queryset(self):
+        """
+        The archived rows ``retrieve`` falls back to: by default every row of
+        ``archive_serializer_class``'s model
+        """
+        return self.archive_serializer_class.Meta.model._default_manager.all()
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            return super().retrieve(request, *args, **kwargs)
+        except Http404:
+            lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+            instance = generics.get_object_or_404(
+                self.get_archive_queryset(), pk=kwargs[lookup_url_kwarg]
+            )
+        if blocking.for_request(request).is_blocked(instance.author_id):
+            raise Http404
+        serializer = self.archive_serializer_class(
+            instance, context=self.get_serializer_context()
+        )
+        return Response(serializer.data)
+
+
+class HiddenAuthorsMixin:
+    """
+    Leave out content by authors the viewer blocks, mutes or is blocked by
+    (main/blocking.py); content by blocked authors 404s, except for the
+    actions in ``blocked_actions``
+    """
+    # Undoing a like stays possible after a block
+    blocked_actions = ('unlike',)
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['hidden'] = blocking.for_request(self.request)
+        return context
+
+    def get_object(self):
+        obj = super().get_object()
+        if (
+            self.action not in self.blocked_actions
+            and blocking.for_request(self.request).is_blocked(obj.author_id)
+        ):
+            raise Http404
+        return obj
+
+
+def index_timeline(view, entries):
+    """
+    Hashtag or Mention ``entries``, newest first and keyset paginated, with
+    the posts they point at
+    """
+    request = view.request
+    hidden = blocking.for_request(request)
+    if hidden:
+        # Before paginating, so pages are not left short; a reply's entry
+        # also goes when the thread's author is hidden
+        hidden = list(hidden)
+        entries = entries.exclude(author_id__in=hidden).exclude(thread__author_id__in=hidden)
+    paginator = KeysetPagination()
+    page = paginator.paginate_queryset(entries, request, view=view)
+    serializer = FastIndexEntrySerializer(
+        page, context={'request': request, 'hidden': blocking.for_request(request)}
+    )
+    return paginator.get_paginated_response(serializer.data)
+
 
 class UserViewSet(viewsets.ModelViewSet):
     queryset = User.objects.all()
@@ -17,12 +130,38 @@ class UserViewSet(viewsets.ModelViewSet):
     filter_backends = [filters.SearchFilter]
     search_fields = ['username', 'bio']
     
+    def get_queryset(self):
+        if self.action == 'list':
+            return User.with_stats(self.request.user).order_by('id')
+        if self.action == 'retrieve':
+            # Cached for every viewer, so without the viewer's relation
+            return User.with_stats()
+        return User.objects.all()
+
     def get_serializer_class(self):
         if self.action in ['list', 'retrieve']:
             return UserDetailSerializer
         return UserBriefSerializer
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            # Same cache key for "7" and "07"
+            pk = int(kwargs['pk'])
+        except ValueError:
+            raise Http404
+        key, payload = profiles.get_cached(pk)
+        if payload is None:
+            payload = dict(self.get_serializer(self.get_object()).data)
+            # The serializer already looked the viewer's relation up
+            is_following = payload.pop('is_following')
+            profiles.store(key, payload)
+        else:
+            is_following = request.user.is_authenticated and Follow.objects.filter(
+                follower=request.user, followed_id=pk
+            ).exists()
+        return Response({**payload, 'is_following': is_following})
     
-    @action(detail=True, methods=['post'])
+    @action(detail=True, methods=['post'], throttle_classes=[EngagementThrottle])
     def follow(self, request, pk=None):
         user_to_follow = self.get_object()
         serializer = FollowSerializer(
@@ -51,40 +190,175 @@ class UserViewSet(viewsets.ModelViewSet):
             status=status.HTTP_400_BAD_REQUEST
         )
     
+    @action(detail=True, methods=['post'])
+    def block(self, request, pk=None):
+        user = self.get_object()
+        if user == request.user:
+            return Response(
+                {"detail": "Cannot block yourself."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        with transaction.atomic():
+            _, created = Block.objects.get_or_create(blocker=request.user, blocked=user)
+            # Deleted one by one so the follow, like and repost signal
+            # handlers run
+            for follow in Follow.objects.filter(
+                Q(follower=request.user, followed=user) | Q(follower=user, followed=request.user)
+            ):
+                follow.delete()
+            for like in Like.objects.filter(
+                Q(user=request.user, thread__author=user)
+                | Q(user=request.user, reply__author=user)
+                | Q(user=user, thread__author=request.user)
+                | Q(user=user, reply__author=request.user)
+            ):
+                like.delete()
+            for repost in Thread.objects.filter(
+                Q(author=request.user, original_thread__author=user)
+                | Q(author=user, original_thread__author=request.user),
+                is_repost=True,
+            ):
+                repost.delete()
+        if not created:
+            return Response(
+                {"detail": "Already blocking this user."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['post'])
+    def unblock(self, request, pk=None):
+        user = self.get_object()
+        block = Block.objects.filter(blocker=request.user, blocked=user).first()
+        if block:
+            block.delete()
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        return Response(
+            {"detail": "Not blocking this user."},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    @action(detail=True, methods=['post'])
+    def mute(self, request, pk=None):
+        user = self.get_object()
+        if user == request.user:
+            return Response(
+                {"detail": "Cannot mute yourself."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        _, created = Mute.objects.get_or_create(muter=request.user, muted=user)
+        if not created:
+            return Response(
+                {"detail": "Already muting this user."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['post'])
+    def unmute(self, request, pk=None):
+        user = self.get_object()
+        mute = Mute.objects.filter(muter=request.user, muted=user).first()
+        if mute:
+            mute.delete()
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        return Response(
+            {"detail": "Not muting this user."},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    @action(detail=False, permission_classes=[IsAuthenticated])
+    def blocked(self, request):
+        users = User.objects.filter(blocked_by__blocker=request.user).order_by('username')
+        return self.brief_list(users)
+
+    @action(detail=False, permission_classes=[IsAuthenticated])
+    def muted(self, request):
+        users = User.objects.filter(
+            pk__in=Mute.objects.filter(muter=request.user).values('muted')
+        ).order_by('username')
+        return self.brief_list(users)
+
+    def brief_list(self, users):
+        page = self.paginate_queryset(users)
+        serializer = UserBriefSerializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
     @action(detail=True)
     def followers(self, request, pk=None):
         user = self.get_object()
-        followers = user.followers.all()
-        serializer = UserBriefSerializer(followers, many=True)
-        return Response(serializer.data)
+        follows = Follow.objects.filter(followed=user)
+        return self.follow_list(follows, 'follower')
     
     @action(detail=True)
     def following(self, request, pk=None):
         user = self.get_object()
-        following = user.following.all()
-        serializer = UserBriefSerializer(following, many=True)
-        return Response(serializer.data)
+        follows = Follow.objects.filter(follower=user)
+        return self.follow_list(follows, 'followed')
+
+    def follow_list(self, follows, side):
+        """
+        Page through ``follows`` by (created_at, id), annotating whether
+        each listed user follows the viewer and is followed by them
+        """
+        viewer = self.request.user
+        if viewer.is_authenticated:
+            follows = follows.annotate(
+                follows_you=Exists(Follow.objects.filter(follower=OuterRef(side), followed=viewer)),
+                you_follow=Exists(Follow.objects.filter(follower=viewer, followed=OuterRef(side))),
+            )
+        else:
+            follows = follows.annotate(
+                follows_you=Value(False, output_field=BooleanField()),
+                you_follow=Value(False, output_field=BooleanField()),
+            )
+        paginator = KeysetPagination()
+        page = paginator.paginate_queryset(follows, self.request, view=self)
+        briefs.get_many([getattr(follow, f'{side}_id') for follow in page], self.request)
+        serializer = FollowEntrySerializer(
+            page, many=True, context={'request': self.request, 'side': side}
+        )
+        return paginator.get_paginated_response(serializer.data)
     
+    @action(detail=True)
+    def mentions(self, request, pk=None):
+        user = self.get_object()
+        return index_timeline(self, Mention.objects.filter(user=user))
+
     @action(detail=True)
     def threads(self, request, pk=None):
         user = self.get_object()
+        if blocking.for_request(request).is_blocked(user.pk):
+            raise Http404
         threads = Thread.with_counts().filter(author=user)
-        serializer = ThreadSerializer(
-            threads, many=True, context={'request': request}
+        serializer = FastThreadSerializer(
+            FastThreadSerializer.rows_for(threads), context={
+                'request': request,
+                # Still hides repliers; a muted author's own threads show
+                'hidden': blocking.for_request(request).showing(user.pk),
+            }
         )
         return Response(serializer.data)
 
-class ThreadViewSet(viewsets.ModelViewSet):
+class ThreadViewSet(
+    HiddenAuthorsMixin, FastListMixin, ArchiveFallbackMixin, viewsets.ModelViewSet
+):
+    fast_serializer_class = FastThreadSerializer
+    archive_serializer_class = ArchivedThreadSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
     filter_backends = [filters.SearchFilter]
     search_fields = ['content']
     
     def get_queryset(self):
-        queryset = Thread.with_counts().select_related('author')
+        queryset = Thread.with_counts().select_related('original_thread')
+        replies = Reply.with_counts()
+        hidden = blocking.for_request(self.request)
+        if hidden:
+            # Before the slice, so threads still get RECENT_REPLIES replies
+            replies = replies.exclude(author_id__in=list(hidden))
         queryset = queryset.prefetch_related(
             Prefetch(
                 'replies',
-                queryset=Reply.with_counts().order_by('-created_at')[:3],
+                queryset=replies.order_by('-created_at')[:RECENT_REPLIES],
                 to_attr='recent_replies'
             )
         )
@@ -94,8 +368,11 @@ class ThreadViewSet(viewsets.ModelViewSet):
         if self.action == 'retrieve':
             return ThreadDetailSerializer
         return ThreadSerializer
+
+    def get_archive_queryset(self):
+        return ArchivedThread.objects.prefetch_related('replies')
     
-    @action(detail=True, methods=['post'])
+    @action(detail=True, methods=['post'], throttle_classes=[EngagementThrottle])
     def like(self, request, pk=None):
         thread = self.get_object()
         serializer = LikeSerializer(
@@ -124,29 +401,59 @@ class ThreadViewSet(viewsets.ModelViewSet):
             status=status.HTTP_400_BAD_REQUEST
         )
     
-    @action(detail=True, methods=['post'])
+    @action(detail=True, methods=['post'], throttle_classes=[EngagementThrottle])
     def repost(self, request, pk=None):
-        original_thread = self.get_object()
-        repost = Thread.objects.create(
-            author=request.user,
-            is_repost=True,
-            original_thread=original_thread
+        thread = self.get_object()
+        # Reposting a repost reposts its root, so chains are never more
+        # than one level deep
+        original_thread = thread.original_thread if thread.is_repost else thread
+        if original_thread is None:
+            return Response(
+                {"detail": "Original thread no longer exists."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if blocking.for_request(request).is_blocked(original_thread.author_id):
+            raise Http404
+        # The unique constraint only covers live reposts
+        archived = ArchivedThread.objects.filter(
+            author=request.user, is_repost=True, original_thread_id=original_thread.pk
         )
+        if archived.exists():
+            return Response(
+                {"detail": "Thread already reposted."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            with transaction.atomic():
+                repost = Thread.objects.create(
+                    author=request.user,
+                    is_repost=True,
+                    original_thread=original_thread
+                )
+        except IntegrityError:
+            return Response(
+                {"detail": "Thread already reposted."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         serializer = ThreadSerializer(repost, context={'request': request})
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
-class ReplyViewSet(viewsets.ModelViewSet):
+class ReplyViewSet(
+    HiddenAuthorsMixin, FastListMixin, ArchiveFallbackMixin, viewsets.ModelViewSet
+):
     serializer_class = ReplySerializer
+    fast_serializer_class = FastReplySerializer
+    archive_serializer_class = ArchivedReplySerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
     
     def get_queryset(self):
-        queryset = Reply.with_counts().select_related('author', 'thread')
+        queryset = Reply.with_counts()
         thread_id = self.request.query_params.get('thread', None)
         if thread_id:
             queryset = queryset.filter(thread_id=thread_id)
         return queryset
     
-    @action(detail=True, methods=['post'])
+    @action(detail=True, methods=['post'], throttle_classes=[EngagementThrottle])
     def like(self, request, pk=None):
         reply = self.get_object()
         serializer = LikeSerializer(
@@ -175,16 +482,98 @@ class ReplyViewSet(viewsets.ModelViewSet):
             status=status.HTTP_400_BAD_REQUEST
         )
 
-class FeedViewSet(viewsets.ReadOnlyModelViewSet):
+class FeedViewSet(HiddenAuthorsMixin, FastListMixin, viewsets.ReadOnlyModelViewSet):
     serializer_class = ThreadSerializer
+    fast_serializer_class = FastThreadSerializer
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
-        # Get IDs of users the current user follows
-        following_ids = self.request.user.following.values_list(
-            'followed_id', flat=True
-        )
+        # Get IDs of users the current user follows, minus muted ones
+        hidden = blocking.for_request(self.request)
+        following_ids = [
+            user_id for user_id in self.request.user.following.values_list(
+                'followed_id', flat=True
+            ) if user_id not in hidden
+        ]
         # Get threads from followed users and the current user
         return Thread.with_counts().filter(
-            author_id__in=list(following_ids) + [self.request.user.id]
-        ).select_related('author').order_by('-created_at')
\ No newline at end of file
+            author_id__in=following_ids + [self.request.user.id]
+        ).order_by('-created_at')
+
+class HashtagViewSet(viewsets.GenericViewSet):
+    """
+    Threads and replies carrying a hashtag, newest first
+    """
+    permission_classes = [IsAuthenticatedOrReadOnly]
+    lookup_field = 'tag'
+    lookup_value_regex = '[^/]+'
+
+    def retrieve(self, request, tag=None):
+        entries = Hashtag.objects.filter(tag=tags.normalize_tag(tag.lstrip('#')))
+        return index_timeline(self, entries)
+
+class NotificationViewSet(viewsets.ReadOnlyModelViewSet):
+    serializer_class = NotificationSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = NotificationCursorPagination
+
+    def get_queryset(self):
+        return Notification.objects.filter(
+            recipient=self.request.user
+        )
+
+    @action(detail=False)
+    def unread_count(self, request):
+        # Kept up to date by main.notifications, so no query is needed
+        return Response({'unread': request.user.unread_notifications})
+
+    @action(detail=False, methods=['post'])
+    def mark_read(self, request):
+        """
+        Mark the notifications listed in ``ids``, or all of them, as read
+        """
+        serializer = MarkReadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        unread = self.get_queryset().filter(is_read=False)
+        ids = serializer.validated_data.get('ids')
+        if ids:
+            unread = unread.filter(id__in=ids)
+        marked = unread.update(is_read=True)
+        notifications.adjust_unread({request.user.id: -marked})
+        return Response({'marked': marked})
+
+class TakeoutViewSet(mixins.CreateModelMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    Request a data export, follow its progress and download the ZIP
+    """
+    serializer_class = TakeoutSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return Takeout.objects.filter(user=self.request.user)
+
+    def create(self, request, *args, **kwargs):
+        # main.takeout is otherwise only used by the task worker, so web
+        # workers import it on first use rather than at boot
+        from .takeout import request_takeout
+
+        takeout = request_takeout(request.user)
+        serializer = self.get_serializer(takeout)
+        return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=True)
+    def download(self, request, pk=None):
+        from .takeout import takeout_dir
+
+        takeout = self.get_object()
+        if takeout.status != Takeout.READY:
+            return Response(
+                {"detail": "Takeout is not ready yet."},
+                status=status.HTTP_409_CONFLICT
+            )
+        try:
+            file = open(takeout_dir() / takeout.file, 'rb')
+        except FileNotFoundError:
+            # Removed from TAKEOUT_DIR since it was built
+            raise Http404
+        return FileResponse(file, as_attachment=True, filename=takeout.file)
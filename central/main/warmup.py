@@ -0,0 +1,154 @@
+# main/warmup.py
+"""
+Worker warm-up, run by central/wsgi.py and central/asgi.py once the
+application is built.
+
+Django only imports the URLconf (and with it the views, serializers and
+simplejwt) when the first request arrives, builds serializer fields and
+the model ``_meta`` caches behind them on first use, and connects to the
+database on the first query. ``warm_up()`` does all of that before the
+worker accepts traffic, so a freshly scaled-out worker answers its first
+request as fast as its hundredth. ``timings`` records how long each step
+took for ``manage.py boot_report``.
+
+Connections opened here are closed again before the process forks, so a
+server that loads the application before forking its workers (gunicorn
+``--preload``) does not share them between workers.
+"""
+import logging
+import os
+import time
+
+from django.contrib.auth import get_user_model, password_validation
+from django.db import DatabaseError, connections
+from django.urls import URLResolver, get_resolver
+from rest_framework.serializers import BaseSerializer, ListSerializer
+from rest_framework.settings import api_settings
+
+logger = logging.getLogger(__name__)
+
+# Seconds spent in each step of the last warm_up() call
+timings = {}
+
+_fork_hook_registered = False
+
+
+def _walk(patterns):
+    """
+    ``patterns`` and the patterns they include, leaving out namespaced
+    includes: the admin, which is loaded on first use (central/urls.py)
+    """
+    for pattern in patterns:
+        yield pattern
+        if isinstance(pattern, URLResolver) and not pattern.namespace:
+            yield from _walk(pattern.url_patterns)
+
+
+def _views(patterns):
+    """
+    The DRF view classes behind ``patterns`` with their router action maps
+    """
+    for pattern in _walk(patterns):
+        view_class = getattr(getattr(pattern, 'callback', None), 'cls', None)
+        if view_class is not None:
+            yield view_class, getattr(pattern.callback, 'actions', None) or {}
+
+
+def _serializer_classes(view_class, actions):
+    classes = {
+        getattr(view_class, name) for name in dir(view_class)
+        if name.endswith('serializer_class')
+    }
+    if 'get_serializer_class' in vars(view_class):
+        # Per-action serializers, e.g. ThreadViewSet's detail serializer
+        for action in set(actions.values()):
+            view = view_class(action=action, request=None, format_kwarg=None)
+            classes.add(view.get_serializer_class())
+    return {
+        cls for cls in classes
+        if isinstance(cls, type) and issubclass(cls, BaseSerializer)
+    }
+
+
+def _build_fields(serializer, seen):
+    if isinstance(serializer, ListSerializer):
+        serializer = serializer.child
+    if type(serializer) in seen:
+        return
+    seen.add(type(serializer))
+    for field in serializer.fields.values():
+        if isinstance(field, BaseSerializer):
+            _build_fields(field, seen)
+
+
+def prime_urls():
+    """
+    Import the URLconf and compile the regex of every route
+    """
+    # Only what resolving a request needs: populating the reverse lookup
+    # would load the admin's URLs too
+    for pattern in _walk(get_resolver().url_patterns):
+        pattern.pattern.regex
+
+
+def prime_api_settings():
+    """
+    Import the default DRF renderers, parsers, authentication and
+    throttle classes
+    """
+    for name in api_settings.import_strings:
+        getattr(api_settings, name)
+
+
+def prime_serializers():
+    """
+    Build the fields of every serializer the API views use, nested ones
+    included
+    """
+    seen = set()
+    for view_class, actions in _views(get_resolver().url_patterns):
+        for serializer_class in _serializer_classes(view_class, actions):
+            _build_fields(serializer_class(context={}), seen)
+    return len(seen)
+
+
+def prime_database():
+    """
+    Connect to every database and run one ORM query against the default
+    one, which imports its SQL compiler. The connections serve the first
+    requests only if they outlive them (``CONN_MAX_AGE``).
+    """
+    global _fork_hook_registered
+    try:
+        for connection in connections.all():
+            connection.ensure_connection()
+        get_user_model()._default_manager.filter(pk=0).exists()
+    except DatabaseError as exc:
+        # Not fatal: Django connects on the first query again
+        logger.warning('Warm-up could not reach the database: %s', exc)
+    if not _fork_hook_registered:
+        os.register_at_fork(before=connections.close_all)
+        _fork_hook_registered = True
+
+
+def warm_up(database=True):
+    """
+    Run every step and return ``timings``. ``database=False`` leaves out
+    the connections, e.g. under ASGI, where each request runs its queries
+    in a thread with its own connection.
+    """
+    steps = [
+        ('urls', prime_urls),
+        ('api settings', prime_api_settings),
+        ('serializers', prime_serializers),
+        # Reads the common-password list before the first registration
+        ('password validators', password_validation.get_default_password_validators),
+    ]
+    if database:
+        steps.append(('database', prime_database))
+    timings.clear()
+    for name, step in steps:
+        start = time.perf_counter()
+        step()
+        timings[name] = time.perf_counter() - start
+    return timings